@@ -1,9 +1,16 @@
+import math
+import random
 import threading
 import time
 import json
 import paho.mqtt.client as mqtt
 from AGV import AGV
-import networkx as nx
+from dstar_lite import DStarLite
+from traffic import TrafficController, REROUTE, BACKOFF, YIELD
+
+# Shared layout library (smart_warehouse/warehouse_layout, installed in /opt/shared by the Dockerfile)
+from warehouse_layout import decode_path
+from warehouse_model import SharedWarehouseModel
 
 
 # MQTT broker configuration
@@ -11,8 +18,23 @@ BROKER = "my-mosquitto-broker"
 PORT = 1883
 MISSIONS_TOPIC = "warehouse/missions"
 AGV_COUNT_TOPIC = "warehouse/config/param/number_of_agvs"
-GRAPH_TOPIC = "warehouse/config/graph_json"
-NODE_POSITIONS_TOPIC = "warehouse/config/node_positions"
+LAYOUT_TOPIC = "warehouse/config/layout"
+# Retained set of the edges that cannot be driven: {"blocked_edges": [[u, v], ...], "timestamp": ...}
+BLOCKED_EDGES_TOPIC = "warehouse/obstacles/blocked_edges"
+# Traffic deadlock events and fleet traffic metrics (retained)
+DEADLOCKS_TOPIC = "warehouse/traffic/deadlocks"
+TRAFFIC_METRICS_TOPIC = "warehouse/traffic/metrics"
+# Position reporting: "stream" publishes the position every 0.1 s, "segment" publishes the
+# straight segment being driven (start, end, speed, ETA) on warehouse/agv/{id}/segment and
+# the position only as a heartbeat, the consumers interpolate in between, "fleet" publishes
+# the state of all the AGVs in a single message per tick on FLEET_STATE_TOPIC
+POSITION_REPORTING = "segment"
+FLEET_STATE_TOPIC = "warehouse/fleet/state"
+HEARTBEAT_INTERVAL_S = 2.0
+# A new segment is published when the AGV is late or early on the last one by more than this
+SEGMENT_TOLERANCE_S = 0.3
+# Longest wait in the side cell of a backoff for the other AGVs to clear the cells left to them
+BACKOFF_WAIT_S = 10.0
 
 
 def get_num_agvs_from_mqtt(broker, port, topic, timeout=10):
@@ -58,27 +80,56 @@ class AGVWorker(threading.Thread):
     Ora si sottoscrive anche ai topic per il grafo e le posizioni dei nodi.
     """
 
-    def __init__(self, agv, missions_topic):
+    def __init__(self, agv, missions_topic, traffic: TrafficController = None, model: SharedWarehouseModel = None):
         super().__init__()
         self.agv = agv
         self.missions_topic = missions_topic
+        # Node reservations shared with the other workers (no reservations if None)
+        self.traffic = traffic
+        # Warehouse model shared with the other workers, and the snapshot this worker uses
+        self.model = model if model is not None else SharedWarehouseModel()
+        self.warehouse = None
         self.missions = []
-        self.graph = None
-        self.node_positions = None
+        # Segment reported to the consumers and time of the last published position
+        self.segment = None
+        self.last_report = 0.0
+        # The position is only meaningful once the AGV has driven its first mission
+        self.positioned = False
+        # Blocked edges as frozensets, the version changes on every update of the topic
+        self.blocked_edges = set()
+        self.blocked_version = 0
+        # Backoff in progress: (index of the side cell in the path, cells to leave to the others)
+        self.backoff_hold = None
+        # D* Lite search of the current detour and index of its goal in the path, kept to repair it incrementally
+        self.replanner = None
+        self.detour_end = None
         self.mqtt_client = mqtt.Client()
         self.mqtt_client.on_message = self.on_message
         try:
             print(f"[DEBUG] Connecting to MQTT broker {BROKER}:{PORT} ...")
             self.mqtt_client.connect(BROKER, PORT, 60)
-            print(f"[DEBUG] Connected. Subscribing to topics: {self.missions_topic}, {GRAPH_TOPIC}, {NODE_POSITIONS_TOPIC}")
+            print(f"[DEBUG] Connected. Subscribing to topics: {self.missions_topic}, {LAYOUT_TOPIC}, {BLOCKED_EDGES_TOPIC}")
             self.mqtt_client.subscribe(self.missions_topic)
-            self.mqtt_client.subscribe(GRAPH_TOPIC)
-            self.mqtt_client.subscribe(NODE_POSITIONS_TOPIC)
+            self.mqtt_client.subscribe(LAYOUT_TOPIC)
+            self.mqtt_client.subscribe(BLOCKED_EDGES_TOPIC)
             self.mqtt_client.loop_start()
         except Exception as e:
             print(f"[ERROR] MQTT connection failed: {e}")
         self.running = True
 
+    @property
+    def graph(self):
+        return self.warehouse.graph if self.warehouse is not None else None
+
+    @property
+    def node_positions(self):
+        return self.warehouse.node_positions if self.warehouse is not None else None
+
+    @property
+    def width(self):
+        """ Grid width, to decode the run-length encoded missions"""
+        return self.warehouse.width if self.warehouse is not None else None
+
     def on_message(self, client, userdata, msg):
         print(f"[DEBUG] Received message on topic {msg.topic}: {msg.payload}")
         try:
@@ -93,21 +144,21 @@ class AGVWorker(threading.Thread):
                     print(f"[DEBUG] Missions updated: {self.missions}")
                 else:
                     print(f"[DEBUG] Payload for missions not recognized: {payload}")
-            elif msg.topic == GRAPH_TOPIC:
-                import networkx as nx
-                if "graph" in payload:
-                    self.graph = nx.node_link_graph(payload["graph"])
-                    self.agv.graph = self.graph  # Aggiorna il grafo dell'AGV
-                    print(f"[DEBUG] Graph updated from broker.")
-                else:
-                    print(f"[DEBUG] No 'graph' key in payload for graph topic.")
-            elif msg.topic == NODE_POSITIONS_TOPIC:
-                if "positions" in payload:
-                    self.node_positions = {int(k): tuple(v) for k, v in payload["positions"].items()}
-                    self.agv.node_positions = self.node_positions  # Aggiorna le posizioni nodi dell'AGV
-                    print(f"[DEBUG] Node positions updated: {self.node_positions}")
-                else:
-                    print(f"[DEBUG] No 'positions' key in payload for node positions topic.")
+            elif msg.topic == LAYOUT_TOPIC:
+                # Graph and node positions are rebuilt from the layout parameters once for all the workers
+                warehouse = self.model.update(payload)
+                if warehouse is self.warehouse:
+                    return
+                self.warehouse = warehouse
+                self.agv.graph = warehouse.graph  # Aggiorna il grafo dell'AGV
+                self.agv.node_positions = warehouse.node_positions  # Aggiorna le posizioni nodi dell'AGV
+                self.replanner = None
+                self.detour_end = None
+                print(f"[DEBUG] Using warehouse model {warehouse.height}x{warehouse.width}.")
+            elif msg.topic == BLOCKED_EDGES_TOPIC:
+                self.blocked_edges = {frozenset(edge) for edge in payload.get("blocked_edges", [])}
+                self.blocked_version += 1
+                print(f"[DEBUG] Blocked edges updated: {len(self.blocked_edges)} edges")
         except Exception as e:
             print(f"[ERROR] Error parsing message on topic {msg.topic}: {e}")
 
@@ -128,16 +179,243 @@ class AGVWorker(threading.Thread):
                         print(f"[ERROR] Failed to republish missions, rc={result.rc}")
                 except Exception as e:
                     print(f"[ERROR] Exception during republish missions: {e}")
+                if isinstance(mission, str):
+                    # Encoded mission: start node and run-length direction codes
+                    if self.width is None:
+                        print(f"[ERROR] Layout not available, cannot decode mission {mission}")
+                        continue
+                    mission = decode_path(mission, self.width)
                 print(f"[DEBUG] Starting mission: {mission}")
                 self.simulate_mission(mission)
             else:
                 print(f"[DEBUG] No missions available. Waiting...")
+                self.publish_heartbeat()
                 time.sleep(1)  # Wait for new missions
 
+    def repair_path(self, path, index):
+        """
+        Return the path with the blocked edges after path[index] avoided by a local detour:
+        D* Lite from the current node to the first node after the blocked run, the rest
+        of the path is kept. Returns None if the blocked edges cannot be bypassed.
+        """
+        if self.replanner is not None and self.detour_end is not None and index < self.detour_end:
+            # Edges changed while driving a detour: update it, it also gets shorter when edges are freed
+            self.replanner.move_to(path[index])
+            self.replanner.set_blocked_edges(self.blocked_edges)
+            detour = self.replanner.path()
+            if detour is None:
+                return None
+            path = path[:index] + detour + path[self.detour_end + 1:]
+            self.detour_end = index + len(detour) - 1
+        while True:
+            blocked_at = next((k for k in range(index, len(path) - 1)
+                               if frozenset(path[k:k + 2]) in self.blocked_edges), None)
+            if blocked_at is None:
+                return path
+            rejoin = blocked_at + 1
+            while rejoin < len(path) - 1 and frozenset(path[rejoin:rejoin + 2]) in self.blocked_edges:
+                rejoin += 1
+            if self.replanner is not None and self.detour_end is not None and \
+                    index <= self.detour_end and rejoin <= self.detour_end:
+                # Blocked edge on the current detour: only repair the distances changed by the new blocked edges
+                rejoin = self.detour_end
+                self.replanner.move_to(path[index])
+                self.replanner.set_blocked_edges(self.blocked_edges)
+            else:
+                self.replanner = DStarLite(self.graph, path[index], path[rejoin], self.blocked_edges)
+            detour = self.replanner.path()
+            if detour is None:
+                return None
+            path = path[:index] + detour + path[rejoin + 1:]
+            self.detour_end = index + len(detour) - 1
+
+    def publish_segment(self, start_pos, end_pos, speed):
+        """ Publish the straight segment the AGV drives from now on (speed 0: the AGV stands still)"""
+        now = time.time()
+        distance = ((end_pos[0] - start_pos[0]) ** 2 + (end_pos[1] - start_pos[1]) ** 2) ** 0.5
+        segment_payload = json.dumps({
+            "agv_id": self.agv.device_id,
+            "start": start_pos,
+            "end": end_pos,
+            "speed": speed,
+            "start_time": now,
+            "eta": now + (distance / speed if speed > 0 else 0.0),
+            "timestamp": now
+        })
+        try:
+            result = self.mqtt_client.publish(f"warehouse/agv/{self.agv.device_id}/segment", segment_payload, qos=1, retain=False)
+            if result.rc == 0:
+                print(f"[DEBUG] Published segment: {segment_payload}")
+            else:
+                print(f"[ERROR] Failed to publish segment, rc={result.rc}")
+        except Exception as e:
+            print(f"[ERROR] Exception during publish: {e}")
+        return now
+
+    def report_segment(self, path, index, speed):
+        """
+        Before driving from path[index], publish the straight run ahead unless the
+        AGV is still on time on the segment already reported.
+        """
+        positions = self.agv.node_positions
+        start_pos = positions.get(path[index])
+        segment = self.segment
+        if segment is not None and segment["path"] is path and segment["start_index"] <= index < segment["end_index"]:
+            distance = ((start_pos[0] - segment["start_pos"][0]) ** 2 + (start_pos[1] - segment["start_pos"][1]) ** 2) ** 0.5
+            if abs(time.time() - segment["start_time"] - distance / speed) <= SEGMENT_TOLERANCE_S:
+                return
+
+        def step(k):
+            u, v = positions.get(path[k]), positions.get(path[k + 1])
+            return None if u is None or v is None else (v[0] - u[0], v[1] - u[1])
+
+        end = index + 1
+        direction = step(index)
+        while end < len(path) - 1 and step(end) == direction:
+            end += 1
+        start_time = self.publish_segment(start_pos, positions.get(path[end]), speed)
+        self.segment = {"path": path, "start_index": index, "end_index": end, "start_pos": start_pos,
+                        "start_time": start_time}
+
+    def report_stop(self, node):
+        """ Tell the consumers that the AGV stands still on node"""
+        position = self.agv.node_positions.get(node)
+        if position is not None:
+            self.publish_segment(position, position, 0.0)
+        self.segment = None
+
+    def publish_heartbeat(self):
+        """
+        Publish the position of an AGV that is not driving (idle, waiting for a node or
+        for the blocked edges), at most every HEARTBEAT_INTERVAL_S, so that the consumers
+        (e.g. the congestion map of the mission publisher) do not drop it as stale.
+        """
+        if POSITION_REPORTING == "fleet" or not self.positioned or \
+                time.time() - self.last_report < HEARTBEAT_INTERVAL_S:
+            return
+        self.last_report = time.time()
+        pos_payload = json.dumps({
+            "agv_id": self.agv.device_id,
+            "position": self.agv.get_current_position(),
+            "timestamp": time.time()
+        })
+        try:
+            result = self.mqtt_client.publish(f"warehouse/agv/{self.agv.device_id}/position", pos_payload, qos=0, retain=False)
+            if result.rc != 0:
+                print(f"[ERROR] Failed to publish heartbeat, rc={result.rc}")
+        except Exception as e:
+            print(f"[ERROR] Exception during publish: {e}")
+
+    def reserve_next_node(self, path, index):
+        """
+        Wait until the next node of the path is reserved for this AGV. If the
+        traffic controller chooses this AGV to resolve a deadlock, return the
+        path changed by the resolution instead. Index -1 reserves the first
+        node of a mission, which the AGV enters from its parking spot.
+        """
+        agv_id = self.agv.device_id
+        stopped = False
+        while self.running:
+            if self.traffic.try_reserve(agv_id, path[index + 1]):
+                return path
+            if POSITION_REPORTING == "segment" and not stopped:
+                self.report_stop(path[max(index, 0)])
+                stopped = True
+            deadlock = self.traffic.take_instruction(agv_id)
+            if deadlock is not None:
+                resolved, policy = self.resolve_deadlock(path, index)
+                self.traffic.report_resolution(policy)
+                print(f"[DEBUG] Deadlock between {deadlock['agvs']} resolved by {agv_id} with {policy}")
+                if resolved is not None:
+                    self.traffic.stop_waiting(agv_id)
+                    return resolved
+                # Yield: leave the others a chance to move before asking again
+                time.sleep(random.uniform(0.5, 2.0))
+            self.publish_heartbeat()
+            time.sleep(0.1)
+        return path
+
+    def resolve_deadlock(self, path, index):
+        """
+        Return (new path, policy) to get this AGV out of a deadlock at path[index]:
+        - reroute: a detour around the wanted node, when it is an aisle node just driven through
+        - backoff: drive back to the first free side cell (see backoff_route) and come back, so the others can pass
+        - yield: no change of path (None), wait and retry
+        """
+        agv_id = self.agv.device_id
+        if self.graph is None or index < 0:
+            # Parked AGV: it holds no node, there is nothing to move out of the way
+            return None, YIELD
+        current, wanted = path[index], path[index + 1]
+        # The detours of the blocked edges refer to the old path indices
+        self.replanner = None
+        self.detour_end = None
+        if index + 2 < len(path) and path[index + 2] != current and self.graph.nodes[wanted].get('type') == 'aisle':
+            avoided = self.blocked_edges | {frozenset((wanted, neighbor)) for neighbor in self.graph.neighbors(wanted)}
+            detour = DStarLite(self.graph, current, path[index + 2], avoided).path()
+            if detour is not None and not self.traffic.is_reserved_by_other(agv_id, detour[1]):
+                return path[:index] + detour + path[index + 3:], REROUTE
+        route = self.backoff_route(current, wanted)
+        if route is not None:
+            # Out to the side cell, wait there for the others to pass, then back along the same cells
+            self.backoff_hold = (index + len(route) - 1, frozenset(route[:-1]) | {wanted})
+            return path[:index + 1] + route[1:] + route[-2::-1] + path[index + 1:], BACKOFF
+        return None, YIELD
+
+    def wait_in_side_cell(self, cells):
+        """ Stay in the side cell of a backoff while another AGV holds or wants the cells left to it"""
+        deadline = time.time() + BACKOFF_WAIT_S
+        while self.running and time.time() < deadline and \
+                self.traffic.is_used_by_other(self.agv.device_id, cells):
+            self.publish_heartbeat()
+            time.sleep(0.1)
+
+    def backoff_route(self, current, wanted):
+        """
+        Return the cells [current, ..., side cell] of a backoff away from wanted.
+        The AGV drives straight back along its lane until a cell has a free
+        neighbour to the side: in a single-lane corridor the cells behind the
+        AGV are on the path of the AGV facing it, so the whole corridor is
+        cleared in one backoff instead of one cell per detected deadlock.
+        Returns None if the way back is blocked before a side cell is found.
+        """
+        agv_id = self.agv.device_id
+        route = [current]
+        previous = wanted
+        while True:
+            cell = route[-1]
+            row, col = self.graph.nodes[cell]['grid_pos']
+            prev_row, prev_col = self.graph.nodes[previous]['grid_pos']
+            straight = (2 * row - prev_row, 2 * col - prev_col)
+            ahead, sides = None, []
+            for neighbor in self.graph.neighbors(cell):
+                if neighbor == previous or neighbor in route or \
+                        self.graph.nodes[neighbor].get('type') == 'shelf' or \
+                        frozenset((cell, neighbor)) in self.blocked_edges or \
+                        self.traffic.is_reserved_by_other(agv_id, neighbor):
+                    continue
+                if self.graph.nodes[neighbor]['grid_pos'] == straight:
+                    ahead = neighbor
+                else:
+                    sides.append(neighbor)
+            if sides:
+                return route + [sides[0]]
+            if ahead is None:
+                return None
+            previous = cell
+            route.append(ahead)
+
+    def leave_node(self, start_node, end_node):
+        """ Release the node the AGV left for end_node, so no AGV waits for it any longer"""
+        if self.traffic is not None and start_node != end_node:
+            self.traffic.release(self.agv.device_id, start_node)
+
     def simulate_mission(self, path):
         """
         Simulate following the mission path, updating encoder position and publishing to MQTT.
         Now simulates intermediate movement at 1.5 m/s.
+        When the blocked edges change, the rest of the path is repaired with a local detour.
+        With a traffic controller, every node is reserved before driving into it.
         """
         print(f"[DEBUG] Starting mission simulation with path: {path}")
         self.agv.start()
@@ -148,21 +426,67 @@ class AGVWorker(threading.Thread):
         if not self.agv.node_positions:
             print("[ERROR] Node positions not available, cannot interpolate movement.")
             return
-        for i in range(len(path) - 1):
+        path = list(path)
+        # The AGV stands on the first node of the mission
+        first_pos = self.agv.node_positions.get(path[0]) if path else None
+        if first_pos and self.agv.encoder_sensor_list:
+            self.agv.encoder_sensor_list[0].value['x_axis'] = first_pos[0]
+            self.agv.encoder_sensor_list[0].value['y_axis'] = first_pos[1]
+            self.positioned = True
+        self.segment = None
+        self.replanner = None
+        self.detour_end = None
+        self.backoff_hold = None
+        checked_version = None
+        if self.traffic is not None and path:
+            # Same wait as along the path, so deadlock instructions are handled here too
+            path = self.reserve_next_node(path, -1)
+        i = 0
+        while i < len(path) - 1 and self.running:
+            if checked_version != self.blocked_version and self.graph is not None:
+                checked_version = self.blocked_version
+                repaired = self.repair_path(path, i)
+                if repaired is None:
+                    # No way around: wait for the blocked edges to change
+                    print(f"[DEBUG] Path blocked after node {path[i]}, waiting...")
+                    checked_version = None
+                    self.publish_heartbeat()
+                    time.sleep(1)
+                    continue
+                if repaired != path:
+                    print(f"[DEBUG] Path repaired around blocked edges: {repaired[i:]}")
+                    self.backoff_hold = None
+                path = repaired
+                self.agv.path = path
+            if self.backoff_hold is not None and self.backoff_hold[0] == i:
+                self.wait_in_side_cell(self.backoff_hold[1])
+                self.backoff_hold = None
+            if self.traffic is not None:
+                resolved = self.reserve_next_node(path, i)
+                if resolved is not path:
+                    path = resolved
+                    self.agv.path = path
+                    continue
             start_node = path[i]
             end_node = path[i + 1]
+            i += 1
             start_pos = self.agv.node_positions.get(start_node)
             end_pos = self.agv.node_positions.get(end_node)
             if not start_pos or not end_pos:
                 print(f"[ERROR] Missing node position for {start_node} or {end_node}, skipping segment.")
+                self.leave_node(start_node, end_node)
                 continue
             dx = end_pos[0] - start_pos[0]
             dy = end_pos[1] - start_pos[1]
             distance = (dx ** 2 + dy ** 2) ** 0.5
             if distance == 0:
+                self.leave_node(start_node, end_node)
                 continue
             duration = distance / speed_m_s
             steps = max(1, int(duration / update_interval))
+            if POSITION_REPORTING == "segment":
+                self.report_segment(path, i - 1, speed_m_s)
+            segment_start = time.time()
             for step in range(steps):
                 frac = step / steps
                 x = start_pos[0] + frac * dx
@@ -171,31 +495,36 @@ class AGVWorker(threading.Thread):
                 if self.agv.encoder_sensor_list:
                     self.agv.encoder_sensor_list[0].value['x_axis'] = x
                     self.agv.encoder_sensor_list[0].value['y_axis'] = y
-                pos_payload = json.dumps({
-                    "agv_id": self.agv.device_id,
-                    "position": (x, y),
-                    "timestamp": time.time()
-                })
-                try:
-                    result = self.mqtt_client.publish(
-                        f"warehouse/agv/{self.agv.device_id}/position",
-                        pos_payload,
-                        qos=0,
-                        retain=False
-                    )
-                    if result.rc == 0:
-                        print(f"[DEBUG] Published position: {pos_payload}")
-                    else:
-                        print(f"[ERROR] Failed to publish position, rc={result.rc}")
-                except Exception as e:
-                    print(f"[ERROR] Exception during publish: {e}")
-                time.sleep(update_interval)
+                if POSITION_REPORTING == "stream" or \
+                        (POSITION_REPORTING == "segment" and time.time() - self.last_report >= HEARTBEAT_INTERVAL_S):
+                    self.last_report = time.time()
+                    pos_payload = json.dumps({
+                        "agv_id": self.agv.device_id,
+                        "position": (x, y),
+                        "timestamp": time.time()
+                    })
+                    try:
+                        result = self.mqtt_client.publish(
+                            f"warehouse/agv/{self.agv.device_id}/position",
+                            pos_payload,
+                            qos=0,
+                            retain=False
+                        )
+                        if result.rc == 0:
+                            print(f"[DEBUG] Published position: {pos_payload}")
+                        else:
+                            print(f"[ERROR] Failed to publish position, rc={result.rc}")
+                    except Exception as e:
+                        print(f"[ERROR] Exception during publish: {e}")
+                # Sleep until the next step, so the AGV keeps its speed whatever the publishing time
+                time.sleep(max(0.0, segment_start + (step + 1) * duration / steps - time.time()))
             # At the end of the segment, set position exactly to end_pos
             if self.agv.encoder_sensor_list:
                 self.agv.encoder_sensor_list[0].value['x_axis'] = end_pos[0]
                 self.agv.encoder_sensor_list[0].value['y_axis'] = end_pos[1]
+            self.leave_node(start_node, end_node)
         # Publish final position at last node
-        if path:
+        if path and POSITION_REPORTING != "fleet":
             last_node = path[-1]
             last_pos = self.agv.node_positions.get(last_node)
             if last_pos and self.agv.encoder_sensor_list:
@@ -219,6 +548,11 @@ class AGVWorker(threading.Thread):
                         print(f"[ERROR] Failed to publish final position, rc={result.rc}")
                 except Exception as e:
                     print(f"[ERROR] Exception during publish: {e}")
+        if POSITION_REPORTING == "segment" and path:
+            self.report_stop(path[-1])
+        if self.traffic is not None:
+            # The AGV parks off the aisles at the end of the mission
+            self.traffic.release_all(self.agv.device_id)
         self.agv.stop()
         print(f"[DEBUG] Mission simulation completed.")
 
@@ -228,6 +562,104 @@ class AGVWorker(threading.Thread):
         self.mqtt_client.disconnect()
 
 
+class TrafficMonitor(threading.Thread):
+    """
+    Thread running the deadlock detection of the traffic controller every
+    tick, publishing the deadlock events and periodically the traffic metrics.
+    """
+
+    def __init__(self, traffic: TrafficController, tick_s: float = 0.5, metrics_interval_s: float = 5.0):
+        super().__init__(daemon=True)
+        self.traffic = traffic
+        self.tick_s = tick_s
+        self.metrics_interval_s = metrics_interval_s
+        self.running = True
+        self.mqtt_client = mqtt.Client()
+        try:
+            self.mqtt_client.connect(BROKER, PORT, 60)
+            self.mqtt_client.loop_start()
+        except Exception as e:
+            print(f"[ERROR] MQTT connection failed: {e}")
+
+    def run(self):
+        last_metrics = 0.0
+        while self.running:
+            for event in self.traffic.tick():
+                print(f"[DEBUG] Deadlock detected: {event}")
+                self.mqtt_client.publish(DEADLOCKS_TOPIC, json.dumps(event), qos=1, retain=False)
+            if time.time() - last_metrics >= self.metrics_interval_s:
+                last_metrics = time.time()
+                self.mqtt_client.publish(TRAFFIC_METRICS_TOPIC, json.dumps(self.traffic.get_metrics()), qos=1, retain=True)
+            time.sleep(self.tick_s)
+
+    def stop(self):
+        self.running = False
+        self.mqtt_client.loop_stop()
+        self.mqtt_client.disconnect()
+
+
+class FleetStatePublisher(threading.Thread):
+    """
+    Thread publishing the state of the whole fleet in one message per tick:
+    {"fields": [...], "agvs": [[agv_id, x, y, heading, status], ...], "timestamp": ...}
+    Heading is the direction of the last movement in degrees (0 towards the
+    growing columns, 90 towards the growing rows), status the AGV switch (ON/OFF).
+    An unchanged state is only republished every HEARTBEAT_INTERVAL_S seconds.
+    AGVs that have not been positioned by a mission yet are left out, as in
+    AGVWorker.publish_heartbeat.
+    """
+
+    FIELDS = ["agv_id", "x", "y", "heading", "status"]
+
+    def __init__(self, workers, tick_s: float = 0.1):
+        super().__init__(daemon=True)
+        self.workers = workers
+        self.tick_s = tick_s
+        self.headings = {}
+        self.last_positions = {}
+        self.running = True
+        self.mqtt_client = mqtt.Client()
+        try:
+            self.mqtt_client.connect(BROKER, PORT, 60)
+            self.mqtt_client.loop_start()
+        except Exception as e:
+            print(f"[ERROR] MQTT connection failed: {e}")
+
+    def fleet_state(self):
+        rows = []
+        for worker in self.workers:
+            if not worker.positioned:
+                continue
+            agv = worker.agv
+            position = agv.get_current_position()
+            if position is None:
+                continue
+            x, y = position
+            last = self.last_positions.get(agv.device_id)
+            if last is not None and (x, y) != last:
+                self.headings[agv.device_id] = round(math.degrees(math.atan2(x - last[0], y - last[1]))) % 360
+            self.last_positions[agv.device_id] = (x, y)
+            rows.append([agv.device_id, round(x, 3), round(y, 3), self.headings.get(agv.device_id, 0), agv.switch.status])
+        return rows
+
+    def run(self):
+        last_rows, last_sent = None, 0.0
+        while self.running:
+            rows = self.fleet_state()
+            if rows != last_rows or time.time() - last_sent >= HEARTBEAT_INTERVAL_S:
+                payload = json.dumps({"fields": self.FIELDS, "agvs": rows, "timestamp": time.time()})
+                result = self.mqtt_client.publish(FLEET_STATE_TOPIC, payload, qos=0, retain=False)
+                if result.rc != 0:
+                    print(f"[ERROR] Failed to publish fleet state, rc={result.rc}")
+                last_rows, last_sent = rows, time.time()
+            time.sleep(self.tick_s)
+
+    def stop(self):
+        self.running = False
+        self.mqtt_client.loop_stop()
+        self.mqtt_client.disconnect()
+
+
 def main():
     num_agvs = get_num_agvs_from_mqtt(BROKER, PORT, AGV_COUNT_TOPIC)
     if num_agvs is None:
@@ -238,14 +670,29 @@ def main():
     for agv in agv_list:
         agv.set_other_agvs(agv_list)
 
-    workers = [AGVWorker(agv, MISSIONS_TOPIC) for agv in agv_list]
+    # Node reservations and deadlock detection shared by all the AGVs
+    traffic = TrafficController()
+    monitor = TrafficMonitor(traffic)
+    monitor.start()
+
+    # Graph and node positions built once and shared by all the AGVs
+    model = SharedWarehouseModel()
+    workers = [AGVWorker(agv, MISSIONS_TOPIC, traffic, model) for agv in agv_list]
     for w in workers:
         w.start()
 
+    fleet_publisher = None
+    if POSITION_REPORTING == "fleet":
+        fleet_publisher = FleetStatePublisher(workers)
+        fleet_publisher.start()
+
     try:
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
+        monitor.stop()
+        if fleet_publisher is not None:
+            fleet_publisher.stop()
         for w in workers:
             w.stop()
         for w in workers:
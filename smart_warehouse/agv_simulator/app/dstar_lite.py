@@ -0,0 +1,130 @@
+import heapq
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+INFINITY = float('inf')
+
+
+class DStarLite:
+    """
+    D* Lite (Koenig & Likhachev) incremental shortest path from a moving AGV to a fixed goal.
+
+    The search runs backwards from the goal, so when edges are blocked or
+    freed while the AGV drives only the nodes whose distance to the goal
+    changed are updated, instead of planning again from scratch.
+    Edges cost one hop, blocked edges cost infinity.
+    """
+
+    def __init__(self, graph, start, goal, blocked_edges: Iterable = ()):
+        """
+        Args:
+            graph: NetworkX warehouse graph (nodes with the 'grid_pos' attribute)
+            start: Current node of the AGV
+            goal: Node to reach
+            blocked_edges: Edges that cannot be driven, as (u, v) pairs
+        """
+        self.graph = graph
+        self.start = start
+        self.goal = goal
+        self.last = start
+        self.blocked: Set[frozenset] = {frozenset(edge) for edge in blocked_edges}
+        self.km = 0
+        self.g: Dict = {}
+        self.rhs: Dict = {goal: 0}
+        # Priority queue with lazy deletion: a heap entry is valid if its key is still the one in queued
+        self.heap: List = []
+        self.queued: Dict = {}
+        self._counter = 0
+        self._push(goal)
+        self.compute_shortest_path()
+
+    def _heuristic(self, a, b) -> int:
+        (a_row, a_col), (b_row, b_col) = self.graph.nodes[a]['grid_pos'], self.graph.nodes[b]['grid_pos']
+        return abs(a_row - b_row) + abs(a_col - b_col)
+
+    def _cost(self, u, v) -> float:
+        return INFINITY if frozenset((u, v)) in self.blocked else 1
+
+    def _key(self, node) -> Tuple[float, float]:
+        best = min(self.g.get(node, INFINITY), self.rhs.get(node, INFINITY))
+        return best + self._heuristic(self.start, node) + self.km, best
+
+    def _push(self, node):
+        key = self._key(node)
+        self.queued[node] = key
+        self._counter += 1
+        heapq.heappush(self.heap, (key, self._counter, node))
+
+    def _top(self):
+        """ Return the (key, node) of the queue with the smallest key, dropping stale entries"""
+        while self.heap:
+            key, _, node = self.heap[0]
+            if self.queued.get(node) == key:
+                return key, node
+            heapq.heappop(self.heap)
+        return (INFINITY, INFINITY), None
+
+    def _update_vertex(self, node):
+        if node != self.goal:
+            self.rhs[node] = min((self._cost(node, neighbor) + self.g.get(neighbor, INFINITY)
+                                  for neighbor in self.graph.neighbors(node)), default=INFINITY)
+        self.queued.pop(node, None)
+        if self.g.get(node, INFINITY) != self.rhs.get(node, INFINITY):
+            self._push(node)
+
+    def compute_shortest_path(self):
+        while True:
+            key, node = self._top()
+            if node is None:
+                break
+            start_key = self._key(self.start)
+            if key >= start_key and self.rhs.get(self.start, INFINITY) == self.g.get(self.start, INFINITY):
+                break
+            new_key = self._key(node)
+            if key < new_key:
+                self._push(node)
+            elif self.g.get(node, INFINITY) > self.rhs.get(node, INFINITY):
+                self.g[node] = self.rhs[node]
+                self.queued.pop(node, None)
+                for neighbor in self.graph.neighbors(node):
+                    self._update_vertex(neighbor)
+            else:
+                self.g[node] = INFINITY
+                self.queued.pop(node, None)
+                self._update_vertex(node)
+                for neighbor in self.graph.neighbors(node):
+                    self._update_vertex(neighbor)
+
+    def move_to(self, node):
+        """ The AGV reached node: the following searches start from there"""
+        self.km += self._heuristic(self.last, node)
+        self.last = node
+        self.start = node
+
+    def set_blocked_edges(self, blocked_edges: Iterable):
+        """ Replace the set of blocked edges and repair the distances of the affected nodes only"""
+        blocked = {frozenset(edge) for edge in blocked_edges}
+        changed = blocked ^ self.blocked
+        if not changed:
+            return
+        self.km += self._heuristic(self.last, self.start)
+        self.last = self.start
+        self.blocked = blocked
+        for edge in changed:
+            for node in edge:
+                if node in self.graph:
+                    self._update_vertex(node)
+        self.compute_shortest_path()
+
+    def path(self) -> Optional[List]:
+        """ Return the current shortest path from the start to the goal, or None if the goal cannot be reached"""
+        if self.g.get(self.start, INFINITY) == INFINITY:
+            return None
+        path = [self.start]
+        node = self.start
+        while node != self.goal:
+            node = min(self.graph.neighbors(node),
+                       key=lambda neighbor: self._cost(path[-1], neighbor) + self.g.get(neighbor, INFINITY))
+            if self._cost(path[-1], node) == INFINITY or len(path) > len(self.g) + 1:
+                return None
+            path.append(node)
+        return path
@@ -0,0 +1,170 @@
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Deadlock resolution policies, in the order the victim tries them
+REROUTE, BACKOFF, YIELD = "reroute", "backoff", "yield"
+
+
+class TrafficController:
+    """
+    Node reservations shared by the AGVWorker threads of the simulator.
+
+    An AGV may only drive into a node it reserved, and it holds the nodes it
+    stands on until it leaves them. An AGV waiting for a node reserved by
+    another one waits for that AGV: these relations form the wait-for graph.
+    Each AGV waits for at most one other, so every deadlock is a simple cycle,
+    found by following the waits. tick() detects the cycles and picks one
+    victim per cycle, which must resolve it (reroute, back off or yield).
+    The victim is the AGV of the cycle with the lowest priority (see
+    priority()): the same AGV gives way every time two AGVs meet, so a
+    backoff in a single-lane corridor cannot bounce between them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # node -> AGV id holding it, AGV id -> nodes held
+        self.reservations: Dict = {}
+        self.held: Dict[str, set] = {}
+        # AGV id -> (wanted node, waiting since)
+        self.waiting: Dict[str, tuple] = {}
+        # AGV id -> deadlock event it must resolve
+        self.instructions: Dict[str, dict] = {}
+        self.deadlocks = 0
+        self.resolutions = {REROUTE: 0, BACKOFF: 0, YIELD: 0}
+        # AGV id -> seconds lost waiting for reservations
+        self.lost_time_s: Dict[str, float] = {}
+
+    def _stop_waiting(self, agv_id: str):
+        wait = self.waiting.pop(agv_id, None)
+        if wait is not None:
+            self.lost_time_s[agv_id] = self.lost_time_s.get(agv_id, 0.0) + time.time() - wait[1]
+
+    def try_reserve(self, agv_id: str, node) -> bool:
+        """ Reserve a node for an AGV. If another AGV holds it, the AGV is recorded as waiting for it"""
+        with self.lock:
+            holder = self.reservations.get(node)
+            if holder is None or holder == agv_id:
+                self.reservations[node] = agv_id
+                self.held.setdefault(agv_id, set()).add(node)
+                self._stop_waiting(agv_id)
+                return True
+            if self.waiting.get(agv_id, (None,))[0] != node:
+                self._stop_waiting(agv_id)
+                self.waiting[agv_id] = (node, time.time())
+            return False
+
+    def stop_waiting(self, agv_id: str):
+        with self.lock:
+            self._stop_waiting(agv_id)
+
+    def release(self, agv_id: str, node):
+        with self.lock:
+            if self.reservations.get(node) == agv_id:
+                del self.reservations[node]
+            self.held.get(agv_id, set()).discard(node)
+
+    def release_all(self, agv_id: str):
+        """ Release every node of an AGV (e.g. when it parks at the end of a mission)"""
+        with self.lock:
+            for node in self.held.pop(agv_id, set()):
+                if self.reservations.get(node) == agv_id:
+                    del self.reservations[node]
+            self._stop_waiting(agv_id)
+            self.instructions.pop(agv_id, None)
+
+    def is_reserved_by_other(self, agv_id: str, node) -> bool:
+        with self.lock:
+            return self.reservations.get(node, agv_id) != agv_id
+
+    def is_used_by_other(self, agv_id: str, nodes) -> bool:
+        """ Return whether another AGV holds or waits for any of the nodes"""
+        with self.lock:
+            return any(self.reservations.get(node, agv_id) != agv_id for node in nodes) or \
+                any(node in nodes for other, (node, _) in self.waiting.items() if other != agv_id)
+
+    def wait_for_graph(self) -> Dict[str, str]:
+        """ Return the wait-for graph: waiting AGV id -> id of the AGV holding the node it wants"""
+        with self.lock:
+            return self._wait_for_graph()
+
+    def _wait_for_graph(self) -> Dict[str, str]:
+        graph = {}
+        for agv_id, (node, _) in self.waiting.items():
+            holder = self.reservations.get(node)
+            if holder is not None and holder != agv_id:
+                graph[agv_id] = holder
+        return graph
+
+    @staticmethod
+    def priority(agv_id: str) -> tuple:
+        """ Sort key of the AGV priorities: the smaller the id the higher the priority (agv_2 before agv_10)"""
+        return tuple((0, int(part)) if part.isdigit() else (1, part) for part in re.split(r'(\d+)', str(agv_id)))
+
+    @staticmethod
+    def find_cycles(wait_for: Dict[str, str]) -> List[List[str]]:
+        """ Return the cycles of a wait-for graph where every AGV waits for at most one other"""
+        cycles = []
+        state = {}  # AGV id -> index of the walk that visited it
+        for walk, start in enumerate(wait_for):
+            agv_id = start
+            order = []
+            while agv_id is not None and agv_id not in state:
+                state[agv_id] = walk
+                order.append(agv_id)
+                agv_id = wait_for.get(agv_id)
+            if agv_id is not None and state[agv_id] == walk:
+                # The walk closed on itself: the cycle starts where agv_id was first met
+                cycles.append(order[order.index(agv_id):])
+        return cycles
+
+    def tick(self) -> List[dict]:
+        """
+        Detect the deadlocks and choose a victim for each of them. Returns the
+        new deadlock events: {"agvs", "nodes", "victim", "timestamp"}.
+        """
+        events = []
+        with self.lock:
+            for cycle in self.find_cycles(self._wait_for_graph()):
+                if any(agv_id in self.instructions for agv_id in cycle):
+                    # Already being resolved
+                    continue
+                now = time.time()
+                # Victim: the AGV with the lowest priority, always the same for the same AGVs
+                victim = max(cycle, key=self.priority)
+                self.deadlocks += 1
+                event = {
+                    "agvs": cycle,
+                    "nodes": [self.waiting[agv_id][0] for agv_id in cycle],
+                    "victim": victim,
+                    "timestamp": now
+                }
+                self.instructions[victim] = event
+                events.append(event)
+        return events
+
+    def take_instruction(self, agv_id: str) -> Optional[dict]:
+        """ Return the deadlock event the AGV must resolve, if it was chosen as victim"""
+        with self.lock:
+            return self.instructions.pop(agv_id, None)
+
+    def report_resolution(self, policy: str):
+        with self.lock:
+            self.resolutions[policy] += 1
+
+    def get_metrics(self) -> dict:
+        with self.lock:
+            now = time.time()
+            # Include the time of the waits still in progress
+            lost_time = dict(self.lost_time_s)
+            for agv_id, (_, since) in self.waiting.items():
+                lost_time[agv_id] = lost_time.get(agv_id, 0.0) + now - since
+            return {
+                "deadlocks": self.deadlocks,
+                "resolutions": dict(self.resolutions),
+                "waiting_agvs": len(self.waiting),
+                "lost_time_s": {agv_id: round(seconds, 2) for agv_id, seconds in lost_time.items()},
+                "total_lost_time_s": round(sum(lost_time.values()), 2),
+                "timestamp": now
+            }
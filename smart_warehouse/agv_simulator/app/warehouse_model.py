@@ -0,0 +1,60 @@
+import threading
+from types import MappingProxyType
+from typing import Dict, Optional, Tuple
+
+import networkx as nx
+
+from warehouse_layout import WarehouseLayout
+
+# Fields of the layout message identifying a layout (the timestamp changes at every publish)
+LAYOUT_KEY_FIELDS = ("layout_version", "shelves", "columns", "levels", "agvs", "height", "width", "grid_crc32")
+
+
+class WarehouseModel:
+    """
+    Immutable snapshot of the warehouse built from one layout message: the
+    frozen graph, the node positions (row, col) and the grid width.
+    The same instance is referenced by all the AGVWorker threads.
+    """
+
+    def __init__(self, layout: WarehouseLayout, key: Tuple):
+        self.key = key
+        self.width = layout.width
+        self.height = layout.height
+        self.graph = nx.freeze(layout.build_graph())
+        self.node_positions = MappingProxyType(layout.get_node_positions())
+
+
+class SharedWarehouseModel:
+    """
+    Current WarehouseModel of the simulator. The layout message is received
+    by every worker, but the model is built only once per layout: the other
+    workers get the instance already built. A new layout replaces the whole
+    model with a single assignment, so a reader sees either the old or the
+    new graph and positions, never a mix of the two.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current: Optional[WarehouseModel] = None
+
+    @staticmethod
+    def layout_key(payload: Dict) -> Tuple:
+        return tuple(payload.get(field) for field in LAYOUT_KEY_FIELDS)
+
+    def update(self, payload: Dict) -> WarehouseModel:
+        """
+        Return the model of a layout message, building it if the layout changed.
+        Raises ValueError if the layout cannot be rebuilt (see WarehouseLayout.from_payload).
+        """
+        key = self.layout_key(payload)
+        model = self.current
+        if model is not None and model.key == key:
+            return model
+        with self.lock:
+            # Another worker may have built it while this one was waiting
+            if self.current is not None and self.current.key == key:
+                return self.current
+            model = WarehouseModel(WarehouseLayout.from_payload(payload), key)
+            self.current = model
+            return model
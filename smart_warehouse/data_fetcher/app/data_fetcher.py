@@ -1,4 +1,5 @@
 
+import hashlib
 import json
 import requests
 import paho.mqtt.client as mqtt
@@ -8,6 +9,20 @@ import time
 
 # Dizionario globale per lo stato degli slot
 slot_status = {}
+# Slot modificati dall'ultimo invio riuscito all'API
+dirty_slot_ids = set()
+# XOR of the digests of all slots in slot_status, compared with the digest returned by the API
+slot_status_digest = 0
+slot_lock = threading.Lock()
+
+# Coalescing buffer: only the newest position of each AGV is kept until the next flush
+agv_position_buffer = {}
+# Full-rate measured position samples, forwarded to the telemetry sink when enabled
+# (the dead-reckoned positions are not measurements and are not recorded)
+agv_position_history = {}
+# Last segment reported by each AGV (start, end, speed, ETA), positions are interpolated on it
+agv_segments = {}
+agv_buffer_lock = threading.Lock()
 
 
 CONF_FILE_PATH = "C:/Users/alexa/Desktop/Università/Magistrale/Distributed and IoT/D_Iot_project/V8/data_fetcher/app/fetcher_conf.yaml"
@@ -20,7 +35,14 @@ configuration_dict = {
     "target_param_topic": "warehouse/config/param/#",
     "target_agv_topic": "warehouse/agv/#",
     "target_slots_topic": "warehouse/slots/#",
-    "device_api_url": "http://127.0.0.1:7070/api/v1/iot/inventory/location/l0001/device"
+    "target_fleet_topic": "warehouse/fleet/state",
+    "target_segment_topic": "warehouse/agv/+/segment",
+    "device_api_url": "http://127.0.0.1:7070/api/v1/iot/inventory/location/l0001/device",
+    "slots_post_interval": 10,
+    "slots_full_sync_interval": 300,
+    "agv_flush_interval": 1.0,
+    "agv_history_url": None,
+    "agv_history_max_samples": 1000
 }
 
 # Read Configuration from target Configuration File Path
@@ -42,15 +64,32 @@ mqtt_broker_port = configuration_dict["broker_port"]
 mqtt_topic_parameters = configuration_dict["target_param_topic"]
 mqtt_topic_agvs = configuration_dict["target_agv_topic"]
 mqtt_topic_slots = configuration_dict["target_slots_topic"]
+# Batched state of the whole fleet (simulator in "fleet" reporting mode)
+mqtt_topic_fleet = configuration_dict.get("target_fleet_topic", "warehouse/fleet/state")
+# Straight segments driven by the AGVs (simulator in "segment" reporting mode)
+mqtt_topic_segments = configuration_dict.get("target_segment_topic", "warehouse/agv/+/segment")
 
 # HTTP API Configuration
 api_url = configuration_dict["device_api_url"]
 
+# Slot sync: seconds between two delta pushes and between two reconciliations with the API
+slots_post_interval = configuration_dict.get("slots_post_interval", 10)
+slots_full_sync_interval = configuration_dict.get("slots_full_sync_interval", 300)
+
+# AGV position coalescing: seconds between two flushes towards the API
+agv_flush_interval = configuration_dict.get("agv_flush_interval", 1.0)
+# Optional telemetry sink receiving the full-rate position history (disabled if empty)
+agv_history_url = configuration_dict.get("agv_history_url")
+# Samples kept per AGV while the telemetry sink is unreachable (the oldest are dropped first)
+agv_history_max_samples = configuration_dict.get("agv_history_max_samples", 1000)
+
 def on_connect(client, userdata, flags, rc):
     print("Connected to MQTT Broker with result code " + str(rc))
     client.subscribe(mqtt_topic_parameters)
     client.subscribe(mqtt_topic_agvs)
     client.subscribe(mqtt_topic_slots)
+    client.subscribe(mqtt_topic_fleet)
+    client.subscribe(mqtt_topic_segments)
     
 def on_message(client, userdata, msg):
     try:
@@ -103,34 +142,121 @@ def on_message(client, userdata, msg):
                         print(f"Failed to register parameter {api_param}. Status code: {response.status_code} Response: {response.text}")
             if not found:
                 print(f"[ERROR] MQTT message missing 'type' field and no known parameters found: {payload_dict}")
-        # Gestione posizione AGV
+        # Stato della flotta: una riga [agv_id, x, y, heading, status] per AGV
+        if mqtt.topic_matches_sub(mqtt_topic_fleet, msg.topic):
+            fields = payload_dict.get("fields", [])
+            for row in payload_dict.get("agvs", []):
+                agv = dict(zip(fields, row))
+                buffer_agv_position({
+                    "agv_id": agv["agv_id"],
+                    "position": [agv["x"], agv["y"]],
+                    "timestamp": payload_dict.get("timestamp")
+                })
+            return
+        # Segmento percorso dall'AGV: le posizioni vengono interpolate ad ogni flush
+        if mqtt.topic_matches_sub(mqtt_topic_segments, msg.topic):
+            if payload_dict.get("agv_id") is not None and payload_dict.get("start") is not None:
+                with agv_buffer_lock:
+                    agv_segments[payload_dict["agv_id"]] = payload_dict
+                    # The start of a segment is a measured position, recorded in the history
+                    if agv_history_url:
+                        agv_position_history.setdefault(payload_dict["agv_id"], []).append({
+                            "agv_id": payload_dict["agv_id"],
+                            "position": payload_dict["start"],
+                            "timestamp": payload_dict.get("start_time")
+                        })
+            else:
+                print(f"[ERROR] Messaggio segmento AGV non valido: {payload_dict}")
+            return
+        # Gestione posizione AGV: coalescing sull'ultima posizione ricevuta
         if mqtt.topic_matches_sub(mqtt_topic_agvs, msg.topic):
             agv_id = payload_dict.get("agv_id")
             position = payload_dict.get("position")
             timestamp = payload_dict.get("timestamp")
             if agv_id is not None and position is not None:
-                agv_position_url = f"{api_url}/agv/{agv_id}/position"
                 pos_payload = {
                     "agv_id": agv_id,
                     "position": position,
                     "timestamp": timestamp
                 }
-                response = requests.post(agv_position_url, json=pos_payload)
-                if response.status_code == 201:
-                    print(f"Posizione AGV {agv_id} registrata correttamente.")
-                else:
-                    print(f"Errore registrazione posizione AGV {agv_id}. Status code: {response.status_code} Response: {response.text}")
+                buffer_agv_position(pos_payload)
             else:
                 print(f"[ERROR] Messaggio posizione AGV non valido: {payload_dict}")
         # Gestione slot: aggiorna dizionario globale slot_status
         if mqtt.topic_matches_sub(mqtt_topic_slots, msg.topic):
             slot_id = payload_dict.get("slot_id")
             if slot_id is not None:
-                slot_status[slot_id] = payload_dict
+                update_slot_status(slot_id, payload_dict)
     except Exception as e:
         print(f"Error processing MQTT message: {str(e)}")
 
 
+def slot_digest(slot):
+    """Return a stable 64 bit hash of a slot status, independent from the key order"""
+    encoded = json.dumps(slot, sort_keys=True).encode()
+    return int.from_bytes(hashlib.sha1(encoded).digest()[:8], 'big')
+
+
+def update_slot_status(slot_id, slot):
+    """Store a slot status and mark it for the next delta push if it changed"""
+    global slot_status_digest
+    with slot_lock:
+        old_slot = slot_status.get(slot_id)
+        if old_slot == slot:
+            return
+        if old_slot is not None:
+            slot_status_digest ^= slot_digest(old_slot)
+        slot_status[slot_id] = slot
+        slot_status_digest ^= slot_digest(slot)
+        dirty_slot_ids.add(slot_id)
+
+
+def buffer_agv_position(pos_payload, measured=True):
+    """Store an AGV position sample, superseding any older sample not yet flushed.
+    Only measured samples are recorded in the history (not the dead-reckoned ones)"""
+    agv_id = pos_payload["agv_id"]
+    with agv_buffer_lock:
+        current = agv_position_buffer.get(agv_id)
+        # Out of order samples must not overwrite a newer position
+        if current is None or (pos_payload["timestamp"] or 0) >= (current["timestamp"] or 0):
+            agv_position_buffer[agv_id] = pos_payload
+        if agv_history_url and measured:
+            agv_position_history.setdefault(agv_id, []).append(pos_payload)
+
+
+def requeue_agv_history(agv_id, samples):
+    """Put back the samples of a failed history batch, before the ones received in the meantime"""
+    with agv_buffer_lock:
+        history = samples + agv_position_history.get(agv_id, [])
+        agv_position_history[agv_id] = history[-agv_history_max_samples:]
+
+
+def interpolate_segment(segment, timestamp):
+    """Return the position of an AGV at timestamp, driving the segment at constant speed"""
+    start, end = segment["start"], segment["end"]
+    duration = segment["eta"] - segment["start_time"]
+    frac = 1.0 if duration <= 0 else min(1.0, max(0.0, (timestamp - segment["start_time"]) / duration))
+    return [start[0] + frac * (end[0] - start[0]), start[1] + frac * (end[1] - start[1])]
+
+
+def dead_reckon_agv_positions():
+    """Buffer the interpolated position of the AGVs driving a segment (and the end of the finished ones)"""
+    now = time.time()
+    with agv_buffer_lock:
+        segments = list(agv_segments.items())
+    for agv_id, segment in segments:
+        buffer_agv_position({
+            "agv_id": agv_id,
+            "position": interpolate_segment(segment, now),
+            "timestamp": now
+        }, measured=False)
+        if now >= segment["eta"]:
+            # The AGV reached the end: its position does not change until the next segment
+            with agv_buffer_lock:
+                if agv_segments.get(agv_id) is segment:
+                    del agv_segments[agv_id]
+
+
 # Create MQTT client
 client = mqtt.Client()
 client.on_connect = on_connect
@@ -140,29 +266,98 @@ client.on_message = on_message
 client.connect(mqtt_broker_host, mqtt_broker_port, 60)
 
 
-# Funzione per inviare periodicamente tutti gli slot all'API HTTP
+# Funzione per inviare periodicamente all'API HTTP solo gli slot modificati
 
 def post_all_slots_periodically():
     print("[DEBUG] Thread di invio slot partito!")
+    # The first push after start-up always carries the full snapshot
+    full_sync_required = True
+    last_reconciliation = time.time()
     while True:
-        try:
-            print(f"[DEBUG] Stato attuale slot_status: {slot_status}")
-            if slot_status:
-                print(f"[DEBUG] Invio {len(slot_status)} slot all'API...")
+        reconcile = time.time() - last_reconciliation >= slots_full_sync_interval
+        with slot_lock:
+            full_sync = full_sync_required and bool(slot_status)
+            if full_sync:
+                slots_to_send = list(slot_status.values())
+            else:
+                slots_to_send = [slot_status[slot_id] for slot_id in dirty_slot_ids]
+            sent_slot_ids = set(dirty_slot_ids)
+            dirty_slot_ids.clear()
+            expected_digest = format(slot_status_digest, '016x')
+        # An empty delta is still sent when reconciling, to compare the digests
+        if slots_to_send or reconcile:
+            try:
+                print(f"[DEBUG] Invio {len(slots_to_send)} slot all'API (full_sync={full_sync})...")
                 response = requests.post(
                     f"{api_url}/slots",
-                    json={"slots": list(slot_status.values())}
+                    json={"slots": slots_to_send, "full_sync": full_sync}
                 )
                 print(f"POST slots: {response.status_code}")
-            else:
-                print("[DEBUG] Nessuno slot da inviare.")
-        except Exception as e:
-            print(f"Error posting slots: {e}")
-        time.sleep(10)  # ogni 10 secondi
+                if response.status_code == 201:
+                    # A different digest means the API lost or altered some slot (e.g. restart)
+                    full_sync_required = response.json().get("digest") != expected_digest
+                    if full_sync_required:
+                        print("[DEBUG] Slot digest mismatch, full sync scheduled.")
+                    if reconcile:
+                        last_reconciliation = time.time()
+                else:
+                    with slot_lock:
+                        dirty_slot_ids.update(sent_slot_ids)
+            except Exception as e:
+                print(f"Error posting slots: {e}")
+                with slot_lock:
+                    dirty_slot_ids.update(sent_slot_ids)
+        time.sleep(slots_post_interval)
+
+# Funzione per inviare all'API HTTP solo l'ultima posizione di ogni AGV
+
+def post_agv_positions_periodically():
+    print(f"[DEBUG] Thread di invio posizioni AGV partito (intervallo {agv_flush_interval}s)")
+    while True:
+        time.sleep(agv_flush_interval)
+        dead_reckon_agv_positions()
+        # Swap the buffers so MQTT callbacks are never blocked by HTTP requests
+        with agv_buffer_lock:
+            pending_positions = dict(agv_position_buffer)
+            agv_position_buffer.clear()
+            pending_history = dict(agv_position_history)
+            agv_position_history.clear()
+        # All the positions in a single request
+        if pending_positions:
+            try:
+                response = requests.post(f"{api_url}/agv/positions", json={"agvs": list(pending_positions.values())})
+                if response.status_code == 201:
+                    print(f"Posizioni di {len(pending_positions)} AGV registrate correttamente.")
+                else:
+                    print(f"Errore registrazione posizioni AGV. Status code: {response.status_code} Response: {response.text}")
+            except Exception as e:
+                print(f"Error posting AGV positions: {e}")
+                # Retry on next flush unless a newer position arrived in the meantime
+                with agv_buffer_lock:
+                    for agv_id, pos_payload in pending_positions.items():
+                        agv_position_buffer.setdefault(agv_id, pos_payload)
+        for agv_id, samples in pending_history.items():
+            telemetry_url = f"{agv_history_url}/{agv_id}/telemetry"
+            history_payload = [
+                {"value": sample["position"], "timestamp": sample["timestamp"], "data_type": "agv_position"}
+                for sample in samples
+            ]
+            try:
+                response = requests.post(telemetry_url, json=history_payload)
+                if response.status_code != 201:
+                    print(f"Errore invio storico AGV {agv_id}. Status code: {response.status_code}")
+                    # Server errors are retried on the next flush, a rejected batch would fail again
+                    if response.status_code >= 500:
+                        requeue_agv_history(agv_id, samples)
+            except Exception as e:
+                print(f"Error posting AGV {agv_id} history: {e}")
+                requeue_agv_history(agv_id, samples)
 
 # Avvia il thread per la pubblicazione periodica
 print("[DEBUG] Avvio thread per invio periodico slot...")
 threading.Thread(target=post_all_slots_periodically, daemon=True).start()
+print("[DEBUG] Avvio thread per invio periodico posizioni AGV...")
+threading.Thread(target=post_agv_positions_periodically, daemon=True).start()
 
 # Avvia il loop MQTT (bloccante)
 client.loop_forever()
\ No newline at end of file
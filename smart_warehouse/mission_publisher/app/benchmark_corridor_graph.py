@@ -0,0 +1,53 @@
+import random
+import sys
+import time
+import networkx as nx
+
+from corridor_graph import CorridorGraph
+from routing import routing_view
+from travel_time import HOP_COUNT_MODEL
+
+from warehouse_layout import WarehouseLayout
+
+
+def benchmark(shelves: int, columns: int, queries: int = 200, levels: int = 3, agvs: int = 2):
+    layout = WarehouseLayout(shelves, columns, levels, agvs)
+    start = time.perf_counter()
+    graph = routing_view(layout.build_graph())
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    # Hop count costs, to compare the paths with the unweighted nx.shortest_path
+    planner = CorridorGraph(graph, HOP_COUNT_MODEL)
+    contract_ms = (time.perf_counter() - start) * 1000
+
+    # Missions go from the pallet spawn node to the accessible nodes of the shelves
+    spawn = layout.get_pallet_spawn_nodes()[0]
+    targets = [layout.get_accessible_node(shelf) for shelf in layout.get_shelf_nodes()]
+    random.seed(0)
+    pairs = [(spawn, random.choice(targets)) for _ in range(queries // 2)]
+    drivable = list(graph.nodes())
+    pairs += [(random.choice(drivable), random.choice(drivable)) for _ in range(queries - len(pairs))]
+
+    start = time.perf_counter()
+    networkx_paths = [nx.shortest_path(graph, source, target) for source, target in pairs]
+    networkx_ms = (time.perf_counter() - start) * 1000 / len(pairs)
+    start = time.perf_counter()
+    planner_paths = [planner.shortest_path(source, target) for source, target in pairs]
+    planner_ms = (time.perf_counter() - start) * 1000 / len(pairs)
+    assert [len(path) for path in planner_paths] == [len(path) for path in networkx_paths]
+
+    print(f"{shelves} shelves x {columns} columns ({layout.height}x{layout.width} grid, {len(layout.cells)} cells)")
+    print(f"  routing graph:     {graph.number_of_nodes():>9} nodes, {graph.number_of_edges():>9} edges, built in {build_ms:9.1f} ms")
+    print(f"  corridor graph:    {len(planner.junctions):>9} nodes, "
+          f"{len(planner.corridors):>9} edges, built in {contract_ms:9.1f} ms")
+    print(f"  nx.shortest_path:  {networkx_ms:9.3f} ms/query")
+    print(f"  corridor planner:  {planner_ms:9.3f} ms/query")
+
+
+if __name__ == "__main__":
+    # Usage: python benchmark_corridor_graph.py [shelves columns]...
+    # Default sizes: about 10k, 100k and 1M grid cells
+    sizes = [(int(sys.argv[i]), int(sys.argv[i + 1])) for i in range(1, len(sys.argv) - 1, 2)]
+    for shelves, columns in sizes or [(46, 94), (156, 310), (496, 994)]:
+        benchmark(shelves, columns)
@@ -0,0 +1,61 @@
+import time
+from typing import Dict, Optional
+
+
+class CongestionMap:
+    """
+    Live occupancy of the warehouse cells, from the positions published by
+    the AGVs on warehouse/agv/<id>/position.
+
+    A position is the (row, col) grid position of the AGV, interpolated while
+    it drives from a node to the next one: the AGV occupies the nearest node.
+    Positions older than stale_after_s are dropped, so stopped or disconnected
+    AGVs do not congest the map forever.
+    """
+
+    def __init__(self, graph, stale_after_s: float = 10.0):
+        """
+        Args:
+            graph: NetworkX warehouse graph (nodes with the 'grid_pos' attribute)
+            stale_after_s: Seconds after which the last position of an AGV is ignored
+        """
+        self.stale_after_s = stale_after_s
+        self.node_at = {tuple(grid_pos): node for node, grid_pos in graph.nodes(data='grid_pos')}
+        # AGV id -> (occupied node, reception time of the position)
+        self.occupancy: Dict[str, tuple] = {}
+
+    def _locate(self, position) -> Optional[int]:
+        return self.node_at.get((round(float(position[0])), round(float(position[1]))))
+
+    def update(self, agv_id: str, position) -> bool:
+        """
+        Record the position of an AGV. Returns True if the occupancy changed
+        (the AGV reached another node, or stale AGVs were dropped).
+        """
+        now = time.time()
+        changed = False
+        for stale_agv in [agv for agv, (_, seen) in self.occupancy.items() if now - seen > self.stale_after_s]:
+            del self.occupancy[stale_agv]
+            changed = True
+        node = self._locate(position)
+        previous = self.occupancy.pop(agv_id, None)
+        if node is not None:
+            self.occupancy[agv_id] = (node, now)
+        return changed or (previous[0] if previous else None) != node
+
+    def mark_deadlock(self, nodes):
+        """
+        Record the nodes of a traffic deadlock reported by the AGV simulator:
+        they count as occupied until they become stale, so the new missions
+        avoid them while the deadlock is being resolved.
+        """
+        now = time.time()
+        for node in nodes:
+            self.occupancy[f"deadlock/{node}"] = (node, now)
+
+    def node_counts(self) -> Dict[int, int]:
+        """ Return the number of AGVs on each occupied node"""
+        counts = {}
+        for node, _ in self.occupancy.values():
+            counts[node] = counts.get(node, 0) + 1
+        return counts
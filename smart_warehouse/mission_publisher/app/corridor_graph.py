@@ -0,0 +1,400 @@
+import heapq
+from bisect import bisect_left, bisect_right
+import networkx as nx
+from typing import Dict, List, Optional, Tuple
+from travel_time import TravelTimeModel
+
+
+def _reverse(direction):
+    return None if direction is None else (-direction[0], -direction[1])
+
+
+class CorridorGraph:
+    """
+    Contracted version of the warehouse routing graph for path searches.
+
+    The layouts are made of long single-lane corridors (e.g. the gaps between
+    two shelves), whose cells have exactly two neighbours. Every maximal chain
+    of such cells is collapsed into one weighted super-edge between the two
+    junctions (nodes with a degree other than 2) at its ends, so a search only
+    expands junctions. Sources and targets inside a corridor are attached to
+    the two junctions of their corridor, and the cell path is rebuilt from the
+    corridors of the junction path only at the end.
+
+    Costs are travel times of the TravelTimeModel: the search states are
+    (junction, heading) pairs, so that the turns taken at the junctions are
+    paid. With HOP_COUNT_MODEL the paths have the same length as
+    nx.shortest_path on the original graph.
+    """
+
+    def __init__(self, graph: nx.Graph, model: Optional[TravelTimeModel] = None):
+        """
+        Args:
+            graph: Routing graph with the 'pos' node attribute (e.g. the warehouse graph without shelf nodes)
+            model: Travel time model of the costs (default TravelTimeModel())
+        """
+        self.graph = graph
+        self.model = model or TravelTimeModel()
+        self.positions = dict(graph.nodes(data='pos'))
+        # Corridors as cell lists, from a junction to a junction (interior cells have degree 2)
+        self.corridors: List[List] = []
+        # Interior cell -> (corridor index, position in the corridor)
+        self.corridor_of: Dict = {}
+        # Per corridor: cost of walking from its first cell to each cell, and turn time at each cell
+        self.corridor_prefix: List[List[float]] = []
+        self.corridor_turns: List[List[float]] = []
+        # Junction -> corridors leaving it, as (corridor index, walked forward, junction at the other end,
+        # cost, first direction, last direction) in the walking direction
+        self.adjacency: Dict = {}
+        # (incoming direction, outgoing direction) -> turn time, filled for all the directions of the graph
+        self._turn_times: Dict = {}
+        # Corridor index -> sorted positions k of its blocked edges (between cells k and k + 1)
+        self.blocked: Dict[int, List[int]] = {}
+        # Congestion penalties: junction -> time, corridor index -> sorted positions of the occupied
+        # cells (repeated for each AGV) and their total time
+        self.junction_congestion: Dict = {}
+        self.corridor_congestion: Dict[int, List[int]] = {}
+        self.corridor_congestion_total: Dict[int, float] = {}
+
+        self.junctions = {node for node, degree in graph.degree() if degree != 2}
+        for junction in list(self.junctions):
+            self._walk_corridors(junction)
+        # Cycles without any junction: promote one of their cells to junction
+        for node in graph.nodes():
+            if node not in self.junctions and node not in self.corridor_of:
+                self.junctions.add(node)
+                self._walk_corridors(node)
+        # Corridors are also walked backwards: add the reversed directions
+        directions = {key[1] for key in self._turn_times}
+        directions |= {_reverse(direction) for direction in directions} | {None}
+        for incoming in directions:
+            for outgoing in directions:
+                self._turn_time(incoming, outgoing)
+
+    def _walk_corridors(self, junction):
+        """Follow every corridor leaving a junction and record it."""
+        self.adjacency.setdefault(junction, [])
+        for neighbor in self.graph.neighbors(junction):
+            if neighbor in self.corridor_of:
+                # Corridor already walked from its other end
+                continue
+            if neighbor in self.junctions and any(edge[2] == neighbor and len(self.corridors[edge[0]]) == 2
+                                                  for edge in self.adjacency[junction]):
+                # Junction to junction edge already walked from its other end
+                continue
+            cells = [junction]
+            previous, current = junction, neighbor
+            while current not in self.junctions:
+                cells.append(current)
+                following = [node for node in self.graph.neighbors(current) if node != previous]
+                previous, current = current, following[0]
+            cells.append(current)
+            self._add_corridor(cells)
+
+    def _add_corridor(self, cells: List):
+        index = len(self.corridors)
+        self.corridors.append(cells)
+        prefix, turns = [0.0], []
+        last = None
+        for u, v in zip(cells, cells[1:]):
+            direction = self._direction(u, v)
+            turns.append(self._turn_time(last, direction))
+            prefix.append(prefix[-1] + turns[-1] + self.model.drive_time(direction))
+            last = direction
+        turns.append(0.0)
+        self.corridor_prefix.append(prefix)
+        self.corridor_turns.append(turns)
+        cost, first, last = self._segment(index, 0, len(cells) - 1)
+        for position in range(1, len(cells) - 1):
+            self.corridor_of[cells[position]] = (index, position)
+        start, end = cells[0], cells[-1]
+        self.adjacency.setdefault(start, []).append((index, True, end, cost, first, last))
+        self.adjacency.setdefault(end, []).append((index, False, start, cost, _reverse(last), _reverse(first)))
+
+    def _turn_time(self, incoming, outgoing) -> float:
+        key = (incoming, outgoing)
+        turn_time = self._turn_times.get(key)
+        if turn_time is None:
+            turn_time = self._turn_times[key] = self.model.turn_time(incoming, outgoing)
+        return turn_time
+
+    def _direction(self, u, v):
+        return self.model.direction(self.positions[u], self.positions[v])
+
+    def _segment(self, index: int, start: int, end: int) -> Tuple[float, Optional[Tuple], Optional[Tuple]]:
+        """
+        Return (travel time, first direction, last direction) of walking
+        a corridor from the cell at position start to the one at position end.
+        """
+        if start == end:
+            return 0.0, None, None
+        cells, prefix, turns = self.corridors[index], self.corridor_prefix[index], self.corridor_turns[index]
+        # The turn at the first cell of the walk is not part of it
+        if start < end:
+            cost = prefix[end] - prefix[start] - turns[start]
+            return cost, self._direction(cells[start], cells[start + 1]), self._direction(cells[end - 1], cells[end])
+        cost = prefix[start] - prefix[end] - turns[end]
+        return cost, self._direction(cells[start], cells[start - 1]), self._direction(cells[end + 1], cells[end])
+
+    def _segment_cells(self, node, segment: Optional[Tuple[int, int, int]]) -> List:
+        """ Return the cells of a (corridor index, start, end) walk, or [node] without walk"""
+        if segment is None:
+            return [node]
+        index, start, end = segment
+        cells = self.corridors[index]
+        return cells[start:end + 1] if start <= end else cells[end:start + 1][::-1]
+
+    def _edge_position(self, u, v) -> Optional[Tuple[int, int]]:
+        """ Return (corridor index, position) of the edge u-v, None if it is not in the routing graph"""
+        for node, other in ((u, v), (v, u)):
+            if node in self.corridor_of:
+                index, position = self.corridor_of[node]
+                cells = self.corridors[index]
+                if cells[position + 1] == other:
+                    return index, position
+                if cells[position - 1] == other:
+                    return index, position - 1
+                return None
+        # Edge between two junctions
+        for index, _, end, *_ in self.adjacency.get(u, ()):
+            if end == v and len(self.corridors[index]) == 2:
+                return index, 0
+        return None
+
+    def set_blocked_edges(self, edges):
+        """
+        Replace the set of blocked edges, given as (u, v) pairs. The graph is not
+        rebuilt: a corridor with a blocked edge is no longer walked end to end,
+        and its cells stay reachable from the side that is still open.
+        """
+        blocked = {}
+        for u, v in edges:
+            located = self._edge_position(u, v)
+            if located is not None:
+                blocked.setdefault(located[0], []).append(located[1])
+        for positions in blocked.values():
+            positions.sort()
+        self.blocked = blocked
+
+    def is_blocked(self, u, v) -> bool:
+        located = self._edge_position(u, v)
+        return located is not None and self._segment_blocked(located[0], located[1], located[1] + 1)
+
+    def _segment_blocked(self, index: int, start: int, end: int) -> bool:
+        """ Tell whether a walk between two positions of a corridor crosses a blocked edge"""
+        positions = self.blocked.get(index)
+        if not positions:
+            return False
+        low, high = min(start, end), max(start, end)
+        k = bisect_left(positions, low)
+        return k < len(positions) and positions[k] < high
+
+    def set_congestion(self, node_counts: Dict):
+        """
+        Replace the live occupancy of the nodes (node -> number of AGVs on it).
+        Every occupied cell on a path costs model.congestion_time_s per AGV,
+        so the searches spread the load over the parallel aisles.
+        """
+        congestion_time = self.model.congestion_time_s
+        junction_congestion, corridor_congestion = {}, {}
+        for node, count in node_counts.items():
+            if node in self.junctions:
+                junction_congestion[node] = count * congestion_time
+            elif node in self.corridor_of:
+                index, position = self.corridor_of[node]
+                corridor_congestion.setdefault(index, []).extend([position] * count)
+        for positions in corridor_congestion.values():
+            positions.sort()
+        self.junction_congestion = junction_congestion
+        self.corridor_congestion = corridor_congestion
+        self.corridor_congestion_total = {index: len(positions) * congestion_time
+                                          for index, positions in corridor_congestion.items()}
+
+    def _congestion(self, index: int, start: int, end: int) -> float:
+        """ Congestion time of the cells entered walking a corridor from position start to position end"""
+        cost = 0.0
+        positions = self.corridor_congestion.get(index)
+        if positions:
+            if start < end:
+                count = bisect_right(positions, end) - bisect_right(positions, start)
+            else:
+                count = bisect_left(positions, start) - bisect_left(positions, end)
+            cost = count * self.model.congestion_time_s
+        cells = self.corridors[index]
+        if end == 0 or end == len(cells) - 1:
+            cost += self.junction_congestion.get(cells[end], 0.0)
+        return cost
+
+    def _source_attachments(self, node) -> List[Tuple]:
+        """
+        Return the junctions reached from a node as
+        (junction, cost, heading on arrival, (corridor index, start, end) walk).
+        """
+        if node in self.junctions:
+            return [(node, 0.0, None, None)]
+        if node not in self.corridor_of:
+            raise nx.NodeNotFound(f"Node {node} not in the routing graph")
+        index, position = self.corridor_of[node]
+        cells = self.corridors[index]
+        attachments = []
+        for end in (0, len(cells) - 1):
+            if self._segment_blocked(index, position, end):
+                continue
+            cost, _, last = self._segment(index, position, end)
+            cost += self._congestion(index, position, end)
+            attachments.append((cells[end], cost, last, (index, position, end)))
+        return attachments
+
+    def _target_attachments(self, node) -> Dict:
+        """
+        Return junction -> list of (cost, first direction, (corridor index, start, end) walk)
+        of the junctions from which a node is reached.
+        """
+        if node in self.junctions:
+            return {node: [(0.0, None, None)]}
+        if node not in self.corridor_of:
+            raise nx.NodeNotFound(f"Node {node} not in the routing graph")
+        index, position = self.corridor_of[node]
+        cells = self.corridors[index]
+        attachments = {}
+        for start in (0, len(cells) - 1):
+            if self._segment_blocked(index, start, position):
+                continue
+            cost, first, _ = self._segment(index, start, position)
+            cost += self._congestion(index, start, position)
+            attachments.setdefault(cells[start], []).append((cost, first, (index, start, position)))
+        return attachments
+
+    def _direct(self, source, target) -> Optional[Tuple[float, Tuple[int, int, int]]]:
+        """ Return (cost, walk) along the corridor holding both source and target, if any"""
+        if source not in self.corridor_of or target not in self.corridor_of:
+            return None
+        source_index, source_position = self.corridor_of[source]
+        target_index, target_position = self.corridor_of[target]
+        if source_index != target_index or self._segment_blocked(source_index, source_position, target_position):
+            return None
+        segment = (source_index, source_position, target_position)
+        return self._segment(*segment)[0] + self._congestion(*segment), segment
+
+    def _dijkstra(self, source, target=None, bound: float = float('inf')):
+        """
+        Dijkstra on the (junction, heading) states from the source.
+
+        With a target the search is an A*, guided by the straight line travel
+        time to the target, and stops as soon as no cheaper way than the bound
+        can be found. Returns (settled costs, parents, best), where best is
+        (cost, state, walk from the junction to the target) of the cheapest way
+        to the target (None without target or if it is not reached).
+        """
+        turn_times = self._turn_times
+        blocked = self.blocked
+        corridor_congestion, junction_congestion = self.corridor_congestion_total, self.junction_congestion
+        target_attachments = self._target_attachments(target) if target is not None else {}
+        if target is not None:
+            target_position = self.positions[target]
+            min_travel_time = self.model.min_travel_time
+            positions = self.positions
+            heuristic = lambda junction: min_travel_time(positions[junction], target_position)
+        else:
+            heuristic = lambda junction: 0.0
+        settled = {}
+        parents = {}
+        costs = {}
+        heap = []
+        counter = 0
+        for junction, cost, heading, segment in self._source_attachments(source):
+            state = (junction, heading)
+            if cost < costs.get(state, float('inf')):
+                costs[state] = cost
+                heapq.heappush(heap, (cost + heuristic(junction), counter, cost, state, (None, segment)))
+                counter += 1
+
+        best = None
+        while heap:
+            priority, _, cost, state, parent = heapq.heappop(heap)
+            if state in settled:
+                continue
+            if priority >= bound:
+                break
+            settled[state] = cost
+            parents[state] = parent
+            junction, heading = state
+            for target_cost, first, segment in target_attachments.get(junction, ()):
+                total = cost + turn_times[heading, first] + target_cost
+                if total < bound:
+                    bound = total
+                    best = (total, state, segment)
+            for index, forward, end, corridor_cost, first, last in self.adjacency[junction]:
+                if index in blocked:
+                    continue
+                new_cost = cost + turn_times[heading, first] + corridor_cost
+                if corridor_congestion or junction_congestion:
+                    new_cost += corridor_congestion.get(index, 0.0) + junction_congestion.get(end, 0.0)
+                new_state = (end, last)
+                if new_cost < costs.get(new_state, float('inf')):
+                    costs[new_state] = new_cost
+                    heapq.heappush(heap, (new_cost + heuristic(end), counter, new_cost, new_state, (state, index, forward)))
+                    counter += 1
+        return settled, parents, best
+
+    def _search(self, source, target) -> Tuple[float, List]:
+        """ Return (travel time, cell path) of the cheapest path from source to target"""
+        direct = self._direct(source, target)
+        bound = direct[0] if direct else float('inf')
+        _, parents, best = self._dijkstra(source, target, bound)
+        if best is None:
+            if direct is None:
+                raise nx.NetworkXNoPath(f"No path between {source} and {target}")
+            return direct[0], self._segment_cells(source, direct[1])
+
+        # Expand the junction path to cells
+        total, state, target_segment = best
+        moves = []
+        while parents[state][0] is not None:
+            state, index, forward = parents[state]
+            moves.append((index, forward))
+        path = self._segment_cells(source, parents[state][1])
+        for index, forward in reversed(moves):
+            cells = self.corridors[index]
+            path.extend((cells if forward else cells[::-1])[1:])
+        path.extend(self._segment_cells(target, target_segment)[1:])
+        return total, path
+
+    def shortest_path(self, source, target) -> List:
+        """Return the fastest cell path from source to target (raises nx.NetworkXNoPath)."""
+        if source == target:
+            self._source_attachments(source)
+            return [source]
+        return self._search(source, target)[1]
+
+    def shortest_path_length(self, source, target) -> float:
+        """Return the travel time from source to target (raises nx.NetworkXNoPath)."""
+        if source == target:
+            self._source_attachments(source)
+            return 0.0
+        return self._search(source, target)[0]
+
+    def travel_times(self, source, targets) -> Dict:
+        """
+        Return target -> travel time from the source, with a single search
+        for all the targets. Unreachable targets are left out.
+        """
+        settled, _, _ = self._dijkstra(source)
+        arrivals = {}
+        for (junction, heading), cost in settled.items():
+            arrivals.setdefault(junction, []).append((heading, cost))
+
+        times = {}
+        for target in targets:
+            if target == source:
+                times[target] = 0.0
+                continue
+            direct = self._direct(source, target)
+            best = direct[0] if direct else float('inf')
+            for junction, attachments in self._target_attachments(target).items():
+                for heading, cost in arrivals.get(junction, ()):
+                    for target_cost, first, _ in attachments:
+                        best = min(best, cost + self._turn_times[heading, first] + target_cost)
+            if best < float('inf'):
+                times[target] = best
+        return times
@@ -1,18 +1,28 @@
 import json
 import time
-import networkx as nx
+import paho.mqtt.client as mqtt
+
+# Shared layout library (smart_warehouse/warehouse_layout, installed in /opt/shared by the Dockerfile)
+from warehouse_layout import WarehouseLayout, decode_path
 from path_algorithm import PathAlgorithm
 from pallet_scheduler import PalletScheduler
-import paho.mqtt.client as mqtt
+from congestion import CongestionMap
 
 MISSIONS_TOPIC = "warehouse/missions"
-missions = []
+# Missions not taken by an AGV yet, as node lists. The AGVs republish the set without
+# the mission they take, so it follows the last set seen on MISSIONS_TOPIC
+pending_missions = []
 
 # Topics as described in generate_warehouse.py
-PALLET_SPAWN_TOPIC = "warehouse/pallet_spawn_nodes"
-AGV_START_TOPIC = "warehouse/config/agv_start_nodes"
-SHIPPING_TOPIC = "warehouse/config/shipping_nodes"
-GRAPH_TOPIC = "warehouse/config/graph_json"
+LAYOUT_TOPIC = "warehouse/config/layout"
+# Retained set of the edges that cannot be driven: {"blocked_edges": [[u, v], ...], "timestamp": ...}
+BLOCKED_EDGES_TOPIC = "warehouse/obstacles/blocked_edges"
+# Live AGV positions, used to route the missions around the congested aisles
+AGV_POSITION_TOPIC = "warehouse/agv/+/position"
+# Batched positions of the whole fleet (AGV simulator in "fleet" reporting mode)
+FLEET_STATE_TOPIC = "warehouse/fleet/state"
+# Traffic deadlocks detected by the AGV simulator: {"agvs", "nodes", "victim", "timestamp"}
+DEADLOCKS_TOPIC = "warehouse/traffic/deadlocks"
 
 
 # Data containers
@@ -20,7 +30,8 @@ warehouse_data = {
     "pallet_spawn_nodes": None,
     "agv_start_nodes": None,
     "shipping_nodes": None,
-    "graph": None
+    "graph": None,
+    "width": None
 }
 # Slot data container
 warehouse_slots = []
@@ -29,12 +40,7 @@ warehouse_slots = []
 # MQTT callbacks
 def on_connect(client, userdata, flags, rc):
     print("Connected to MQTT broker with result code", rc)
-    client.subscribe([
-        (PALLET_SPAWN_TOPIC, 1),
-        (AGV_START_TOPIC, 1),
-        (SHIPPING_TOPIC, 1),
-        (GRAPH_TOPIC, 1)
-    ])
+    client.subscribe((LAYOUT_TOPIC, 1))
     # Subscribe to all slots
     client.subscribe(("warehouse/slots/#", 1))
 
@@ -58,22 +64,19 @@ def on_message(client, userdata, msg):
         except Exception as e:
             print(f"Error decoding slot: {e}")
         return
-    # Other topics
-    payload = json.loads(msg.payload.decode())
-    if topic == PALLET_SPAWN_TOPIC:
-        warehouse_data["pallet_spawn_nodes"] = payload.get("pallet_spawn_nodes")
-        print("Received pallet spawn nodes:", warehouse_data["pallet_spawn_nodes"])
-    elif topic == AGV_START_TOPIC:
-        warehouse_data["agv_start_nodes"] = payload.get("agv_start_nodes")
-        print("Received AGV start nodes:", warehouse_data["agv_start_nodes"])
-    elif topic == SHIPPING_TOPIC:
-        warehouse_data["shipping_nodes"] = payload.get("shipping_nodes")
-        print("Received shipping nodes:", warehouse_data["shipping_nodes"])
-    elif topic == GRAPH_TOPIC:
-        if "graph" in payload:
-            warehouse_data["graph"] = nx.node_link_graph(payload["graph"])
-            print("Received warehouse graph from broker.")
-
+    if topic == LAYOUT_TOPIC:
+        # The graph and the special nodes are rebuilt locally from the layout parameters
+        try:
+            layout = WarehouseLayout.from_payload(json.loads(msg.payload.decode()))
+        except Exception as e:
+            print(f"Error rebuilding warehouse layout: {e}")
+            return
+        warehouse_data["pallet_spawn_nodes"] = layout.get_pallet_spawn_nodes()
+        warehouse_data["agv_start_nodes"] = layout.get_agv_start_nodes()
+        warehouse_data["shipping_nodes"] = layout.get_shipping_nodes()
+        warehouse_data["graph"] = layout.build_graph()
+        warehouse_data["width"] = layout.width
+        print(f"Rebuilt warehouse layout {layout.height}x{layout.width} from broker parameters.")
 
 
 def wait_for_all_data(timeout=5, min_slots=1):
@@ -120,12 +123,15 @@ if __name__ == "__main__":
 
     # Initialize the scheduler and path algorithm, ora con slots
     scheduler = PalletScheduler(warehouse_graph, spawning_node, slots)
-    path_algo = PathAlgorithm(warehouse_graph, agv_start_node, spawning_node, scheduler)
+    path_algo = PathAlgorithm(warehouse_graph, agv_start_node, spawning_node, scheduler, nodes["width"])
+    congestion = CongestionMap(warehouse_graph)
 
     # MQTT client for listening to order/pallet signals
     def on_signal_connect(client, userdata, flags, rc):
         print("Signal listener connected with result code", rc)
-        client.subscribe([(ORDER_TOPIC, 1), (PALLET_TOPIC, 1)])
+        client.subscribe([(ORDER_TOPIC, 1), (PALLET_TOPIC, 1), (BLOCKED_EDGES_TOPIC, 1), (AGV_POSITION_TOPIC, 0),
+                          (FLEET_STATE_TOPIC, 0), (DEADLOCKS_TOPIC, 1),
+                          (MISSIONS_TOPIC, 1)])
 
     def publish_slot_update(slot):
         topic = f"warehouse/slots/{slot['slot_id']}"
@@ -133,44 +139,96 @@ if __name__ == "__main__":
         print(f"Updated and published slot {slot['slot_id']} (in_use={slot['in_use']}) to {topic}")
 
     def publish_missions():
-        payload = json.dumps({"missions": missions})
+        # Missions are kept as node lists (they are repaired locally) and published run-length encoded
+        payload = json.dumps({"missions": [path_algo.encode_path(path) for path in pending_missions]})
         signal_client.publish(MISSIONS_TOPIC, payload)
-        print(f"Published missions to {MISSIONS_TOPIC}: {missions}")
+        print(f"Published missions to {MISSIONS_TOPIC}: {payload}")
 
     # Only this version of on_signal_message should exist and be assigned
     def on_signal_message(client, userdata, msg):
-        global missions
+        global pending_missions
         topic = msg.topic
+        if topic == MISSIONS_TOPIC:
+            # Own publications and the sets republished by the AGVs after taking a mission
+            try:
+                published = json.loads(msg.payload.decode()).get("missions", [])
+                pending_missions = [decode_path(path, nodes["width"]) if isinstance(path, str) else list(path)
+                                    for path in published]
+            except Exception as e:
+                print(f"Error decoding missions: {e}")
+            return
+        if mqtt.topic_matches_sub(AGV_POSITION_TOPIC, topic):
+            # Frequent messages: the planner costs change only when an AGV reaches another node
+            try:
+                payload = json.loads(msg.payload.decode())
+                if congestion.update(payload["agv_id"], payload["position"]):
+                    scheduler.planner.set_congestion(congestion.node_counts())
+            except Exception as e:
+                print(f"Error decoding AGV position: {e}")
+            return
+        if topic == FLEET_STATE_TOPIC:
+            try:
+                payload = json.loads(msg.payload.decode())
+                fields = payload.get("fields", [])
+                changed = False
+                for row in payload.get("agvs", []):
+                    agv = dict(zip(fields, row))
+                    changed = congestion.update(agv["agv_id"], (agv["x"], agv["y"])) or changed
+                if changed:
+                    scheduler.planner.set_congestion(congestion.node_counts())
+            except Exception as e:
+                print(f"Error decoding fleet state: {e}")
+            return
+        if topic == DEADLOCKS_TOPIC:
+            # The deadlock nodes are avoided like congested cells until the event is stale
+            try:
+                deadlock = json.loads(msg.payload.decode())
+                congestion.mark_deadlock(deadlock["nodes"])
+                scheduler.planner.set_congestion(congestion.node_counts())
+                print(f"Deadlock between {deadlock['agvs']} on nodes {deadlock['nodes']}")
+            except Exception as e:
+                print(f"Error decoding deadlock event: {e}")
+            return
         print(f"Received signal on {topic}")
         if topic == ORDER_TOPIC:
             print("Generating retrieval path...")
-            path = path_algo.get_retrieval_path()
+            # Used slot with the shortest travel and lift time
+            slot = scheduler.select_used_slot()
+            path = path_algo.get_retrieval_path(slot)
             print("AGV retrieval mission path:", path)
             if path is not None:
-                # Find the used slot node (accessible_node) chosen
-                slot_node = scheduler.find_closest_used_slot()
-                # Find the slot dict and update its state
-                for slot in slots:
-                    if slot.get('accessible_node') == slot_node and slot.get('in_use', False):
-                        slot['in_use'] = False
-                        publish_slot_update(slot)
-                        break
-                missions.append(path)
+                slot['in_use'] = False
+                publish_slot_update(slot)
+                pending_missions.append(path)
                 publish_missions()
         elif topic == PALLET_TOPIC:
             print("Generating storage path...")
-            path = path_algo.get_storage_path()
+            # Empty slot with the shortest travel and lift time
+            slot = scheduler.select_empty_slot()
+            path = path_algo.get_storage_path(slot)
             print("AGV storage mission path:", path)
             if path is not None:
-                # Find the empty slot node (accessible_node) chosen
-                slot_node = scheduler.find_closest_empty_slot()
-                # Find the slot dict and update its state
-                for slot in slots:
-                    if slot.get('accessible_node') == slot_node and not slot.get('in_use', False):
-                        slot['in_use'] = True
-                        publish_slot_update(slot)
-                        break
-                missions.append(path)
+                slot['in_use'] = True
+                publish_slot_update(slot)
+                pending_missions.append(path)
+                publish_missions()
+        elif topic == BLOCKED_EDGES_TOPIC:
+            try:
+                blocked_edges = json.loads(msg.payload.decode()).get("blocked_edges", [])
+            except Exception as e:
+                print(f"Error decoding blocked edges: {e}")
+                return
+            # Only the corridors with blocked edges change, the planner is not rebuilt
+            scheduler.planner.set_blocked_edges(blocked_edges)
+            print(f"Blocked edges updated: {len(blocked_edges)} edges")
+            # Repair the pending missions locally; the ones that cannot be bypassed are kept,
+            # the AGV simulator repairs them again when the edges are freed
+            repaired_missions = []
+            for path in pending_missions:
+                repaired = path_algo.repair_path(path)
+                repaired_missions.append(repaired if repaired is not None else path)
+            if repaired_missions != pending_missions:
+                pending_missions = repaired_missions
                 publish_missions()
 
     # Assign only the correct callback
@@ -1,44 +1,72 @@
 import networkx as nx
-from typing import Optional, Tuple
+from typing import Optional
+from routing import routing_view
+from corridor_graph import CorridorGraph
+from travel_time import TravelTimeModel
 
 class PalletScheduler:
-    def __init__(self, graph: nx.Graph, starting_area_node: str, slots: list):
+    def __init__(self, graph: nx.Graph, starting_area_node: str, slots: list, model: Optional[TravelTimeModel] = None):
         """
         Initialize the PalletScheduler.
         Args:
-            graph: NetworkX graph representing the warehouse layout
+            graph: NetworkX graph representing the warehouse layout (searched without the shelf nodes)
             starting_area_node: Node identifier for the starting area
-            slots: List of slot dicts, each with at least 'in_use' and 'accessible_node'
+            slots: List of slot dicts, each with at least 'in_use', 'accessible_node' and 'level'
+            model: Travel time model used to rank the slots (default TravelTimeModel())
         """
-        self.graph = graph
+        self.graph = routing_view(graph)
+        self.model = model or TravelTimeModel()
+        # Contracted graph with travel time costs, shared with PathAlgorithm
+        self.planner = CorridorGraph(self.graph, self.model)
         self.starting_area_node = starting_area_node
         self.slots = slots
 
+    def _select_slot(self, in_use: bool) -> Optional[dict]:
+        """
+        Return the slot with the given state reached first from the starting area:
+        travel time to its accessible_node plus the lift time of its level.
+        All the slots are ranked with a single search from the starting area.
+        """
+        candidates = [slot for slot in self.slots
+                      if slot.get('in_use') == in_use and slot.get('accessible_node') is not None]
+        travel_times = self.planner.travel_times(self.starting_area_node,
+                                                 {slot['accessible_node'] for slot in candidates})
+        best_time = float('inf')
+        best_slot = None
+        for slot in candidates:
+            travel_time = travel_times.get(slot['accessible_node'])
+            if travel_time is None:
+                continue
+            cycle_time = travel_time + self.model.lift_time(slot.get('level', 1))
+            if cycle_time < best_time:
+                best_time = cycle_time
+                best_slot = slot
+        return best_slot
+
+    def select_empty_slot(self) -> Optional[dict]:
+        """
+        Find the empty slot with the shortest travel and lift time from the starting area.
+        Returns:
+            The slot dict, or None if not found
+        """
+        return self._select_slot(False)
+
+    def select_used_slot(self) -> Optional[dict]:
+        """
+        Find the used slot with the shortest travel and lift time from the starting area.
+        Returns:
+            The slot dict, or None if not found
+        """
+        return self._select_slot(True)
+
     def find_closest_empty_slot(self) -> Optional[str]:
         """
         Find the closest accessible_node of an empty slot to the starting area.
         Returns:
             Node identifier of the closest empty slot's accessible_node, or None if not found
         """
-        try:
-            shortest_path_length = float('inf')
-            closest_node = None
-            for slot in self.slots:
-                if not slot.get('in_use', True):
-                    node = slot.get('accessible_node')
-                    if node is None:
-                        continue
-                    path_length = nx.shortest_path_length(
-                        self.graph,
-                        self.starting_area_node,
-                        node
-                    )
-                    if path_length < shortest_path_length:
-                        shortest_path_length = path_length
-                        closest_node = node
-            return closest_node
-        except nx.NetworkXNoPath:
-            return None
+        slot = self.select_empty_slot()
+        return slot['accessible_node'] if slot else None
 
     def find_closest_used_slot(self) -> Optional[str]:
         """
@@ -46,22 +74,5 @@ class PalletScheduler:
         Returns:
             Node identifier of the closest used slot's accessible_node, or None if not found
         """
-        try:
-            shortest_path_length = float('inf')
-            closest_node = None
-            for slot in self.slots:
-                if slot.get('in_use', False):
-                    node = slot.get('accessible_node')
-                    if node is None:
-                        continue
-                    path_length = nx.shortest_path_length(
-                        self.graph,
-                        self.starting_area_node,
-                        node
-                    )
-                    if path_length < shortest_path_length:
-                        shortest_path_length = path_length
-                        closest_node = node
-            return closest_node
-        except nx.NetworkXNoPath:
-            return None
\ No newline at end of file
+        slot = self.select_used_slot()
+        return slot['accessible_node'] if slot else None
@@ -1,47 +1,57 @@
 import networkx as nx
-from typing import List, Optional
+from typing import List, Optional, Union
 from pallet_scheduler import PalletScheduler
+from warehouse_layout import encode_path
 
 # filepath: c:\Users\alexa\Desktop\Università\Magistrale\Distributed and IoT\D_Iot_project\V2\application\simulation\TSP\path_algorithm.py
 
 
 class PathAlgorithm:
-    def __init__(self, graph: nx.Graph, agv_start_node: str, spawning_node: str, scheduler: PalletScheduler):
+    def __init__(self, graph: nx.Graph, agv_start_node: str, spawning_node: str, scheduler: PalletScheduler,
+                 width: Optional[int] = None):
         """
         Initialize the PathAlgorithm.
         
         Args:
-            graph: NetworkX graph representing the warehouse layout
+            graph: NetworkX graph representing the warehouse layout (searched through the scheduler planner)
             agv_start_node: Node identifier for the AGV starting position
             spawning_node: Node identifier for the pallet spawning area
             scheduler: PalletScheduler instance for finding storage slots
+            width: Width of the warehouse grid, to encode the paths (node id = row * width + col)
         """
-        self.graph = graph
+        # Searches run on the corridor-contracted graph of the scheduler, with travel time costs
+        self.planner = scheduler.planner
         self.agv_start_node = agv_start_node
         self.spawning_node = spawning_node
         self.scheduler = scheduler
+        self.width = width
     
-    def get_storage_path(self) -> Optional[List[str]]:
+    def get_storage_path(self, slot: Optional[dict] = None) -> Optional[List[str]]:
         """
-        Generate the shortest path from AGV start to spawning node to an empty storage slot and back to AGV start.
+        Generate the fastest path from AGV start to spawning node to an empty storage slot and back to AGV start.
         
+        Args:
+            slot: Empty slot to store the pallet in (default: the one chosen by the scheduler)
+
         Returns:
             List of node identifiers representing the path, or None if no path exists
         """
         try:
             # Find the closest empty slot
-            target_slot = self.scheduler.find_closest_empty_slot()
-            if target_slot is None:
+            if slot is None:
+                slot = self.scheduler.select_empty_slot()
+            if slot is None:
                 return None
+            target_slot = slot['accessible_node']
             
             # Get path from AGV start to spawning node
-            path_to_spawn = nx.shortest_path(self.graph, self.agv_start_node, self.spawning_node)
+            path_to_spawn = self.planner.shortest_path(self.agv_start_node, self.spawning_node)
             
             # Get path from spawning node to storage slot
-            path_to_storage = nx.shortest_path(self.graph, self.spawning_node, target_slot)
+            path_to_storage = self.planner.shortest_path(self.spawning_node, target_slot)
             
             # Get path from storage slot back to AGV start
-            path_to_start = nx.shortest_path(self.graph, target_slot, self.agv_start_node)
+            path_to_start = self.planner.shortest_path(target_slot, self.agv_start_node)
             
             # Combine paths (remove duplicates at connection points)
             full_path = path_to_spawn + path_to_storage[1:] + path_to_start[1:]
@@ -50,31 +60,74 @@ class PathAlgorithm:
         except nx.NetworkXNoPath:
             return None
     
-    def get_retrieval_path(self) -> Optional[List[str]]:
+    def get_retrieval_path(self, slot: Optional[dict] = None) -> Optional[List[str]]:
         """
-        Generate the shortest path from AGV start to a used storage slot to the spawning node and back to AGV start.
+        Generate the fastest path from AGV start to a used storage slot to the spawning node and back to AGV start.
         
+        Args:
+            slot: Used slot to retrieve the pallet from (default: the one chosen by the scheduler)
+
         Returns:
             List of node identifiers representing the path, or None if no path exists
         """
         try:
             # Find the closest used slot
-            source_slot = self.scheduler.find_closest_used_slot()
-            if source_slot is None:
+            if slot is None:
+                slot = self.scheduler.select_used_slot()
+            if slot is None:
                 return None
+            source_slot = slot['accessible_node']
             
             # Get path from AGV start to used slot
-            path_to_slot = nx.shortest_path(self.graph, self.agv_start_node, source_slot)
+            path_to_slot = self.planner.shortest_path(self.agv_start_node, source_slot)
             
             # Get path from used slot to spawning node
-            path_to_spawn = nx.shortest_path(self.graph, source_slot, self.spawning_node)
+            path_to_spawn = self.planner.shortest_path(source_slot, self.spawning_node)
             
             # Get path from spawning node back to AGV start
-            path_to_start = nx.shortest_path(self.graph, self.spawning_node, self.agv_start_node)
+            path_to_start = self.planner.shortest_path(self.spawning_node, self.agv_start_node)
             
             # Combine paths (remove duplicates at connection points)
             full_path = path_to_slot + path_to_spawn[1:] + path_to_start[1:]
             
             return full_path
         except nx.NetworkXNoPath:
-            return None
\ No newline at end of file
+            return None
+    def encode_path(self, path: List[int]) -> Union[str, List[int]]:
+        """
+        Return the compact form of a path to publish: start node and run-length
+        direction codes (e.g. "0:E9S8"). Without the grid width, or if the path
+        has non adjacent nodes, the node list is returned unchanged.
+        """
+        if self.width is None:
+            return path
+        try:
+            return encode_path(path, self.width)
+        except ValueError:
+            return path
+
+    def repair_path(self, path: List[str]) -> Optional[List[str]]:
+        """
+        Replace every run of blocked edges of a path with a detour between the
+        nodes before and after it, keeping the rest of the path unchanged.
+
+        Returns:
+            The repaired path (the same path if nothing is blocked), or None if a run cannot be bypassed
+        """
+        try:
+            repaired = [path[0]]
+            k = 0
+            while k < len(path) - 1:
+                if not self.planner.is_blocked(path[k], path[k + 1]):
+                    repaired.append(path[k + 1])
+                    k += 1
+                    continue
+                rejoin = k + 1
+                while rejoin < len(path) - 1 and self.planner.is_blocked(path[rejoin], path[rejoin + 1]):
+                    rejoin += 1
+                detour = self.planner.shortest_path(path[k], path[rejoin])
+                repaired.extend(detour[1:])
+                k = rejoin
+            return repaired
+        except (nx.NetworkXNoPath, nx.NodeNotFound):
+            return None
@@ -0,0 +1,14 @@
+import networkx as nx
+
+# Node types an AGV can drive through. Shelf nodes are only endpoints,
+# reached from their accessible node.
+DRIVABLE_TYPES = frozenset({'aisle', 'agv_start', 'shipping', 'pallet_spawn'})
+
+
+def routing_view(graph: nx.Graph) -> nx.Graph:
+    """
+    Return a read-only view of the warehouse graph with only the drivable
+    nodes, used for path searches (it shares the data of the graph, no copy).
+    """
+    drivable = {node for node, node_type in graph.nodes(data='type', default='aisle') if node_type in DRIVABLE_TYPES}
+    return nx.subgraph_view(graph, filter_node=drivable.__contains__)
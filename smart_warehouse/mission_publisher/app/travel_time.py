@@ -0,0 +1,59 @@
+import math
+from typing import Optional, Tuple
+
+
+class TravelTimeModel:
+    """
+    Travel time of an AGV in the warehouse, used as the cost of the path searches.
+
+    - driving: edge length (from the node 'pos' attributes, one cell per meter) / speed
+    - turning: a fixed time for each 90 degrees change of direction (the AGV
+      stops and rotates on the spot, 180 degrees count as two turns)
+    - lifting: the forks are raised to the slot level and lowered back
+    - congestion: a fixed time for each AGV met on the cells of the path
+    """
+
+    def __init__(self, speed_m_s: float = 1.5, cell_size_m: float = 1.0,
+                 turn_time_s: float = 1.5, lift_time_per_level_s: float = 3.0, congestion_time_s: float = 4.0):
+        """
+        Args:
+            speed_m_s: Cruise speed of the AGV (same as AGVWorker.simulate_mission)
+            cell_size_m: Length of a grid cell
+            turn_time_s: Time lost for each 90 degrees turn
+            lift_time_per_level_s: Time to move the forks by one level (level 1 is the floor)
+            congestion_time_s: Time lost for each AGV standing on a cell of the path
+        """
+        self.speed_m_s = speed_m_s
+        self.cell_size_m = cell_size_m
+        self.turn_time_s = turn_time_s
+        self.lift_time_per_level_s = lift_time_per_level_s
+        self.congestion_time_s = congestion_time_s
+
+    def direction(self, u_pos: Tuple[float, float], v_pos: Tuple[float, float]) -> Tuple[float, float]:
+        """ Return the (dx, dy) displacement between two node positions"""
+        return v_pos[0] - u_pos[0], v_pos[1] - u_pos[1]
+
+    def drive_time(self, direction: Tuple[float, float]) -> float:
+        return math.hypot(direction[0], direction[1]) * self.cell_size_m / self.speed_m_s
+
+    def min_travel_time(self, u_pos: Tuple[float, float], v_pos: Tuple[float, float]) -> float:
+        """ Straight line drive time between two positions, a lower bound of the travel time"""
+        return math.hypot(v_pos[0] - u_pos[0], v_pos[1] - u_pos[1]) * self.cell_size_m / self.speed_m_s
+
+    def turn_time(self, incoming: Optional[Tuple[float, float]], outgoing: Optional[Tuple[float, float]]) -> float:
+        """ Time lost changing direction (no penalty at the start of a path, when the heading is unknown)"""
+        if incoming is None or outgoing is None:
+            return 0.0
+        cross = incoming[0] * outgoing[1] - incoming[1] * outgoing[0]
+        dot = incoming[0] * outgoing[0] + incoming[1] * outgoing[1]
+        quarter_turns = round(abs(math.atan2(cross, dot)) / (math.pi / 2))
+        return quarter_turns * self.turn_time_s
+
+    def lift_time(self, level: int) -> float:
+        """ Time to raise the forks to a slot level and lower them back"""
+        return 2 * max(0, level - 1) * self.lift_time_per_level_s
+
+
+# Hop count model: same costs as an unweighted search (one per cell, no turns, lifts or congestion)
+HOP_COUNT_MODEL = TravelTimeModel(speed_m_s=1.0, cell_size_m=1.0, turn_time_s=0.0, lift_time_per_level_s=0.0,
+                                  congestion_time_s=0.0)
@@ -2,9 +2,9 @@ from flask import Flask
 from flask_restful import Api
 from persistence.data_manager import DataManager
 from resources.telemetry_data_resorces import TelemetryDataResource
-from resources.warehouse_parameter_resource import WarehouseParameterResource
-from resources.agv_resource import AGVPositionResource
-from resources.slot_resource import SlotStatusResource
+from resources.warehouse_parameter_resource import WarehouseParameterResource, WarehouseParametersResource
+from resources.agv_resource import AGVPositionResource, AGVPositionsResource
+from resources.slot_resource import SlotStatusResource, SlotSummaryResource, SlotOccupancyResource
 import yaml
 
 # Default Values
@@ -48,6 +48,12 @@ api.add_resource(TelemetryDataResource, configuration_dict['rest']['api_prefix']
                       endpoint="device_telemetry_data",
                       methods=['GET', 'POST'])
 
+# Endpoint per tutti i parametri warehouse in una sola richiesta
+api.add_resource(WarehouseParametersResource, configuration_dict['rest']['api_prefix'] + '/warehouse/config/parameters',
+                      resource_class_kwargs={'data_manager': data_manager},
+                      endpoint="warehouse_parameters",
+                      methods=['GET'])
+
 # Nuovo endpoint per i parametri warehouse
 api.add_resource(WarehouseParameterResource, configuration_dict['rest']['api_prefix'] + '/warehouse/config/parameters/<string:parameter>',
                       resource_class_kwargs={'data_manager': data_manager},
@@ -60,13 +66,32 @@ api.add_resource(AGVPositionResource, configuration_dict['rest']['api_prefix'] +
                       endpoint="agv_position",
                       methods=['GET', 'POST'])
 
+# Endpoint per le posizioni di tutti gli AGV (GET e POST batch)
+api.add_resource(AGVPositionsResource, configuration_dict['rest']['api_prefix'] + '/warehouse/config/parameters/agv/positions',
+                      resource_class_kwargs={'data_manager': data_manager},
+                      endpoint="agv_positions",
+                      methods=['GET', 'POST'])
+
 # Endpoint per tutti gli slot (GET e POST batch)
 api.add_resource(SlotStatusResource, configuration_dict['rest']['api_prefix'] + '/warehouse/config/parameters/slots',
                   resource_class_kwargs={'data_manager': data_manager},
                   endpoint="all_slots_status",
                   methods=['GET', 'POST'])
 
+# Endpoint per il riepilogo dell'occupazione degli slot
+api.add_resource(SlotSummaryResource, configuration_dict['rest']['api_prefix'] + '/warehouse/config/parameters/slots/summary',
+                  resource_class_kwargs={'data_manager': data_manager},
+                  endpoint="slots_summary",
+                  methods=['GET'])
+
+# Endpoint per l'occupazione compatta (bitset) di tutti gli slot
+api.add_resource(SlotOccupancyResource, configuration_dict['rest']['api_prefix'] + '/warehouse/config/parameters/slots/occupancy',
+                  resource_class_kwargs={'data_manager': data_manager},
+                  endpoint="slots_occupancy",
+                  methods=['GET'])
+
 if __name__ == '__main__':
 
-    # Run the Flask Application
-    app.run(host=configuration_dict['rest']['host'], port=configuration_dict['rest']['port'])  # run our Flask app
\ No newline at end of file
+    # Run the Flask Application, one thread per request (DataManager is thread-safe)
+    app.run(host=configuration_dict['rest']['host'], port=configuration_dict['rest']['port'],
+            threaded=configuration_dict['rest'].get('threaded', True))  # run our Flask app
\ No newline at end of file
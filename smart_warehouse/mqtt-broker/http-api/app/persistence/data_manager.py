@@ -1,10 +1,43 @@
+import base64
+import hashlib
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from persistence.slot_aggregates import SlotAggregates
+
+
+def slot_digest(slot):
+    """Return a stable 64 bit hash of a slot status, independent from the key order"""
+    encoded = json.dumps(slot, sort_keys=True).encode()
+    return int.from_bytes(hashlib.sha1(encoded).digest()[:8], 'big')
+
+
 class DataManager:
     """
     DataManager class is responsible for managing the data of the application.
     Abstracts the data storage and retrieval operations.
     In this implementation everything is stored in memory.
+
+    The data structures are shared by all the request threads, so every
+    write is done under a lock. Locks are striped by (collection, key):
+    writes on different collections or warehouses rarely contend.
+    Warehouse parameters and AGV positions are small and updated with
+    copy-on-write, so readers get an immutable snapshot without locking.
+    Slot statuses are large and updated in place, readers get a copy.
+    Returned snapshots must not be modified by the caller.
+
+    Each (collection, key) has a version counter incremented on every write,
+    used as ETag by the resources together with the serialized responses
+    cached here and invalidated on write. The response cache is an LRU of
+    at most RESPONSE_CACHE_SIZE bodies, indexed by (collection, key) so that
+    a write drops only its own entries.
     """
 
+    # Number of locks protecting the data structures
+    LOCK_STRIPES = 16
+    # Maximum number of serialized responses kept in the cache
+    RESPONSE_CACHE_SIZE = 256
 
     # The data structure to store the telemetry data
     device_timeseries_data = {}
@@ -14,31 +47,149 @@ class DataManager:
     agv_positions = {}
     # The data structure to store slot statuses
     slot_statuses = {}
+    # XOR of the digests of all stored slots, updated incrementally on each write
+    slot_statuses_digest = {}
+    # Occupancy counters of the stored slots, updated incrementally on each write
+    slot_aggregates = {}
+
+    # Random token of this process, so that versions are not reused after a restart
+    instance_id = uuid.uuid4().hex[:8]
+    # Version counter of each (collection, key)
+    versions = {}
+    # Serialized responses in LRU order: cache key -> (version, body), cache keys start with (collection, key)
+    response_cache = OrderedDict()
+    # Cache keys of each (collection, key), to invalidate them without scanning the cache
+    response_cache_index = {}
+    _response_cache_lock = threading.Lock()
+
+    # Lock stripes shared by all the DataManager instances, like the data they protect
+    _locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def _lock(self, collection, key):
+        """Return the lock stripe protecting a key of a given collection"""
+        return self._locks[hash((collection, key)) % self.LOCK_STRIPES]
+
+    def _bump_version(self, collection, key):
+        """Increment the version of (collection, key) and drop its cached responses.
+        Must be called holding the lock stripe of (collection, key)"""
+        self.versions[(collection, key)] = self.versions.get((collection, key), 0) + 1
+        with self._response_cache_lock:
+            for cache_key in self.response_cache_index.pop((collection, key), ()):
+                self.response_cache.pop(cache_key, None)
+
+    def get_version(self, collection, key):
+        """Return the version of (collection, key) as an ETag value.
+        Read it before the data, so that a cached body is never older than its version"""
+        return f"{self.instance_id}-{self.versions.get((collection, key), 0)}"
+
+    def get_cached_response(self, cache_key, version):
+        """Return the serialized response cached for cache_key if it matches version"""
+        with self._response_cache_lock:
+            cached = self.response_cache.get(cache_key)
+            if cached is None or cached[0] != version:
+                return None
+            self.response_cache.move_to_end(cache_key)
+            return cached[1]
+
+    def set_cached_response(self, cache_key, version, body):
+        """Cache the serialized response of cache_key for a given version,
+        evicting the least recently used responses beyond RESPONSE_CACHE_SIZE"""
+        with self._response_cache_lock:
+            self.response_cache[cache_key] = (version, body)
+            self.response_cache.move_to_end(cache_key)
+            self.response_cache_index.setdefault(cache_key[:2], set()).add(cache_key)
+            while len(self.response_cache) > self.RESPONSE_CACHE_SIZE:
+                evicted, _ = self.response_cache.popitem(last=False)
+                keys = self.response_cache_index.get(evicted[:2])
+                if keys is not None:
+                    keys.discard(evicted)
+                    if not keys:
+                        del self.response_cache_index[evicted[:2]]
 
     def add_device_telemetry_data(self, device_id, telemetry_data):
         """Add a new telemetry data for a given device"""
-        if device_id not in self.device_timeseries_data:
-            self.device_timeseries_data[device_id] = []
-        self.device_timeseries_data[device_id].append(telemetry_data)
+        with self._lock('telemetry', device_id):
+            self.device_timeseries_data.setdefault(device_id, []).append(telemetry_data)
+
+    def add_device_telemetry_batch(self, device_id, telemetry_messages):
+        """Add a batch of telemetry data for a given device, all the messages at once"""
+        with self._lock('telemetry', device_id):
+            self.device_timeseries_data.setdefault(device_id, []).extend(telemetry_messages)
 
     def add_warehouse_parameters(self, warehouse_id, parameters):
         """Add or update parameters for a given warehouse"""
-        self.warehouse_parameters[warehouse_id] = parameters
+        with self._lock('parameters', warehouse_id):
+            self.warehouse_parameters[warehouse_id] = dict(parameters)
+            self._bump_version('parameters', warehouse_id)
+
+    def set_warehouse_parameter(self, warehouse_id, parameter, value):
+        """Add or update a single parameter for a given warehouse"""
+        with self._lock('parameters', warehouse_id):
+            parameters = dict(self.warehouse_parameters.get(warehouse_id, {}))
+            parameters[parameter] = value
+            self.warehouse_parameters[warehouse_id] = parameters
+            self._bump_version('parameters', warehouse_id)
 
     def add_agv_positions(self, warehouse_id, positions):
         """Add or update AGV positions for a given warehouse"""
-        self.agv_positions[warehouse_id] = positions
+        with self._lock('agv_positions', warehouse_id):
+            self.agv_positions[warehouse_id] = dict(positions)
+            self._bump_version('agv_positions', warehouse_id)
+
+    def set_agv_position(self, warehouse_id, agv_id, position):
+        """Add or update the position of a single AGV for a given warehouse"""
+        with self._lock('agv_positions', warehouse_id):
+            positions = dict(self.agv_positions.get(warehouse_id, {}))
+            positions[agv_id] = position
+            self.agv_positions[warehouse_id] = positions
+            self._bump_version('agv_positions', warehouse_id)
+
+    def update_agv_positions(self, warehouse_id, positions):
+        """Add or update the positions of a batch of AGVs ({agv_id: position}) with a single version bump"""
+        with self._lock('agv_positions', warehouse_id):
+            merged = dict(self.agv_positions.get(warehouse_id, {}))
+            merged.update(positions)
+            self.agv_positions[warehouse_id] = merged
+            self._bump_version('agv_positions', warehouse_id)
+        return len(positions)
 
     def add_slot_statuses(self, warehouse_id, statuses):
         """Add or update slot statuses for a given warehouse"""
-        self.slot_statuses[warehouse_id] = statuses
+        self.update_slot_statuses(warehouse_id, statuses.values(), replace=True)
+
+    def update_slot_statuses(self, warehouse_id, slots, replace=False):
+        """Add or update a batch of slots (keyed by slot_id) for a given warehouse.
+        If replace is True the stored slots are replaced by the batch.
+        Return the number of stored slots and the digest of the stored state"""
+        with self._lock('slot_statuses', warehouse_id):
+            if replace or warehouse_id not in self.slot_statuses:
+                self.slot_statuses[warehouse_id] = {}
+                self.slot_statuses_digest[warehouse_id] = 0
+                self.slot_aggregates[warehouse_id] = SlotAggregates()
+            statuses = self.slot_statuses[warehouse_id]
+            digest = self.slot_statuses_digest[warehouse_id]
+            aggregates = self.slot_aggregates[warehouse_id]
+            for slot in slots:
+                slot_id = slot.get('slot_id')
+                if slot_id is None:
+                    continue
+                old_slot = statuses.get(str(slot_id))
+                if old_slot is not None:
+                    digest ^= slot_digest(old_slot)
+                statuses[str(slot_id)] = slot
+                digest ^= slot_digest(slot)
+                aggregates.update(old_slot, slot)
+            self.slot_statuses_digest[warehouse_id] = digest
+            self._bump_version('slot_statuses', warehouse_id)
+            return len(statuses), digest
 
     def get_telemetry_data_by_device_id(self, device_id):
         """Return the telemetry data for a given device"""
-        if device_id in self.device_timeseries_data:
-            return self.device_timeseries_data[device_id]
-        else:
-            return None
+        with self._lock('telemetry', device_id):
+            if device_id in self.device_timeseries_data:
+                return list(self.device_timeseries_data[device_id])
+            else:
+                return None
 
     def get_warehouse_parameters(self, warehouse_id):
         """Return the parameters for a given warehouse"""
@@ -48,6 +199,31 @@ class DataManager:
         """Return the AGV positions for a given warehouse"""
         return self.agv_positions.get(warehouse_id, None)
 
+    def get_agv_position(self, warehouse_id, agv_id):
+        """Return the position of a single AGV for a given warehouse"""
+        return self.agv_positions.get(warehouse_id, {}).get(agv_id, None)
+
     def get_slot_statuses(self, warehouse_id):
         """Return the slot statuses for a given warehouse"""
-        return self.slot_statuses.get(warehouse_id, None)
\ No newline at end of file
+        with self._lock('slot_statuses', warehouse_id):
+            statuses = self.slot_statuses.get(warehouse_id, None)
+            return dict(statuses) if statuses is not None else None
+
+
+    def get_slot_summary(self, warehouse_id):
+        """Return the occupancy summary of the slots for a given warehouse"""
+        with self._lock('slot_statuses', warehouse_id):
+            aggregates = self.slot_aggregates.get(warehouse_id, None)
+            return aggregates.to_dict() if aggregates is not None else None
+
+    def get_slot_occupancy(self, warehouse_id):
+        """Return the occupancy bitset of the slots (base64 encoded) for a given warehouse"""
+        with self._lock('slot_statuses', warehouse_id):
+            aggregates = self.slot_aggregates.get(warehouse_id, None)
+            if aggregates is None:
+                return None
+            return {
+                'size': aggregates.max_slot_id,
+                'encoding': 'bitset',
+                'bits': base64.b64encode(bytes(aggregates.occupancy_bits)).decode()
+            }
@@ -0,0 +1,77 @@
+class SlotAggregates:
+    """
+    Occupancy counters of the slots of a warehouse, updated incrementally
+    on each slot write so that a summary never needs to scan all the slots.
+    Slots are grouped by shelf (grid column of the shelf), level and
+    accessible aisle node.
+    The occupancy of every slot is also kept as a bitset indexed by
+    slot_id - 1 (most significant bit first), sent as is to the browsers.
+    """
+
+    # Slot fields used to group the counters: group name -> slot field
+    GROUP_FIELDS = {
+        'by_shelf': 'col',
+        'by_level': 'level',
+        'by_aisle_node': 'accessible_node'
+    }
+
+    def __init__(self):
+        self.total = 0
+        self.occupied = 0
+        # group name -> {group key: [total, occupied]}
+        self.groups = {group: {} for group in self.GROUP_FIELDS}
+        # Occupancy bitset, bit slot_id - 1 set if the slot is in use
+        self.occupancy_bits = bytearray()
+        self.max_slot_id = 0
+
+    def _apply(self, slot, sign):
+        """Add (sign=1) or remove (sign=-1) a slot from the counters"""
+        in_use = 1 if slot.get('in_use', False) else 0
+        self.total += sign
+        self.occupied += sign * in_use
+        for group, field in self.GROUP_FIELDS.items():
+            key = slot.get(field)
+            if key is None:
+                continue
+            counters = self.groups[group].setdefault(str(key), [0, 0])
+            counters[0] += sign
+            counters[1] += sign * in_use
+            if counters[0] == 0:
+                del self.groups[group][str(key)]
+        self._apply_occupancy_bit(slot, sign)
+
+    def _apply_occupancy_bit(self, slot, sign):
+        """Set (or clear when removing the slot) the occupancy bit of a slot"""
+        try:
+            index = int(slot.get('slot_id')) - 1
+        except (TypeError, ValueError):
+            return
+        if index < 0:
+            return
+        if index >= len(self.occupancy_bits) * 8:
+            self.occupancy_bits.extend(bytes(index // 8 + 1 - len(self.occupancy_bits)))
+        self.max_slot_id = max(self.max_slot_id, index + 1)
+        mask = 0x80 >> (index % 8)
+        if sign > 0 and slot.get('in_use', False):
+            self.occupancy_bits[index // 8] |= mask
+        else:
+            self.occupancy_bits[index // 8] &= ~mask & 0xFF
+
+    def update(self, old_slot, new_slot):
+        """Replace old_slot (None if the slot is new) with new_slot in the counters"""
+        if old_slot is not None:
+            self._apply(old_slot, -1)
+        self._apply(new_slot, 1)
+
+    def to_dict(self):
+        """Return the summary of the counters"""
+        summary = {
+            'total': self.total,
+            'occupied': self.occupied,
+            'free': self.total - self.occupied,
+            'fill_ratio': self.occupied / self.total if self.total else 0.0
+        }
+        for group, counters in self.groups.items():
+            summary[group] = {key: {'occupied': occupied, 'free': total - occupied}
+                              for key, (total, occupied) in counters.items()}
+        return summary
@@ -1,5 +1,6 @@
 from flask_restful import Resource, reqparse
 from flask import request
+from resources.conditional_response import conditional_json_response
 
 class AGVPositionResource(Resource):
     def __init__(self, **kwargs):
@@ -8,23 +9,56 @@ class AGVPositionResource(Resource):
     def get(self, agv_id):
         # Recupera la posizione dell'AGV dal data_manager
         warehouse_id = 'default_warehouse'
-        agv_positions = self.data_manager.get_agv_positions(warehouse_id) or {}
-        if agv_id in agv_positions:
-            return agv_positions[agv_id], 200
-        else:
-            return {'message': f'AGV {agv_id} position not found'}, 404
+
+        def build_payload():
+            agv_position = self.data_manager.get_agv_position(warehouse_id, agv_id)
+            if agv_position is not None:
+                return agv_position, 200
+            else:
+                return {'message': f'AGV {agv_id} position not found'}, 404
+
+        return conditional_json_response(self.data_manager, 'agv_positions', warehouse_id,
+                                         ('agv_positions', warehouse_id, agv_id), build_payload)
 
     def post(self, agv_id):
         data = request.get_json(force=True)
         position = data.get('position')
         timestamp = data.get('timestamp')
-        # Recupera le posizioni esistenti o crea un nuovo dict
+        # Aggiornamento atomico della sola posizione di questo AGV
         warehouse_id = 'default_warehouse'
-        agv_positions = self.data_manager.get_agv_positions(warehouse_id) or {}
-        agv_positions[agv_id] = {
+        self.data_manager.set_agv_position(warehouse_id, agv_id, {
             'position': position,
             'timestamp': timestamp
-        }
-        self.data_manager.add_agv_positions(warehouse_id, agv_positions)
+        })
         print(f"Received AGV position: {agv_id}, position: {position}, timestamp: {timestamp}")
         return {'message': f'Position for AGV {agv_id} registered successfully.'}, 201
+
+
+class AGVPositionsResource(Resource):
+    def __init__(self, **kwargs):
+        self.data_manager = kwargs.get('data_manager')
+
+    def get(self):
+        """GET the last position of all the AGVs"""
+        warehouse_id = 'default_warehouse'
+
+        def build_payload():
+            return {'agvs': self.data_manager.get_agv_positions(warehouse_id) or {}}, 200
+
+        return conditional_json_response(self.data_manager, 'agv_positions', warehouse_id,
+                                         ('agv_positions', warehouse_id, 'all'), build_payload)
+
+    def post(self):
+        data = request.get_json(force=True)
+        warehouse_id = 'default_warehouse'
+        # Si aspetta {"agvs": [{"agv_id": ..., "position": ..., "timestamp": ...}, ...]}
+        agvs = data.get('agvs') if isinstance(data, dict) else None
+        if not isinstance(agvs, list):
+            return {'message': 'Invalid AGV positions payload.'}, 400
+        positions = {
+            agv['agv_id']: {'position': agv.get('position'), 'timestamp': agv.get('timestamp')}
+            for agv in agvs if isinstance(agv, dict) and agv.get('agv_id') is not None
+        }
+        count = self.data_manager.update_agv_positions(warehouse_id, positions)
+        print(f"Received AGV positions batch: {count} AGVs")
+        return {'message': 'Positions for all AGVs registered successfully.', 'count': count}, 201
@@ -0,0 +1,29 @@
+import json
+from flask import request, Response
+
+
+def conditional_json_response(data_manager, collection, key, cache_key, build_payload):
+    """
+    Return the JSON response of a GET request with ETag support.
+    The ETag is the version of (collection, key) in the DataManager:
+    - if the client already has it (If-None-Match) a 304 without body is returned
+    - otherwise the serialized body cached for this version is returned,
+      build_payload() being called and serialized only on a cache miss.
+    build_payload returns (payload, status_code), only 200 responses are cached.
+    cache_key is a tuple starting with (collection, key) so that writes invalidate it.
+    """
+    version = data_manager.get_version(collection, key)
+    if request.if_none_match.contains(version):
+        response = Response(status=304)
+        response.set_etag(version)
+        return response
+    body = data_manager.get_cached_response(cache_key, version)
+    if body is None:
+        payload, status_code = build_payload()
+        if status_code != 200:
+            return payload, status_code
+        body = json.dumps(payload)
+        data_manager.set_cached_response(cache_key, version, body)
+    response = Response(body, status=200, mimetype='application/json')
+    response.set_etag(version)
+    return response
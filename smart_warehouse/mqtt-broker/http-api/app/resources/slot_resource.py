@@ -1,5 +1,17 @@
 from flask_restful import Resource
 from flask import request
+from resources.conditional_response import conditional_json_response
+
+# Largest page of slots returned by a single request
+MAX_PAGE_SIZE = 1000
+
+
+def slot_sort_key(slot_id):
+    """Sort numeric slot ids numerically and the other ones after them"""
+    try:
+        return 0, int(slot_id), ''
+    except (TypeError, ValueError):
+        return 1, 0, str(slot_id)
 
 
 class SlotStatusResource(Resource):
@@ -7,22 +19,88 @@ class SlotStatusResource(Resource):
         self.data_manager = kwargs.get('data_manager')
 
     def get(self):
+        """GET the slots, optionally filtered by shelf grid column (col) and level,
+        and paginated with offset and limit (at most MAX_PAGE_SIZE). Slots are sorted by slot_id"""
         warehouse_id = 'default_warehouse'
-        slot_statuses = self.data_manager.get_slot_statuses(warehouse_id) or {}
-        return slot_statuses, 200
+        col = request.args.get('col', type=int)
+        level = request.args.get('level', type=int)
+        # Normalized, so that equivalent requests share the same cached response
+        offset = max(0, request.args.get('offset', 0, type=int))
+        limit = request.args.get('limit', type=int)
+        if limit is not None:
+            limit = min(max(0, limit), MAX_PAGE_SIZE)
+
+        def build_payload():
+            slot_statuses = self.data_manager.get_slot_statuses(warehouse_id) or {}
+            slots = sorted(slot_statuses.values(), key=lambda slot: slot_sort_key(slot.get('slot_id')))
+            if col is not None:
+                slots = [slot for slot in slots if slot.get('col') == col]
+            if level is not None:
+                slots = [slot for slot in slots if slot.get('level') == level]
+            page = slots[offset:offset + limit] if limit is not None else slots[offset:]
+            return {'slots': page, 'total': len(slots), 'offset': offset, 'limit': limit}, 200
+
+        return conditional_json_response(self.data_manager, 'slot_statuses', warehouse_id,
+                                         ('slot_statuses', warehouse_id, 'all', col, level, offset, limit),
+                                         build_payload)
 
     def post(self):
         data = request.get_json(force=True)
         warehouse_id = 'default_warehouse'
-        slot_statuses = self.data_manager.get_slot_statuses(warehouse_id) or {}
-        # Si aspetta un dizionario {slot_id: dati_slot, ...} oppure una lista di slot
-        if isinstance(data, dict):
-            slot_statuses.update(data)
+        # Si aspetta {"slots": [...], "full_sync": bool}, un dizionario {slot_id: dati_slot, ...} oppure una lista di slot
+        full_sync = False
+        if isinstance(data, dict) and 'slots' in data:
+            slots = data['slots']
+            full_sync = data.get('full_sync', False)
+        elif isinstance(data, dict):
+            slots = list(data.values())
         elif isinstance(data, list):
-            for slot in data:
-                slot_id = slot.get('slot_id')
-                if slot_id:
-                    slot_statuses[slot_id] = slot
-        self.data_manager.add_slot_statuses(warehouse_id, slot_statuses)
-        print(f"Received slots batch: {data}")
-        return {'message': 'Status for all slots registered successfully.'}, 201
+            slots = data
+        else:
+            return {'message': 'Invalid slots payload.'}, 400
+        count, digest = self.data_manager.update_slot_statuses(warehouse_id, slots, replace=full_sync)
+        print(f"Received slots batch: {len(slots)} slots (full_sync={full_sync}), {count} slots stored")
+        # The digest lets the sender check that its copy and the stored one are identical
+        return {'message': 'Status for all slots registered successfully.',
+                'count': count,
+                'digest': format(digest, '016x')}, 201
+
+
+class SlotSummaryResource(Resource):
+    """Occupancy summary of the slots, precomputed on each slot write"""
+
+    def __init__(self, **kwargs):
+        self.data_manager = kwargs.get('data_manager')
+
+    def get(self):
+        warehouse_id = 'default_warehouse'
+
+        def build_payload():
+            summary = self.data_manager.get_slot_summary(warehouse_id)
+            if summary is not None:
+                return summary, 200
+            else:
+                return {'message': 'No slot data available'}, 404
+
+        return conditional_json_response(self.data_manager, 'slot_statuses', warehouse_id,
+                                         ('slot_statuses', warehouse_id, 'summary'), build_payload)
+
+
+class SlotOccupancyResource(Resource):
+    """Occupancy of all the slots as a compact bitset (bit slot_id - 1 set if in use)"""
+
+    def __init__(self, **kwargs):
+        self.data_manager = kwargs.get('data_manager')
+
+    def get(self):
+        warehouse_id = 'default_warehouse'
+
+        def build_payload():
+            occupancy = self.data_manager.get_slot_occupancy(warehouse_id)
+            if occupancy is not None:
+                return occupancy, 200
+            else:
+                return {'message': 'No slot data available'}, 404
+
+        return conditional_json_response(self.data_manager, 'slot_statuses', warehouse_id,
+                                         ('slot_statuses', warehouse_id, 'occupancy'), build_payload)
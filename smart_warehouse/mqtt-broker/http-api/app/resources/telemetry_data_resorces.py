@@ -27,14 +27,18 @@ class TelemetryDataResource(Resource):
 
     def post(self, device_id):
         try:
-            telemetry_data_dict = request.get_json(force=True)
-            # Crea un oggetto TelemetryMessage dalla richiesta
-            telemetry_message = TelemetryMessage(
-                telemetry_data_dict.get('timestamp'),
-                telemetry_data_dict.get('data_type'),
-                telemetry_data_dict.get('value')
-            )
-            self.data_manager.add_device_telemetry_data(device_id, telemetry_message)
+            telemetry_data = request.get_json(force=True)
+            # Accetta un singolo messaggio oppure una lista di messaggi (storico in batch)
+            if isinstance(telemetry_data, dict):
+                telemetry_data = [telemetry_data]
+            # The whole batch is validated before storing it: a malformed sample rejects
+            # the batch (400) without storing part of it
+            if not isinstance(telemetry_data, list) or \
+                    not all(isinstance(sample, dict) and 'value' in sample for sample in telemetry_data):
+                return {'error': "Invalid telemetry data ! Each message needs a 'value'"}, 400
+            # Crea gli oggetti TelemetryMessage dalla richiesta
+            telemetry_messages = [TelemetryMessage.from_dict(sample) for sample in telemetry_data]
+            self.data_manager.add_device_telemetry_batch(device_id, telemetry_messages)
             return Response(status=201)
         except JSONDecodeError:
             return {'error': "Invalid JSON ! Check the request"}, 400
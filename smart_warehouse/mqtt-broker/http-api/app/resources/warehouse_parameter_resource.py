@@ -1,5 +1,6 @@
 from flask_restful import Resource, reqparse
 from flask import request
+from resources.conditional_response import conditional_json_response
 
 class WarehouseParameterResource(Resource):
     def __init__(self, **kwargs):
@@ -9,11 +10,16 @@ class WarehouseParameterResource(Resource):
         # Recupera il valore del parametro dal data_manager
         # Per semplicità, usiamo 'default_warehouse' come chiave
         warehouse_id = 'default_warehouse'
-        params = self.data_manager.get_warehouse_parameters(warehouse_id)
-        if params and parameter in params:
-            return {'value': params[parameter]}, 200
-        else:
-            return {'message': f'Parameter {parameter} not found'}, 404
+
+        def build_payload():
+            params = self.data_manager.get_warehouse_parameters(warehouse_id)
+            if params and parameter in params:
+                return {'value': params[parameter]}, 200
+            else:
+                return {'message': f'Parameter {parameter} not found'}, 404
+
+        return conditional_json_response(self.data_manager, 'parameters', warehouse_id,
+                                         ('parameters', warehouse_id, parameter), build_payload)
 
     def post(self, parameter):
         data = request.get_json(force=True)
@@ -21,9 +27,24 @@ class WarehouseParameterResource(Resource):
         timestamp = data.get('timestamp')
         data_type = data.get('data_type')
         warehouse_id = 'default_warehouse'
-        # Recupera i parametri esistenti o crea un nuovo dict
-        params = self.data_manager.get_warehouse_parameters(warehouse_id) or {}
-        params[parameter] = value
-        self.data_manager.add_warehouse_parameters(warehouse_id, params)
+        # Aggiornamento atomico del solo parametro ricevuto
+        self.data_manager.set_warehouse_parameter(warehouse_id, parameter, value)
         print(f"Received parameter: {parameter}, value: {value}, timestamp: {timestamp}, data_type: {data_type}")
         return {'message': f'Parameter {parameter} registered successfully.'}, 201
+
+
+class WarehouseParametersResource(Resource):
+    """All the warehouse parameters in a single response"""
+
+    def __init__(self, **kwargs):
+        self.data_manager = kwargs.get('data_manager')
+
+    def get(self):
+        warehouse_id = 'default_warehouse'
+
+        def build_payload():
+            params = self.data_manager.get_warehouse_parameters(warehouse_id) or {}
+            return dict(params), 200
+
+        return conditional_json_response(self.data_manager, 'parameters', warehouse_id,
+                                         ('parameters', warehouse_id, None), build_payload)
@@ -1,16 +1,26 @@
-import tkinter as tk
-from typing import Optional, Dict
+import argparse
+from typing import Optional, Dict, List, Tuple, Union
 import sys
 import os
 import json
-import numpy as np
+import threading
+import time
 import paho.mqtt.client as mqtt
 
-# Import local modules
-from config_gui import ConfigGUI
+# Import local modules (config_gui, which needs tkinter, is imported only by the GUI mode)
 from matrix import WarehouseMatrix
 from graph import WarehouseGraph
 
+# Shared layout library, used by the services to rebuild the warehouse locally (smart_warehouse must be on PYTHONPATH)
+from warehouse_layout import LAYOUT_VERSION
+
+# Full graph topics of the earlier versions (graph JSON, CSR adjacency, per-node maps),
+# no longer read by any service since they rebuild the layout from warehouse/config/layout
+OBSOLETE_TOPICS = ("adjacency_matrix", "node_positions", "node_types", "graph_json", "graph_compact")
+
+# Default directory of the cached layouts
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "layout_cache")
+
 
 class WarehouseGenerator:
     """
@@ -29,13 +39,28 @@ class WarehouseGenerator:
         self.mqtt_topic_prefix = "warehouse/config/"
         self.mqtt_client = None
     
-    def get_configuration(self) -> Dict:
+    def get_configuration(self, config: Optional[Dict] = None) -> Dict:
         """
-        Launch the configuration GUI and get user input parameters.
+        Get the warehouse configuration parameters, from the given dictionary
+        (headless mode) or from the configuration GUI.
+        
+        Args:
+            config: Optional dictionary with the 'shelves', 'columns', 'levels' and 'agvs' integers
         
         Returns:
             Dictionary containing warehouse configuration parameters
         """
+        if config is not None:
+            missing = [key for key in ('shelves', 'columns', 'levels', 'agvs') if config.get(key) is None]
+            if missing:
+                raise ValueError(f"Missing configuration parameters: {', '.join(missing)}")
+            if any(int(config[key]) < 1 for key in ('shelves', 'columns', 'levels', 'agvs')):
+                raise ValueError("Configuration parameters must be positive integers")
+            self.config = {key: int(config[key]) for key in ('shelves', 'columns', 'levels', 'agvs')}
+            return self.config
+
+        import tkinter as tk
+        from config_gui import ConfigGUI
         root = tk.Tk()
         config_app = ConfigGUI(root)
         root.mainloop()
@@ -47,9 +72,20 @@ class WarehouseGenerator:
             sys.exit(0)
         
         return self.config
+
+    def get_cache_path(self, cache_dir: str) -> str:
+        """Return the path of the cached layout of the current configuration."""
+        return os.path.join(cache_dir, f"warehouse_s{self.config['shelves']}_c{self.config['columns']}_"
+                                       f"l{self.config['levels']}_a{self.config['agvs']}_v{LAYOUT_VERSION}.npz")
     
-    def create_warehouse_matrix(self):
-        """Create the warehouse matrix representation."""
+    def create_warehouse_matrix(self, cache_dir: Optional[str] = None):
+        """
+        Create the warehouse matrix representation.
+        
+        Args:
+            cache_dir: Optional directory of cached layouts: the matrix is loaded
+                       from it if present, otherwise generated and saved in it
+        """
         if self.config is None:
             raise ValueError("Configuration not set. Call get_configuration() first.")
         
@@ -62,12 +98,31 @@ class WarehouseGenerator:
         print(f"Number of AGVs:       {self.config['agvs']}")
         print("="*60)
         
-        self.warehouse_matrix = WarehouseMatrix(
-            num_shelves=self.config['shelves'],
-            columns_per_shelf=self.config['columns'],
-            levels_per_shelf=self.config['levels'],
-            num_agvs=self.config['agvs']
-        )
+        cache_path = self.get_cache_path(cache_dir) if cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            try:
+                self.warehouse_matrix = WarehouseMatrix.load(cache_path)
+                print(f"Loaded cached layout {cache_path}")
+            except Exception as e:
+                print(f"[WARNING] Cannot load cached layout {cache_path}: {e}")
+                self.warehouse_matrix = None
+        else:
+            self.warehouse_matrix = None
+
+        if self.warehouse_matrix is None:
+            self.warehouse_matrix = WarehouseMatrix(
+                num_shelves=self.config['shelves'],
+                columns_per_shelf=self.config['columns'],
+                levels_per_shelf=self.config['levels'],
+                num_agvs=self.config['agvs']
+            )
+            if cache_path:
+                try:
+                    os.makedirs(cache_dir, exist_ok=True)
+                    self.warehouse_matrix.save(cache_path)
+                    print(f"Saved layout to cache {cache_path}")
+                except OSError as e:
+                    print(f"[WARNING] Cannot save layout to cache {cache_path}: {e}")
         
         # Print the grid representation
         self.warehouse_matrix.print_grid()
@@ -84,7 +139,7 @@ class WarehouseGenerator:
         print("="*60)
         
         self.warehouse_graph = WarehouseGraph(
-            adjacency_matrix=self.warehouse_matrix.get_adjacency_matrix(),
+            edges=self.warehouse_matrix.get_edges(),
             node_positions=self.warehouse_matrix.get_node_positions(),
             node_types=self.warehouse_matrix.get_node_types(),
             warehouse_grid=self.warehouse_matrix.get_grid()
@@ -119,31 +174,40 @@ class WarehouseGenerator:
             raise ValueError(f"Unknown visualization type: {visualization_type}")
     
     def generate_complete_warehouse(self, visualization_type: str = 'graph',
-                                   save_path: Optional[str] = None):
+                                   save_path: Optional[str] = None,
+                                   config: Optional[Dict] = None,
+                                   plot: bool = True,
+                                   cache_dir: Optional[str] = None):
         """
         Complete warehouse generation pipeline.
         
         Args:
             visualization_type: Type of visualization to display
             save_path: Optional path to save the visualization
+            config: Optional configuration dictionary, the GUI is opened when missing
+            plot: Render the visualization (False to skip it, e.g. in containers)
+            cache_dir: Optional directory of cached layouts
         """
         try:
             # Step 1: Get configuration
             print("\nStep 1: Getting warehouse configuration...")
-            self.get_configuration()
+            self.get_configuration(config)
             
             # Step 2: Create matrix representation
             print("\nStep 2: Creating warehouse matrix...")
-            self.create_warehouse_matrix()
+            self.create_warehouse_matrix(cache_dir)
             
             # Step 3: Create graph representation
             print("\nStep 3: Creating warehouse graph...")
             self.create_warehouse_graph()
             
             # Step 4: Visualize
-            print("\nStep 4: Generating visualization...")
-            self.visualize_warehouse(visualization_type=visualization_type, 
-                                    save_path=save_path)
+            if plot or save_path:
+                print("\nStep 4: Generating visualization...")
+                self.visualize_warehouse(visualization_type=visualization_type, 
+                                        save_path=save_path)
+            else:
+                print("\nStep 4: Visualization skipped.")
             
             print("\n" + "="*60)
             print("WAREHOUSE GENERATION COMPLETE!")
@@ -168,7 +232,7 @@ class WarehouseGenerator:
         info = {
             'config': self.config,
             'dimensions': self.warehouse_matrix.get_dimensions(),
-            'matrix_shape': self.warehouse_matrix.get_adjacency_matrix().shape,
+            'matrix_shape': self.warehouse_matrix.get_adjacency_shape(),
             'graph_stats': self.warehouse_graph.get_statistics(),
             'agv_start_nodes': self.warehouse_matrix.get_agv_start_nodes(),
             'shipping_nodes': self.warehouse_matrix.get_shipping_nodes(),
@@ -178,15 +242,106 @@ class WarehouseGenerator:
         }
         return info
     
+    def build_mqtt_messages(self, topic_prefix: str = "warehouse/config") -> List[Tuple[str, Union[str, bytes], str]]:
+        """
+        Serialize all the warehouse data to publish.
+
+        Args:
+            topic_prefix: Prefix for MQTT topics (default: 'warehouse/config')
+
+        Returns:
+            List of (topic, payload, description) in publication order
+        """
+        timestamp = time.time()
+        messages = []
+
+        # 1. Configuration parameters
+        config_topics = {
+            "shelves": f"{topic_prefix}/param/number_of_shelves",
+            "columns": f"{topic_prefix}/param/columns_per_shelf",
+            "levels": f"{topic_prefix}/param/levels_per_shelf",
+            "agvs": f"{topic_prefix}/param/number_of_agvs"
+        }
+        for param, topic in config_topics.items():
+            payload = json.dumps({
+                "type": param,
+                "value": self.config[param],
+                "timestamp": timestamp
+            }, indent=2)
+            messages.append((topic, payload, param))
+
+        # 1b. Layout message, from which the services rebuild grid, nodes and graph
+        # (WarehouseMatrix builds its grid with the same WarehouseLayout, so they always match)
+        messages.append((f"{topic_prefix}/layout", json.dumps(self.warehouse_matrix.layout.to_payload()), "layout"))
+
+        # 2. AGV start nodes
+        agv_nodes = self.warehouse_matrix.get_agv_start_nodes()
+        messages.append((f"{topic_prefix}/agv_start_nodes", json.dumps({
+            "agv_start_nodes": agv_nodes,
+            "num_agvs": len(agv_nodes),
+            "timestamp": timestamp
+        }, indent=2), "AGV start nodes"))
+
+        # 3. Shipping node
+        shipping_nodes = self.warehouse_matrix.get_shipping_nodes()
+        messages.append((f"{topic_prefix}/shipping_nodes", json.dumps({
+            "shipping_nodes": shipping_nodes,
+            "num_shipping_nodes": len(shipping_nodes),
+            "timestamp": timestamp
+        }, indent=2), "shipping nodes"))
+
+        # 4. Pallet spawn node
+        pallet_nodes = self.warehouse_matrix.get_pallet_spawn_nodes()
+        messages.append((f"{topic_prefix}/pallet_spawn_nodes", json.dumps({
+            "pallet_spawn_nodes": pallet_nodes,
+            "num_pallet_nodes": len(pallet_nodes),
+            "timestamp": timestamp
+        }, indent=2), "pallet spawn nodes"))
+
+        # 5. Shelf nodes
+        shelf_nodes = self.warehouse_matrix.get_shelf_nodes()
+        messages.append((f"{topic_prefix}/shelf_nodes", json.dumps({
+            "shelf_nodes": shelf_nodes,
+            "num_shelf_nodes": len(shelf_nodes),
+            "timestamp": timestamp
+        }), "shelf nodes"))
+
+        # 6. Warehouse dimensions
+        dimensions = self.warehouse_matrix.get_dimensions()
+        messages.append((f"{topic_prefix}/dimensions", json.dumps({
+            "width": dimensions[0],
+            "height": dimensions[1],
+            "grid_size": f"{dimensions[0]}x{dimensions[1]}",
+            "timestamp": timestamp
+        }, indent=2), "warehouse dimensions"))
+
+        # 7. Graph statistics
+        messages.append((f"{topic_prefix}/graph_stats", json.dumps({
+            **self.warehouse_graph.get_statistics(),
+            "timestamp": timestamp
+        }, indent=2), "graph statistics"))
+
+        # 8. Topics replaced by warehouse/config/layout: the services rebuild the graph
+        # locally, so the retained copies of older generations are cleared (empty payload)
+        for topic in OBSOLETE_TOPICS:
+            messages.append((f"{topic_prefix}/{topic}", b"", f"cleared {topic}"))
+        return messages
+
     def publish_to_mqtt(self, broker: str = "my-mosquitto-broker", port: int = 1883, 
-                       topic_prefix: str = "warehouse/config") -> bool:
+                       topic_prefix: str = "warehouse/config", timeout: float = 30.0) -> bool:
         """
         Publish warehouse data to MQTT broker.
+
+        The payloads are serialized while the connection is being established,
+        then all the QoS 1 messages are sent without waiting for each other and
+        awaited together. Every topic is retained, so services started later
+        receive the current warehouse without a new generation.
         
         Args:
             broker: MQTT broker address (default: localhost, use 'my-mosquitto-broker' for Docker)
             port: MQTT broker port (default: 1883)
             topic_prefix: Prefix for MQTT topics (default: 'warehouse/config')
+            timeout: Seconds to wait for the connection and for the acknowledgements
             
         Returns:
             True if successful, False otherwise
@@ -200,180 +355,54 @@ class WarehouseGenerator:
             print("="*60)
             print(f"Broker: {broker}:{port}")
             print(f"Topic prefix: {topic_prefix}")
+            start_time = time.time()
             
             # Create MQTT client
             self.mqtt_client = mqtt.Client()
+            connected = threading.Event()
+            connect_result = {}
             
-            # Set callback for connection confirmation
+            # Set callback for connection confirmation (CONNACK)
             def on_connect(client, userdata, flags, rc):
+                connect_result["rc"] = rc
                 if rc == 0:
                     print("✓ Successfully connected to MQTT Broker")
                 else:
                     print(f"✗ Failed to connect to MQTT Broker. Return code: {rc}")
+                connected.set()
             
             self.mqtt_client.on_connect = on_connect
             
-            # Connect to broker
+            # Connect to broker, the handshake runs while the payloads are serialized
             print("Connecting to broker...")
-            self.mqtt_client.connect(broker, port, 60)
+            self.mqtt_client.connect_async(broker, port, 60)
             self.mqtt_client.loop_start()
-            
-            # Give time for connection to establish
-            import time
-            time.sleep(1)
-            
-            # 1. Publish configuration parameters
-            print("Publishing configuration parameters...")
-            config_topics = {
-                "shelves": f"{topic_prefix}/param/number_of_shelves",
-                "columns": f"{topic_prefix}/param/columns_per_shelf",
-                "levels": f"{topic_prefix}/param/levels_per_shelf",
-                "agvs": f"{topic_prefix}/param/number_of_agvs"
-            }
-            
-            for param, topic in config_topics.items():
-                payload = json.dumps({
-                    "type": param,
-                    "value": self.config[param],
-                    "timestamp": time.time()
-                }, indent=2)
-                # Retain True only for the first 4 config params
-                result = self.mqtt_client.publish(topic, payload, qos=1, retain=True)
-                result.wait_for_publish()
-                print(f"  ✓ Published {param} to {topic}")
-            
-            # 2. Publish adjacency matrix
-            matrix_topic = f"{topic_prefix}/adjacency_matrix"
-            adjacency_matrix = self.warehouse_matrix.get_adjacency_matrix()
-            matrix_payload = json.dumps({
-                "shape": list(adjacency_matrix.shape),
-                "data": adjacency_matrix.tolist(),
-                "timestamp": time.time()
-            }, indent=2)
-            result = self.mqtt_client.publish(matrix_topic, matrix_payload, qos=1, retain=False)
-            result.wait_for_publish()
-            print(f"✓ Published adjacency matrix to {matrix_topic}")
-            
-            # 3. Publish node positions
-            positions_topic = f"{topic_prefix}/node_positions"
-            node_positions = self.warehouse_matrix.get_node_positions()
-            positions_payload = json.dumps({
-                "positions": {str(k): v for k, v in node_positions.items()},
-                "timestamp": time.time()
-            }, indent=2)
-            result = self.mqtt_client.publish(positions_topic, positions_payload, qos=1, retain=False)
-            result.wait_for_publish()
-            print(f"✓ Published node positions to {positions_topic}")
-            
-            # 4. Publish node types
-            types_topic = f"{topic_prefix}/node_types"
-            node_types = self.warehouse_matrix.get_node_types()
-            types_payload = json.dumps({
-                "types": {str(k): v for k, v in node_types.items()},
-                "timestamp": time.time()
-            }, indent=2)
-            result = self.mqtt_client.publish(types_topic, types_payload, qos=1, retain=False)
-            result.wait_for_publish()
-            print(f"✓ Published node types to {types_topic}")
-
-            # 5. Publish AGV start nodes
-            agv_topic = f"{topic_prefix}/agv_start_nodes"
-            agv_nodes = self.warehouse_matrix.get_agv_start_nodes()
-            agv_payload = json.dumps({
-                "agv_start_nodes": agv_nodes,
-                "num_agvs": len(agv_nodes),
-                "timestamp": time.time()
-            }, indent=2)
-            result = self.mqtt_client.publish(agv_topic, agv_payload, qos=1, retain=False)
-            result.wait_for_publish()
-            print(f"✓ Published AGV start nodes to {agv_topic}")
-            
-            # 6. Publish shipping node
-            shipping_topic = f"{topic_prefix}/shipping_nodes"
-            shipping_nodes = self.warehouse_matrix.get_shipping_nodes()
-            shipping_payload = json.dumps({
-                "shipping_nodes": shipping_nodes,
-                "num_shipping_nodes": len(shipping_nodes),
-                "timestamp": time.time()
-            }, indent=2)
-            result = self.mqtt_client.publish(shipping_topic, shipping_payload, qos=1, retain=False)
-            result.wait_for_publish()
-            print(f"✓ Published shipping nodes to {shipping_topic}")
-            
-            # 7. Publish pallet spawn node
-            pallet_topic = f"{topic_prefix}/pallet_spawn_nodes"
-            pallet_nodes = self.warehouse_matrix.get_pallet_spawn_nodes()
-            pallet_payload = json.dumps({
-                "pallet_spawn_nodes": pallet_nodes,
-                "num_pallet_nodes": len(pallet_nodes),
-                "timestamp": time.time()
-            }, indent=2)
-            result = self.mqtt_client.publish(pallet_topic, pallet_payload, qos=1, retain=False)
-            result.wait_for_publish()
-            print(f"✓ Published pallet spawn nodes to {pallet_topic}")
-            
-            # 8. Publish shelf nodes
-            shelf_topic = f"{topic_prefix}/shelf_nodes"
-            shelf_nodes = self.warehouse_matrix.get_shelf_nodes()
-            shelf_payload = json.dumps({
-                "shelf_nodes": shelf_nodes,
-                "num_shelf_nodes": len(shelf_nodes),
-                "timestamp": time.time()
-            }, indent=2)
-            result = self.mqtt_client.publish(shelf_topic, shelf_payload, qos=1, retain=False)
-            result.wait_for_publish()
-            print(f"✓ Published shelf nodes to {shelf_topic}")
-
-            # 9. Publish warehouse dimensions
-            dimensions_topic = f"{topic_prefix}/dimensions"
-            dimensions = self.warehouse_matrix.get_dimensions()
-            dimensions_payload = json.dumps({
-                "width": dimensions[0],
-                "height": dimensions[1],
-                "grid_size": f"{dimensions[0]}x{dimensions[1]}",
-                "timestamp": time.time()
-            }, indent=2)
-            result = self.mqtt_client.publish(dimensions_topic, dimensions_payload, qos=1, retain=False)
-            result.wait_for_publish()
-            print(f"✓ Published warehouse dimensions to {dimensions_topic}")
-
-            # 10. Publish graph statistics
-            stats_topic = f"{topic_prefix}/graph_stats"
-            graph_stats = self.warehouse_graph.get_statistics()
-            stats_payload = json.dumps({
-                **graph_stats,
-                "timestamp": time.time()
-            }, indent=2)
-            result = self.mqtt_client.publish(stats_topic, stats_payload, qos=1, retain=False)
-            result.wait_for_publish()
-            print(f"✓ Published graph statistics to {stats_topic}")
-
-            # 11. Publish NetworkX graph as JSON
-
-            import networkx as nx
-            graph_topic = f"{topic_prefix}/graph_json"
-            nx_graph = self.warehouse_graph.graph if hasattr(self.warehouse_graph, 'graph') else self.warehouse_graph
-            # node_link_data di networkx 3.2.1 produce un dict con 'nodes' e 'links' (non 'edges')
-            graph_data = nx.node_link_data(nx_graph)
-            # Debug: assicurati che 'links' sia presente
-            if "links" not in graph_data:
-                print("[WARNING] Il grafo serializzato non contiene 'links'. networkx 3.2.1 richiede 'links'.")
-            # Pubblica il payload compatibile
-            graph_json = json.dumps({
-                "graph": graph_data,
-                "timestamp": time.time()
-            }, indent=2)
-            result = self.mqtt_client.publish(graph_topic, graph_json, qos=1, retain=False)
-            result.wait_for_publish()
-            print(f"✓ Published NetworkX graph JSON to {graph_topic} (con 'nodes' e 'links')")
+
+            messages = self.build_mqtt_messages(topic_prefix)
+            # Keep every message in flight at once instead of the default window of 20
+            self.mqtt_client.max_inflight_messages_set(max(20, len(messages)))
+
+            if not connected.wait(timeout) or connect_result.get("rc") != 0:
+                raise ConnectionError(f"No successful CONNACK from {broker}:{port} within {timeout} s")
+
+            # Issue all the publishes, then wait for all the PUBACKs
+            results = []
+            for topic, payload, description in messages:
+                results.append(self.mqtt_client.publish(topic, payload, qos=1, retain=True))
+            deadline = time.time() + timeout
+            for (topic, payload, description), result in zip(messages, results):
+                result.wait_for_publish(max(0.0, deadline - time.time()))
+                if not result.is_published():
+                    raise TimeoutError(f"Publication of {description} to {topic} not acknowledged within {timeout} s")
+                print(f"  ✓ Published {description} to {topic} ({len(payload)} bytes)")
 
             # Stop loop and disconnect
-            self.mqtt_client.loop_stop()
             self.mqtt_client.disconnect()
+            self.mqtt_client.loop_stop()
 
             print("="*60)
             print("MQTT PUBLISHING COMPLETE!")
-            print(f"Total topics published: 14")
+            print(f"Total topics published: {len(messages)} in {time.time() - start_time:.2f} s")
             print("="*60)
 
             return True
@@ -390,9 +419,43 @@ class WarehouseGenerator:
                     pass
             return False
 
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Generate the warehouse layout and publish it to the MQTT broker. "
+                    "Without --shelves/--columns/--levels/--agvs the configuration GUI is opened.")
+    parser.add_argument("--shelves", type=int, help="Number of shelves")
+    parser.add_argument("--columns", type=int, help="Columns per shelf")
+    parser.add_argument("--levels", type=int, help="Levels per shelf")
+    parser.add_argument("--agvs", type=int, help="Number of AGVs")
+    parser.add_argument("--no-plot", action="store_true", help="Do not render the visualization")
+    parser.add_argument("--save-plot", metavar="PATH", help="Save the visualization to PATH")
+    parser.add_argument("--visualization", choices=["grid", "graph", "combined"], default="graph",
+                        help="Type of visualization (default: graph)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"Directory of the cached layouts (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--no-cache", action="store_true", help="Always generate the layout, without the cache")
+    parser.add_argument("--broker", default="my-mosquitto-broker", help="MQTT broker address")
+    parser.add_argument("--port", type=int, default=1883, help="MQTT broker port")
+    parser.add_argument("--no-publish", action="store_true", help="Do not publish the warehouse to the broker")
+    args = parser.parse_args(argv)
 
-def main():
+    given = [name for name in ("shelves", "columns", "levels", "agvs") if getattr(args, name) is not None]
+    if given and len(given) != 4:
+        parser.error("--shelves, --columns, --levels and --agvs must be given together")
+    return args
+
+
+def main(argv=None):
     """Main function to run the warehouse generator."""
+    args = parse_args(argv)
+    headless = args.shelves is not None
+    plot = not args.no_plot
+    if not plot:
+        # Render (if saving) without a display
+        import matplotlib.pyplot as plt
+        plt.switch_backend("Agg")
+
     print("\n" + "="*60)
     print(" WAREHOUSE GENERATION SYSTEM")
     print("="*60)
@@ -403,9 +466,14 @@ def main():
     generator = WarehouseGenerator()
     
     # Generate complete warehouse
+    config = {"shelves": args.shelves, "columns": args.columns,
+              "levels": args.levels, "agvs": args.agvs} if headless else None
     success = generator.generate_complete_warehouse(
-        visualization_type='graph',
-        save_path=None  # Change to a path string to save the visualization
+        visualization_type=args.visualization,
+        save_path=args.save_plot,
+        config=config,
+        plot=plot,
+        cache_dir=None if args.no_cache else args.cache_dir
     )
     
     if success:
@@ -418,11 +486,14 @@ def main():
         print(f"Total graph edges: {info['graph_stats']['num_edges']}")
         print(f"Total shelf nodes: {info['graph_stats'].get('num_shelves', len(info['shelf_nodes']))}")
         
+        if args.no_publish:
+            return generator, True
+
         # Publish to MQTT broker
         print("\nPublishing warehouse data to MQTT broker...")
         mqtt_success = generator.publish_to_mqtt(
-            broker="my-mosquitto-broker",
-            port=1883,
+            broker=args.broker,
+            port=args.port,
             topic_prefix="warehouse/config"
         )
         
@@ -430,9 +501,11 @@ def main():
             print("\n✓ Warehouse data successfully published to MQTT broker")
         else:
             print("\n✗ Failed to publish warehouse data to MQTT broker")
+        return generator, mqtt_success
     
-    return generator
+    return generator, False
 
 
 if __name__ == "__main__":
-    generator = main()
+    generator, success = main()
+    sys.exit(0 if success else 1)
@@ -1,7 +1,8 @@
 import networkx as nx
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
-from matplotlib.colors import ListedColormap
+from matplotlib.collections import LineCollection
+from matplotlib.colors import ListedColormap, to_rgb
 import numpy as np
 from typing import Dict, Optional
 
@@ -9,10 +10,31 @@ from typing import Dict, Optional
 class WarehouseGraph:
     """
     Class to create and visualize a graph representation of the warehouse
-    from an adjacency matrix.
+    from the edge list of its (sparse) adjacency matrix.
     """
+
+    # Node type names, indexed by type code
+    NODE_TYPE_NAMES = ('aisle', 'shelf', 'agv_start', 'shipping', 'pallet_spawn')
+    # Grid cell colours, indexed by cell type (lookup table for the whole grid at once)
+    GRID_COLORS = np.array([
+        [0.9, 0.9, 0.9],    # Aisle - light gray
+        [0.3, 0.3, 0.6],    # Shelf - dark blue
+        [0.2, 0.8, 0.2],    # AGV start - green
+        [0.8, 0.6, 0.2],    # Shipping - orange
+        [0.8, 0.2, 0.2]     # Pallet spawn - red
+    ])
+    # Graph node colours by node type
+    NODE_COLORS = {
+        'aisle': '#E0E0E0',
+        'shelf': '#3F51B5',
+        'agv_start': '#4CAF50',
+        'shipping': '#FF9800',
+        'pallet_spawn': '#F44336'
+    }
+    # Above this many rows or columns the cell grid lines are not drawn
+    MAX_GRID_LINES = 200
     
-    def __init__(self, adjacency_matrix: np.ndarray, 
+    def __init__(self, edges: np.ndarray, 
                  node_positions: Dict[int, tuple], 
                  node_types: Dict[int, str],
                  warehouse_grid: np.ndarray):
@@ -20,21 +42,25 @@ class WarehouseGraph:
         Initialize the warehouse graph.
         
         Args:
-            adjacency_matrix: The adjacency matrix of the warehouse
+            edges: The undirected edges of the warehouse, an (E, 2) array of node IDs
             node_positions: Dictionary mapping node IDs to (row, col) positions
             node_types: Dictionary mapping node IDs to their types
             warehouse_grid: The warehouse grid layout
         """
-        self.adjacency_matrix = adjacency_matrix
+        self.edges = edges
         self.node_positions = node_positions
         self.node_types = node_types
         self.warehouse_grid = warehouse_grid
+        # Type code of each node (index in NODE_TYPE_NAMES, unknown types count as aisles)
+        type_codes = {name: code for code, name in enumerate(self.NODE_TYPE_NAMES)}
+        self.node_type_codes = np.fromiter((type_codes.get(node_type, 0) for node_type in node_types.values()),
+                                           dtype=np.uint8, count=len(node_types))
         
         # Create the graph
         self.graph = self._create_graph()
     
     def _create_graph(self) -> nx.Graph:
-        """Create a NetworkX graph from the adjacency matrix."""
+        """Create a NetworkX graph from the edge list."""
         G = nx.Graph()
         
         # Add nodes with their attributes
@@ -44,12 +70,8 @@ class WarehouseGraph:
                       grid_pos=(row, col),
                       type=self.node_types[node_id])
         
-        # Add edges from adjacency matrix
-        num_nodes = self.adjacency_matrix.shape[0]
-        for i in range(num_nodes):
-            for j in range(i + 1, num_nodes):
-                if self.adjacency_matrix[i, j] == 1:
-                    G.add_edge(i, j)
+        # Add edges (each undirected edge once)
+        G.add_edges_from(map(tuple, self.edges.tolist()))
         
         return G
     
@@ -57,6 +79,50 @@ class WarehouseGraph:
         """Return the NetworkX graph."""
         return self.graph
     
+    def _colored_grid(self) -> np.ndarray:
+        """Return the RGB image of the grid (unknown cell types are drawn as aisles)."""
+        cell_types = np.asarray(self.warehouse_grid, dtype=int)
+        cell_types = np.where((cell_types >= 0) & (cell_types < len(self.GRID_COLORS)), cell_types, 0)
+        return self.GRID_COLORS[cell_types]
+
+    def _draw_grid(self, ax):
+        """Draw the grid as a single image, with cell lines on small layouts."""
+        height, width = self.warehouse_grid.shape[:2]
+        ax.imshow(self._colored_grid(), interpolation='nearest', aspect='auto')
+        if max(height, width) <= self.MAX_GRID_LINES:
+            ax.set_xticks(np.arange(-0.5, width, 1), minor=True)
+            ax.set_yticks(np.arange(-0.5, height, 1), minor=True)
+            ax.grid(which="minor", color="black", linestyle='-', linewidth=0.5, alpha=0.3)
+
+    def _draw_graph(self, ax, node_size: float, show_labels: bool = False):
+        """
+        Draw nodes and edges with one scatter and one line collection,
+        rasterized so that large graphs stay fast to render and to save.
+        """
+        nodes = list(self.graph.nodes())
+        if not nodes:
+            return
+        index = {node: i for i, node in enumerate(nodes)}
+        pos = nx.get_node_attributes(self.graph, 'pos')
+        xy = np.array([pos[node] for node in nodes], dtype=float)
+
+        edges = np.array([(index[u], index[v]) for u, v in self.graph.edges()], dtype=int).reshape(-1, 2)
+        if len(edges):
+            ax.add_collection(LineCollection(xy[edges], colors='gray', linewidths=0.5, alpha=0.5,
+                                             rasterized=True, zorder=1))
+
+        type_colors = {node_type: to_rgb(color) for node_type, color in self.NODE_COLORS.items()}
+        colors = np.array([type_colors.get(self.graph.nodes[node].get('type'), type_colors['aisle'])
+                           for node in nodes])
+        # Shrink the markers on large layouts so they do not overlap
+        size = min(node_size, node_size * 2000 / len(nodes))
+        ax.scatter(xy[:, 0], xy[:, 1], s=size, c=colors, alpha=0.8, linewidths=0, rasterized=True, zorder=2)
+
+        if show_labels:
+            for node, (x, y) in zip(nodes, xy):
+                ax.annotate(str(node), (x, y), fontsize=6, color='black', ha='center', va='center')
+        ax.autoscale_view()
+
     def visualize_grid(self, figsize=(14, 10), save_path: Optional[str] = None):
         """
         Visualize the warehouse grid layout.
@@ -67,31 +133,8 @@ class WarehouseGraph:
         """
         fig, ax = plt.subplots(figsize=figsize)
         
-        # Define colors for different cell types
-        colors = {
-            0: [0.9, 0.9, 0.9],    # Aisle - light gray
-            1: [0.3, 0.3, 0.6],    # Shelf - dark blue
-            2: [0.2, 0.8, 0.2],    # AGV start - green
-            3: [0.8, 0.6, 0.2],    # Shipping - orange
-            4: [0.8, 0.2, 0.2]     # Pallet spawn - red
-        }
-        
-        # Create colored grid
-        colored_grid = np.zeros((self.warehouse_grid.shape[0], 
-                                self.warehouse_grid.shape[1], 3))
-        
-        for i in range(self.warehouse_grid.shape[0]):
-            for j in range(self.warehouse_grid.shape[1]):
-                cell_type = self.warehouse_grid[i, j]
-                colored_grid[i, j] = colors[cell_type]
-        
-        # Display the grid
-        ax.imshow(colored_grid, interpolation='nearest', aspect='auto')
-        
-        # Add grid lines
-        ax.set_xticks(np.arange(-0.5, self.warehouse_grid.shape[1], 1), minor=True)
-        ax.set_yticks(np.arange(-0.5, self.warehouse_grid.shape[0], 1), minor=True)
-        ax.grid(which="minor", color="black", linestyle='-', linewidth=0.5, alpha=0.3)
+        colors = self.GRID_COLORS
+        self._draw_grid(ax)
         
         # Create legend
         legend_elements = [
@@ -127,39 +170,8 @@ class WarehouseGraph:
         """
         fig, ax = plt.subplots(figsize=figsize)
         
-        # Get node positions for visualization
-        pos = nx.get_node_attributes(self.graph, 'pos')
-        
-        # Define colors for different node types
-        node_colors = {
-            'aisle': '#E0E0E0',
-            'shelf': '#3F51B5',
-            'agv_start': '#4CAF50',
-            'shipping': '#FF9800',
-            'pallet_spawn': '#F44336'
-        }
-        # Create node color list, default to aisle if type missing
-        colors = [node_colors.get(self.graph.nodes[node]['type'], node_colors['aisle'])
-                  for node in self.graph.nodes()]
-        
-        # Draw the graph
-        nx.draw_networkx_nodes(self.graph, pos, 
-                              node_color=colors,
-                              node_size=100,
-                              alpha=0.8,
-                              ax=ax)
-        
-        nx.draw_networkx_edges(self.graph, pos, 
-                              edge_color='gray',
-                              width=0.5,
-                              alpha=0.5,
-                              ax=ax)
-        
-        if show_labels:
-            nx.draw_networkx_labels(self.graph, pos, 
-                                   font_size=6,
-                                   font_color='black',
-                                   ax=ax)
+        node_colors = self.NODE_COLORS
+        self._draw_graph(ax, node_size=100, show_labels=show_labels)
         
         # Create legend
         legend_elements = [
@@ -194,54 +206,14 @@ class WarehouseGraph:
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=figsize)
         
         # LEFT PLOT: Grid visualization
-        colors = {
-            0: [0.9, 0.9, 0.9],
-            1: [0.3, 0.3, 0.6],
-            2: [0.2, 0.8, 0.2],
-            3: [0.8, 0.6, 0.2],
-            4: [0.8, 0.2, 0.2]
-        }
-        
-        colored_grid = np.zeros((self.warehouse_grid.shape[0], 
-                                self.warehouse_grid.shape[1], 3))
-        
-        for i in range(self.warehouse_grid.shape[0]):
-            for j in range(self.warehouse_grid.shape[1]):
-                cell_type = self.warehouse_grid[i, j]
-                colored_grid[i, j] = colors[cell_type]
-        
-        ax1.imshow(colored_grid, interpolation='nearest', aspect='auto')
-        ax1.set_xticks(np.arange(-0.5, self.warehouse_grid.shape[1], 1), minor=True)
-        ax1.set_yticks(np.arange(-0.5, self.warehouse_grid.shape[0], 1), minor=True)
-        ax1.grid(which="minor", color="black", linestyle='-', linewidth=0.5, alpha=0.3)
+        colors = self.GRID_COLORS
+        self._draw_grid(ax1)
         ax1.set_title('Warehouse Grid Layout', fontsize=14, fontweight='bold')
         ax1.set_xlabel('Columns')
         ax1.set_ylabel('Rows')
         
         # RIGHT PLOT: Graph visualization
-        pos = nx.get_node_attributes(self.graph, 'pos')
-        
-        node_colors_map = {
-            'aisle': '#E0E0E0',
-            'shelf': '#3F51B5',
-            'agv_start': '#4CAF50',
-            'shipping': '#FF9800',
-            'pallet_spawn': '#F44336'
-        }
-        node_colors = [node_colors_map.get(self.graph.nodes[node]['type'], node_colors_map['aisle'])
-                      for node in self.graph.nodes()]
-        
-        nx.draw_networkx_nodes(self.graph, pos, 
-                              node_color=node_colors,
-                              node_size=80,
-                              alpha=0.8,
-                              ax=ax2)
-        
-        nx.draw_networkx_edges(self.graph, pos, 
-                              edge_color='gray',
-                              width=0.5,
-                              alpha=0.5,
-                              ax=ax2)
+        self._draw_graph(ax2, node_size=80)
         
         ax2.set_title('Warehouse Graph Network', fontsize=14, fontweight='bold')
         ax2.axis('equal')
@@ -270,20 +242,20 @@ class WarehouseGraph:
     
     def get_statistics(self) -> Dict:
         """Return statistics about the warehouse graph."""
+        num_nodes = self.graph.number_of_nodes()
+        num_edges = self.graph.number_of_edges()
+        counts = np.bincount(self.node_type_codes, minlength=len(self.NODE_TYPE_NAMES))
+        count = dict(zip(self.NODE_TYPE_NAMES, counts.tolist()))
         stats = {
-            'num_nodes': self.graph.number_of_nodes(),
-            'num_edges': self.graph.number_of_edges(),
-            'num_agv_start': sum(1 for n in self.graph.nodes() 
-                                if self.graph.nodes[n]['type'] == 'agv_start'),
-            'num_shipping': sum(1 for n in self.graph.nodes() 
-                               if self.graph.nodes[n]['type'] == 'shipping'),
-            'num_pallet_spawn': sum(1 for n in self.graph.nodes() 
-                                   if self.graph.nodes[n]['type'] == 'pallet_spawn'),
-            'num_aisles': sum(1 for n in self.graph.nodes() 
-                             if self.graph.nodes[n]['type'] == 'aisle'),
-            'num_shelves': sum(1 for n in self.graph.nodes() 
-                              if self.graph.nodes[n]['type'] == 'shelf'),
-            'average_degree': sum(dict(self.graph.degree()).values()) / self.graph.number_of_nodes(),
+            'num_nodes': num_nodes,
+            'num_edges': num_edges,
+            'num_agv_start': count['agv_start'],
+            'num_shipping': count['shipping'],
+            'num_pallet_spawn': count['pallet_spawn'],
+            'num_aisles': count['aisle'],
+            'num_shelves': count['shelf'],
+            # Sum of the degrees of an undirected graph = 2 * edges
+            'average_degree': 2 * num_edges / num_nodes,
             'is_connected': nx.is_connected(self.graph)
         }
         return stats
@@ -307,7 +279,7 @@ class WarehouseGraph:
 
 
 if __name__ == "__main__":
-    # Test with a sample adjacency matrix
+    # Test with a sample warehouse
     from matrix import WarehouseMatrix
     
     warehouse_matrix = WarehouseMatrix(
@@ -318,7 +290,7 @@ if __name__ == "__main__":
     )
     
     warehouse_graph = WarehouseGraph(
-        adjacency_matrix=warehouse_matrix.get_adjacency_matrix(),
+        edges=warehouse_matrix.get_edges(),
         node_positions=warehouse_matrix.get_node_positions(),
         node_types=warehouse_matrix.get_node_types(),
         warehouse_grid=warehouse_matrix.get_grid()
@@ -1,14 +1,23 @@
+import os
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from warehouse_layout import WarehouseLayout
+
+# Node type names, indexed by the cell type code of the grid
+NODE_TYPE_NAMES = ('aisle', 'shelf', 'agv_start', 'shipping', 'pallet_spawn')
 
 
 class WarehouseMatrix:
     """
     Class to create an adjacency matrix representation of a warehouse.
     The warehouse contains shelves, aisles, AGV starting areas, shipping areas, and pallet spawning areas.
+    The adjacency matrix is kept sparse (CSR arrays): a grid node has at most
+    four neighbours, so memory grows with the number of nodes, not its square.
     """
     
-    def __init__(self, num_shelves: int, columns_per_shelf: int, levels_per_shelf: int, num_agvs: int):
+    def __init__(self, num_shelves: int, columns_per_shelf: int, levels_per_shelf: int, num_agvs: int,
+                 generate: bool = True):
         """
         Initialize the warehouse matrix generator.
         
@@ -17,137 +26,46 @@ class WarehouseMatrix:
             columns_per_shelf: Number of columns per shelf unit
             levels_per_shelf: Number of levels (height) per shelf unit
             num_agvs: Number of AGVs (Automated Guided Vehicles)
+            generate: Generate grid and adjacency (False when loading them with load())
         """
         self.num_shelves = num_shelves
         self.columns_per_shelf = columns_per_shelf
         self.levels_per_shelf = levels_per_shelf
         self.num_agvs = num_agvs
         
-        # Calculate warehouse dimensions
-        # Layout: [AGV Start Area] [Shelves with aisles] [Shipping Area] [Pallet Spawn]
-        self.aisle_width = 2  # Width of aisles between shelves
-        self.agv_start_width = 1  # Width of AGV starting area (one column for AGV nodes)
-        self.shipping_width = 1  # Width of shipping area (single node)
-        self.pallet_spawn_width = 1  # Width of pallet spawning area (single node)
-        
-        # Calculate total warehouse dimensions
-        # Shelves are now vertical lines (1 column wide, columns_per_shelf rows high)
-        # Total shelves = num_shelves, split between left and right sides
-        self.total_shelves = num_shelves
-        self.shelves_left = (num_shelves + 1) // 2  # Left side gets extra shelf if odd
-        self.shelves_right = num_shelves // 2  # Right side
-        self.shelf_height = columns_per_shelf  # Vertical length of each shelf
-        self.shelf_spacing = 2  # Spacing between vertical shelves (1 for shelf + 1 for gap)
-        
-        # Warehouse layout dimensions
-        # New layout: AGV start on top, Pallet spawn on left, vertical shelves, Shipping on right
-        left_shelves_width = self.shelves_left * self.shelf_spacing - 1  # Remove last gap
-        right_shelves_width = self.shelves_right * self.shelf_spacing - 1 if self.shelves_right > 0 else 0
-        self.width = (self.pallet_spawn_width + 
-                     self.aisle_width +  # Left aisle
-                     left_shelves_width +  # Left shelves
-                     self.aisle_width +  # Middle aisle
-                     right_shelves_width +  # Right shelves
-                     self.aisle_width +  # Right aisle
-                     self.shipping_width)
-        
-        self.height = self.agv_start_width + self.aisle_width + self.shelf_height + self.aisle_width + 1
+        # Layout: [Pallet spawn] [Shelves with aisles] [Shipping area], AGV start on top.
+        # Dimensions and cell placement come from warehouse_layout, the library the
+        # services use to rebuild the warehouse, so the two can never differ.
+        self.layout = WarehouseLayout(num_shelves, columns_per_shelf, levels_per_shelf, num_agvs)
+        self.height, self.width = self.layout.get_dimensions()
         
         # Initialize matrices
         self.grid = None
-        self.adjacency_matrix = None
+        # Adjacency matrix in CSR form: the neighbours of node i are adjacency_indices[adjacency_indptr[i]:adjacency_indptr[i + 1]]
+        self.adjacency_indptr = None
+        self.adjacency_indices = None
+        self.adjacency_csr_lists = None  # CSR arrays as lists, converted on the first get_adjacency_csr()
         self.node_positions = {}  # Maps node IDs to (row, col) positions
         self.position_to_node = {}  # Maps (row, col) to node ID
         self.node_types = {}  # Maps node ID to type (aisle, shelf, agv_start, etc.)
+        self.node_type_codes = None  # Type code of each node ID (index in NODE_TYPE_NAMES)
+        self.nodes_by_type = {}  # Maps type name to the sorted array of its node IDs
+        self.node_lists_by_type = {}  # Same as nodes_by_type as lists, returned by the getters
         
-        self._generate_grid()
-        self._generate_adjacency_matrix()
+        if generate:
+            self._generate_grid()
+            self._generate_adjacency()
     
     def _generate_grid(self):
-        """Generate the warehouse grid layout."""
-        self.grid = np.zeros((self.height, self.width), dtype=int)
-        
-        # Define cell types
-        # 0: Free space/Aisle
-        # 1: Shelf
-        # 2: AGV starting area
-        # 3: Shipping area
-        # 4: Pallet spawning area
-        
-        row_offset = 0
-        
-        # AGV starting area (top side) - place AGV nodes horizontally
-        self.grid[row_offset:row_offset + self.agv_start_width, :] = 0  # Make it aisle by default
-        
-        # Place exactly num_agvs AGV start nodes horizontally spaced
-        if self.num_agvs > 0 and self.width > 0:
-            spacing = max(1, self.width // (self.num_agvs + 1))
-            for agv_idx in range(self.num_agvs):
-                agv_col = spacing * (agv_idx + 1)
-                if agv_col < self.width:
-                    self.grid[row_offset, agv_col] = 2  # Place single AGV start node
-        
-        row_offset += self.agv_start_width
-        
-        # Horizontal aisle after AGV start
-        self.grid[row_offset:row_offset + self.aisle_width, :] = 0
-        row_offset += self.aisle_width
-        
-        # Now build the main warehouse area horizontally
-        col_offset = 0
-        
-        # Pallet spawning area (left side) - single node
-        self.grid[row_offset:, col_offset:col_offset + self.pallet_spawn_width] = 0  # Make it aisle by default
-        
-        # Place single pallet spawn node in the middle vertically
-        available_rows = self.height - row_offset
-        if available_rows > 0:
-            pallet_row = row_offset + available_rows // 2
-            self.grid[pallet_row, col_offset] = 4  # Place single pallet spawn node
-        
-        col_offset += self.pallet_spawn_width
-        
-        # Main aisle
-        self.grid[row_offset:, col_offset:col_offset + self.aisle_width] = 0
-        col_offset += self.aisle_width
-        
-        # Left shelves (vertical lines)
-        left_shelves_start = col_offset
-        for i in range(self.shelves_left):
-            shelf_col = left_shelves_start + i * self.shelf_spacing
-            if shelf_col < self.width and row_offset + self.shelf_height <= self.height:
-                self.grid[row_offset:row_offset + self.shelf_height, shelf_col] = 1
-        col_offset += self.shelves_left * self.shelf_spacing - 1  # -1 to remove last gap
-        
-        # Middle aisle (main corridor)
-        self.grid[row_offset:, col_offset:col_offset + self.aisle_width] = 0
-        col_offset += self.aisle_width
-        
-        # Right shelves (vertical lines)
-        right_shelves_start = col_offset
-        for i in range(self.shelves_right):
-            shelf_col = right_shelves_start + i * self.shelf_spacing
-            if shelf_col < self.width and row_offset + self.shelf_height <= self.height:
-                self.grid[row_offset:row_offset + self.shelf_height, shelf_col] = 1
-        if self.shelves_right > 0:
-            col_offset += self.shelves_right * self.shelf_spacing - 1  # -1 to remove last gap
-        
-        # Aisle before shipping area (right side)
-        self.grid[row_offset:, col_offset:col_offset + self.aisle_width] = 0
-        col_offset += self.aisle_width
-        
-        # Shipping area (right side) - single node
-        if col_offset + self.shipping_width <= self.width:
-            self.grid[row_offset:, col_offset:col_offset + self.shipping_width] = 0  # Make it aisle by default
-            
-            # Place single shipping node in the middle vertically
-            available_rows = self.height - row_offset
-            if available_rows > 0:
-                shipping_row = row_offset + available_rows // 2
-                self.grid[shipping_row, col_offset] = 3  # Place single shipping node
-    
-    def _generate_adjacency_matrix(self):
-        """Generate adjacency matrix from the warehouse grid, including shelf nodes."""
+        """Generate the warehouse grid layout (cell types, see CELL_TYPES in warehouse_layout)."""
+        self.grid = np.frombuffer(bytes(self.layout.cells), dtype=np.uint8).reshape(self.height, self.width).astype(int)
+
+    def _generate_adjacency(self):
+        """
+        Generate the sparse adjacency from the warehouse grid, including shelf nodes.
+        AGVs cannot drive through the racking, so shelf nodes are leaves
+        attached to their accessible node.
+        """
         node_id = 0
         # Create nodes for all cell types (including shelves)
         for row in range(self.height):
@@ -156,27 +74,99 @@ class WarehouseMatrix:
                 self.node_positions[node_id] = (row, col)
                 self.position_to_node[(row, col)] = node_id
                 # Store node type
-                type_map = {0: 'aisle', 1: 'shelf', 2: 'agv_start', 3: 'shipping', 4: 'pallet_spawn'}
-                self.node_types[node_id] = type_map.get(cell_type, 'aisle')
+                self.node_types[node_id] = NODE_TYPE_NAMES[cell_type] if 0 <= cell_type < len(NODE_TYPE_NAMES) else 'aisle'
                 node_id += 1
-        # Create adjacency matrix
-        num_nodes = len(self.node_positions)
-        self.adjacency_matrix = np.zeros((num_nodes, num_nodes), dtype=int)
-        # Connect adjacent nodes (4-connectivity: up, down, left, right)
-        for node_id, (row, col) in self.node_positions.items():
-            directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-            for dr, dc in directions:
-                new_row, new_col = row + dr, col + dc
-                if (0 <= new_row < self.height and 
-                    0 <= new_col < self.width and
-                    (new_row, new_col) in self.position_to_node):
-                    neighbor_id = self.position_to_node[(new_row, new_col)]
-                    self.adjacency_matrix[node_id, neighbor_id] = 1
-    
-    def get_adjacency_matrix(self) -> np.ndarray:
-        """Return the adjacency matrix."""
-        return self.adjacency_matrix
+        self._build_type_index()
+        # Connect adjacent nodes with the traversability rule of warehouse_layout (both directions)
+        edges = np.array(list(self.layout.edges()), dtype=np.int64).reshape(-1, 2)
+        rows = np.concatenate((edges[:, 0], edges[:, 1]))
+        cols = np.concatenate((edges[:, 1], edges[:, 0]))
+        order = np.lexsort((cols, rows))
+        self.adjacency_indices = cols[order]
+        self.adjacency_indptr = np.zeros(len(self.node_positions) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(self.node_positions)), out=self.adjacency_indptr[1:])
     
+    def save(self, path: str):
+        """
+        Save the generated layout to a .npz file: parameters, grid and the
+        adjacency matrix as CSR arrays. The file is written atomically.
+        """
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            params=np.array([self.num_shelves, self.columns_per_shelf, self.levels_per_shelf, self.num_agvs]),
+            grid=self.grid,
+            indptr=self.adjacency_indptr,
+            indices=self.adjacency_indices
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "WarehouseMatrix":
+        """Load a layout saved with save(), without generating it again (the adjacency stays in CSR form)."""
+        with np.load(path) as data:
+            num_shelves, columns_per_shelf, levels_per_shelf, num_agvs = (int(v) for v in data["params"])
+            warehouse = cls(num_shelves, columns_per_shelf, levels_per_shelf, num_agvs, generate=False)
+            warehouse.grid = data["grid"]
+            warehouse.adjacency_indptr = data["indptr"]
+            warehouse.adjacency_indices = data["indices"]
+        if warehouse.grid.shape != (warehouse.height, warehouse.width) or \
+                len(warehouse.adjacency_indptr) != warehouse.grid.size + 1 or \
+                bytes(warehouse.grid.astype(np.uint8).ravel()) != bytes(warehouse.layout.cells):
+            raise ValueError(f"Layout file {path} does not match its parameters")
+        warehouse._build_type_index()
+        for node_id, type_code in enumerate(warehouse.node_type_codes.tolist()):
+            position = divmod(node_id, warehouse.width)
+            warehouse.node_positions[node_id] = position
+            warehouse.position_to_node[position] = node_id
+            warehouse.node_types[node_id] = NODE_TYPE_NAMES[type_code]
+        return warehouse
+
+    def _build_type_index(self):
+        """Store the node types as a code array (node ID = row * width + col) and index the nodes by type."""
+        codes = self.grid.ravel()
+        # Unknown cell types are aisles, as in node_types
+        self.node_type_codes = np.where((codes >= 0) & (codes < len(NODE_TYPE_NAMES)), codes, 0).astype(np.uint8)
+        order = np.argsort(self.node_type_codes, kind='stable')
+        bounds = np.searchsorted(self.node_type_codes[order], np.arange(len(NODE_TYPE_NAMES) + 1))
+        self.nodes_by_type = {name: order[bounds[code]:bounds[code + 1]]
+                              for code, name in enumerate(NODE_TYPE_NAMES)}
+        # Converted once here (after build or load), not on every getter call
+        self.node_lists_by_type = {name: nodes.tolist() for name, nodes in self.nodes_by_type.items()}
+
+    def get_accessible_node(self, shelf_node: int) -> Optional[int]:
+        """Return the aisle node from which a shelf node is reached (same row, col - 1), if any."""
+        row, col = self.node_positions[shelf_node]
+        if col == 0 or self.grid[row, col - 1] != 0:
+            return None
+        return self.position_to_node[(row, col - 1)]
+
+    def get_node_type_codes(self) -> np.ndarray:
+        """Return the type code of each node ID (index in NODE_TYPE_NAMES)."""
+        return self.node_type_codes
+
+    def get_nodes_of_type(self, node_type: str) -> np.ndarray:
+        """Return the sorted array of the node IDs of a type."""
+        return self.nodes_by_type[node_type]
+
+    def get_adjacency_shape(self) -> Tuple[int, int]:
+        """Return the shape of the (sparse) adjacency matrix."""
+        num_nodes = len(self.adjacency_indptr) - 1
+        return num_nodes, num_nodes
+
+    def get_adjacency_csr(self) -> Dict[str, List[int]]:
+        """Return the adjacency matrix in CSR form (row pointers and column indices)."""
+        if self.adjacency_csr_lists is None:
+            self.adjacency_csr_lists = {"indptr": self.adjacency_indptr.tolist(),
+                                        "indices": self.adjacency_indices.tolist()}
+        return self.adjacency_csr_lists
+
+    def get_edges(self) -> np.ndarray:
+        """Return the undirected edges as an (E, 2) array of node IDs, u < v."""
+        rows = np.repeat(np.arange(len(self.adjacency_indptr) - 1), np.diff(self.adjacency_indptr))
+        upper = rows < self.adjacency_indices
+        return np.column_stack((rows[upper], self.adjacency_indices[upper]))
+
     def get_node_positions(self) -> Dict[int, Tuple[int, int]]:
         """Return the mapping of node IDs to grid positions."""
         return self.node_positions
@@ -195,23 +185,19 @@ class WarehouseMatrix:
     
     def get_agv_start_nodes(self) -> List[int]:
         """Return list of node IDs in the AGV starting area."""
-        return [node_id for node_id, node_type in self.node_types.items() 
-                if node_type == 'agv_start']
+        return self.node_lists_by_type['agv_start']
 
     def get_shipping_nodes(self) -> List[int]:
         """Return list of node IDs in the shipping area."""
-        return [node_id for node_id, node_type in self.node_types.items() 
-                if node_type == 'shipping']
+        return self.node_lists_by_type['shipping']
 
     def get_pallet_spawn_nodes(self) -> List[int]:
         """Return list of node IDs in the pallet spawning area."""
-        return [node_id for node_id, node_type in self.node_types.items() 
-                if node_type == 'pallet_spawn']
+        return self.node_lists_by_type['pallet_spawn']
 
     def get_shelf_nodes(self) -> List[int]:
         """Return list of node IDs in the shelf area."""
-        return [node_id for node_id, node_type in self.node_types.items() 
-                if node_type == 'shelf']
+        return self.node_lists_by_type['shelf']
     
     def print_grid(self):
         """Print a visual representation of the warehouse grid."""
@@ -247,4 +233,4 @@ if __name__ == "__main__":
     )
     
     warehouse.print_grid()
-    print(f"\nAdjacency matrix shape: {warehouse.get_adjacency_matrix().shape}")
+    print(f"\nAdjacency matrix shape: {warehouse.get_adjacency_shape()}")
@@ -0,0 +1,4 @@
+from .layout import WarehouseLayout, LAYOUT_VERSION, CELL_TYPES, grid_edges
+from .path_codec import encode_path, decode_path
+
+__all__ = ["WarehouseLayout", "LAYOUT_VERSION", "CELL_TYPES", "grid_edges", "encode_path", "decode_path"]
@@ -0,0 +1,213 @@
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Version of the layout rules below. It must be increased whenever the rules
+# change, so that services built with different rules refuse each other's layout.
+LAYOUT_VERSION = 2
+
+# Cell types of the grid (the codes of the WarehouseMatrix grid)
+AISLE, SHELF, AGV_START, SHIPPING, PALLET_SPAWN = 0, 1, 2, 3, 4
+CELL_TYPES = {AISLE: 'aisle', SHELF: 'shelf', AGV_START: 'agv_start', SHIPPING: 'shipping', PALLET_SPAWN: 'pallet_spawn'}
+
+
+def grid_edges(cells: Sequence[int], width: int) -> Iterator[Tuple[int, int]]:
+    """
+    Generate the (u, v) edges, u < v, of a grid of cell types in row-major
+    order (node id = row * width + col): 4-connectivity between drivable
+    cells, while a shelf cell is only connected to its accessible node (the
+    aisle cell on its left). Single definition of the traversability rule,
+    behind WarehouseLayout.edges (and so WarehouseMatrix).
+    """
+    num_cells = len(cells)
+    for node_id, cell in enumerate(cells):
+        col = node_id % width
+        right = node_id + 1
+        if col < width - 1:
+            right_cell = cells[right]
+            if cell != SHELF and right_cell != SHELF:
+                yield node_id, right
+            elif right_cell == SHELF and cell == AISLE:
+                # Accessible node on the left of a shelf
+                yield node_id, right
+        below = node_id + width
+        if below < num_cells and cell != SHELF and cells[below] != SHELF:
+            yield node_id, below
+
+
+class WarehouseLayout:
+    """
+    Deterministic layout of the warehouse from its four configuration
+    parameters. WarehouseMatrix takes its grid from here in the generator.
+
+    The grid, the node ids (row * width + col), the node positions and types
+    and the graph are computed locally, so the services only need the small
+    warehouse/config/layout message instead of the full graph payloads.
+    Pure Python (no numpy) so that every service can import it.
+    """
+
+    # Layout constants
+    AISLE_WIDTH = 2
+    AGV_START_WIDTH = 1
+    SHIPPING_WIDTH = 1
+    PALLET_SPAWN_WIDTH = 1
+    SHELF_SPACING = 2
+
+    def __init__(self, num_shelves: int, columns_per_shelf: int, levels_per_shelf: int, num_agvs: int):
+        self.num_shelves = num_shelves
+        self.columns_per_shelf = columns_per_shelf
+        self.levels_per_shelf = levels_per_shelf
+        self.num_agvs = num_agvs
+
+        self.shelves_left = (num_shelves + 1) // 2
+        self.shelves_right = num_shelves // 2
+        left_shelves_width = self.shelves_left * self.SHELF_SPACING - 1
+        right_shelves_width = self.shelves_right * self.SHELF_SPACING - 1 if self.shelves_right > 0 else 0
+        self.width = (self.PALLET_SPAWN_WIDTH + self.AISLE_WIDTH + left_shelves_width + self.AISLE_WIDTH +
+                      right_shelves_width + self.AISLE_WIDTH + self.SHIPPING_WIDTH)
+        self.height = self.AGV_START_WIDTH + self.AISLE_WIDTH + columns_per_shelf + self.AISLE_WIDTH + 1
+
+        # Cell types in row-major order, the index of a cell is its node id
+        self.cells = bytearray(self.height * self.width)
+        self._generate_grid()
+
+    def _set(self, row: int, col: int, cell_type: int):
+        self.cells[row * self.width + col] = cell_type
+
+    def _generate_grid(self):
+        """ Placement rules of the cells, also used by WarehouseMatrix"""
+        # AGV start nodes on the top row, horizontally spaced
+        if self.num_agvs > 0 and self.width > 0:
+            spacing = max(1, self.width // (self.num_agvs + 1))
+            for agv_idx in range(self.num_agvs):
+                agv_col = spacing * (agv_idx + 1)
+                if agv_col < self.width:
+                    self._set(0, agv_col, AGV_START)
+        row_offset = self.AGV_START_WIDTH + self.AISLE_WIDTH
+        available_rows = self.height - row_offset
+
+        # Pallet spawn node on the left side, in the middle vertically
+        if available_rows > 0:
+            self._set(row_offset + available_rows // 2, 0, PALLET_SPAWN)
+        col_offset = self.PALLET_SPAWN_WIDTH + self.AISLE_WIDTH
+
+        # Left and right blocks of vertical shelves, separated by the middle aisle
+        for shelves, last_gap in ((self.shelves_left, True), (self.shelves_right, self.shelves_right > 0)):
+            for i in range(shelves):
+                shelf_col = col_offset + i * self.SHELF_SPACING
+                if shelf_col < self.width and row_offset + self.columns_per_shelf <= self.height:
+                    for row in range(row_offset, row_offset + self.columns_per_shelf):
+                        self._set(row, shelf_col, SHELF)
+            if last_gap:
+                col_offset += shelves * self.SHELF_SPACING - 1
+            col_offset += self.AISLE_WIDTH
+
+        # Shipping node on the right side, in the middle vertically
+        if col_offset + self.SHIPPING_WIDTH <= self.width and available_rows > 0:
+            self._set(row_offset + available_rows // 2, col_offset, SHIPPING)
+
+    # Node ids and positions
+
+    def node_id(self, row: int, col: int) -> int:
+        return row * self.width + col
+
+    def node_position(self, node_id: int) -> Tuple[int, int]:
+        return divmod(node_id, self.width)
+
+    def node_type(self, node_id: int) -> str:
+        return CELL_TYPES.get(self.cells[node_id], 'aisle')
+
+    def get_node_positions(self) -> Dict[int, Tuple[int, int]]:
+        """Return the mapping of node IDs to grid positions."""
+        return {node_id: divmod(node_id, self.width) for node_id in range(len(self.cells))}
+
+    def get_node_types(self) -> Dict[int, str]:
+        """Return the mapping of node IDs to their types."""
+        return {node_id: CELL_TYPES.get(cell, 'aisle') for node_id, cell in enumerate(self.cells)}
+
+    def get_grid(self) -> List[List[int]]:
+        """Return the warehouse grid as a list of rows."""
+        return [list(self.cells[row * self.width:(row + 1) * self.width]) for row in range(self.height)]
+
+    def get_dimensions(self) -> Tuple[int, int]:
+        """Return warehouse dimensions (height, width)."""
+        return self.height, self.width
+
+    def _nodes_of_type(self, cell_type: int) -> List[int]:
+        return [node_id for node_id, cell in enumerate(self.cells) if cell == cell_type]
+
+    def get_agv_start_nodes(self) -> List[int]:
+        return self._nodes_of_type(AGV_START)
+
+    def get_shipping_nodes(self) -> List[int]:
+        return self._nodes_of_type(SHIPPING)
+
+    def get_pallet_spawn_nodes(self) -> List[int]:
+        return self._nodes_of_type(PALLET_SPAWN)
+
+    def get_shelf_nodes(self) -> List[int]:
+        return self._nodes_of_type(SHELF)
+
+    def get_accessible_node(self, shelf_node: int) -> Optional[int]:
+        """Return the aisle node from which a shelf cell is reached (same row, col - 1), if any."""
+        row, col = self.node_position(shelf_node)
+        if col == 0 or self.cells[shelf_node - 1] != AISLE:
+            return None
+        return shelf_node - 1
+
+    # Graph
+
+    def build_graph(self):
+        """
+        Build the NetworkX warehouse graph, with the same node attributes
+        (pos, grid_pos, type) and edges of WarehouseGraph.
+        """
+        import networkx as nx
+        width = self.width
+        graph = nx.Graph()
+        graph.add_nodes_from(
+            (node_id, {'pos': (node_id % width, -(node_id // width)),
+                       'grid_pos': divmod(node_id, width),
+                       'type': CELL_TYPES.get(cell, 'aisle')})
+            for node_id, cell in enumerate(self.cells)
+        )
+        graph.add_edges_from(self.edges())
+        return graph
+
+    def edges(self) -> Iterator[Tuple[int, int]]:
+        """ Generate the (u, v) edges of the graph, u < v (see grid_edges)"""
+        return grid_edges(self.cells, self.width)
+
+    # Wire format
+
+    def grid_checksum(self) -> int:
+        return zlib.crc32(bytes(self.cells))
+
+    def to_payload(self) -> Dict:
+        """ Return the warehouse/config/layout message describing this layout"""
+        return {
+            "layout_version": LAYOUT_VERSION,
+            "shelves": self.num_shelves,
+            "columns": self.columns_per_shelf,
+            "levels": self.levels_per_shelf,
+            "agvs": self.num_agvs,
+            "height": self.height,
+            "width": self.width,
+            "grid_crc32": self.grid_checksum(),
+            "timestamp": time.time()
+        }
+
+    @classmethod
+    def from_payload(cls, payload: Dict) -> "WarehouseLayout":
+        """
+        Rebuild the layout described by a warehouse/config/layout message.
+        Raises ValueError if the message was produced with other layout rules.
+        """
+        if payload.get("layout_version") != LAYOUT_VERSION:
+            raise ValueError(f"Unsupported layout version {payload.get('layout_version')} "
+                             f"(this service uses version {LAYOUT_VERSION})")
+        layout = cls(int(payload["shelves"]), int(payload["columns"]), int(payload["levels"]), int(payload["agvs"]))
+        if (layout.height, layout.width) != (payload.get("height"), payload.get("width")) or \
+                layout.grid_checksum() != payload.get("grid_crc32"):
+            raise ValueError("Rebuilt layout does not match the published one")
+        return layout
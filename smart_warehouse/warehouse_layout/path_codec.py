@@ -0,0 +1,47 @@
+import re
+from typing import List
+
+# Direction codes of a step on the grid: (row offset, col offset)
+DIRECTIONS = {'N': (-1, 0), 'S': (1, 0), 'E': (0, 1), 'W': (0, -1)}
+_CODES = {offset: code for code, offset in DIRECTIONS.items()}
+_RUN = re.compile(r'([NSEW])(\d*)')
+
+
+def encode_path(path: List[int], width: int) -> str:
+    """
+    Encode a path of adjacent grid nodes as its start node followed by the
+    run-length direction codes, e.g. [0, 1, 2, 12, 22] -> "0:E2S2" on a grid
+    10 cells wide (node id = row * width + col, a run of 1 has no count).
+
+    Raises:
+        ValueError: if two consecutive nodes are not adjacent on the grid
+    """
+    if not path:
+        return ""
+    runs = []
+    for u, v in zip(path, path[1:]):
+        offset = (v // width - u // width, v % width - u % width)
+        code = _CODES.get(offset)
+        if code is None:
+            raise ValueError(f"Nodes {u} and {v} are not adjacent on the grid")
+        if runs and runs[-1][0] == code:
+            runs[-1][1] += 1
+        else:
+            runs.append([code, 1])
+    return f"{path[0]}:" + "".join(code + (str(count) if count > 1 else "") for code, count in runs)
+
+
+def decode_path(encoded: str, width: int) -> List[int]:
+    """ Return the node list of a path encoded by encode_path"""
+    if not encoded:
+        return []
+    start, _, runs = encoded.partition(':')
+    node = int(start)
+    path = [node]
+    for code, count in _RUN.findall(runs):
+        row_offset, col_offset = DIRECTIONS[code]
+        step = row_offset * width + col_offset
+        for _ in range(int(count) if count else 1):
+            node += step
+            path.append(node)
+    return path
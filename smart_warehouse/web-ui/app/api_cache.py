@@ -0,0 +1,164 @@
+import threading
+import time
+
+
+class ApiError(Exception):
+    """ Error answer of the API (not cached), with its status code and JSON body"""
+
+    def __init__(self, status_code, value):
+        super().__init__(f"API answered {status_code}: {value}")
+        self.status_code = status_code
+        self.value = value
+
+
+class CacheEntry:
+    """ Cached API response with its ETag and validity information"""
+
+    def __init__(self, value, etag, ttl):
+        self.value = value
+        self.etag = etag
+        self.ttl = ttl
+        self.expires_at = time.time() + ttl
+        self.last_access = time.time()
+        self.refreshing = False
+
+
+class ApiCache:
+    """
+    Local cache of the API responses used by the Web Server.
+
+    - Each path has a TTL, chosen by the longest matching prefix in ttl_by_prefix.
+    - A fresh entry is served from memory.
+    - An expired entry younger than stale_ttl is served as is while a
+      refresh is queued (stale-while-revalidate).
+    - Older or missing entries are fetched synchronously, with a single
+      request in flight per path even with many concurrent viewers.
+    - A background thread refreshes the entries read in the last
+      keep_alive seconds before they expire, and evicts the others.
+    - Refreshes send the cached ETag, so unchanged data costs a 304.
+    - Only successful (200) answers are stored: on an error the stale entry,
+      if any, is served again, otherwise ApiError is raised.
+    The load on the API is then bounded to about one request per path per
+    TTL, whatever the number of viewers.
+    """
+
+    def __init__(self, fetch, default_ttl: float = 2.0, ttl_by_prefix: dict = None,
+                 stale_ttl: float = 10.0, refresh_interval: float = 0.5, keep_alive: float = 30.0):
+        """
+        Args:
+            fetch: function(path, etag) returning (status_code, json_value, etag),
+                   status 304 meaning that the cached value is still valid
+            default_ttl: TTL in seconds of the paths without a specific TTL
+            ttl_by_prefix: dictionary path prefix -> TTL in seconds
+            stale_ttl: seconds after expiration during which a stale value can be served
+            refresh_interval: period in seconds of the background refresher
+            keep_alive: entries not read for this many seconds are no longer refreshed
+        """
+        self.fetch = fetch
+        self.default_ttl = default_ttl
+        self.ttl_by_prefix = ttl_by_prefix or {}
+        self.stale_ttl = stale_ttl
+        self.refresh_interval = refresh_interval
+        self.keep_alive = keep_alive
+
+        self.entries = {}
+        self.lock = threading.Lock()
+        # Paths being fetched synchronously: path -> Event set when the fetch is over
+        self.in_flight = {}
+        # Wakes up the refresher when a stale entry needs a refresh
+        self.wakeup = threading.Event()
+
+        self.refresher_thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        self.refresher_thread.start()
+
+    def get_ttl(self, path):
+        """ Return the TTL of a path, from its longest matching prefix"""
+        matches = [prefix for prefix in self.ttl_by_prefix if path.startswith(prefix)]
+        if not matches:
+            return self.default_ttl
+        return self.ttl_by_prefix[max(matches, key=len)]
+
+    def get(self, path):
+        """ Return the JSON value of a path, from the cache whenever possible"""
+        while True:
+            with self.lock:
+                entry = self.entries.get(path)
+                now = time.time()
+                if entry is not None:
+                    entry.last_access = now
+                    if now < entry.expires_at:
+                        return entry.value
+                    if now < entry.expires_at + self.stale_ttl:
+                        if not entry.refreshing:
+                            entry.refreshing = True
+                            self.wakeup.set()
+                        return entry.value
+                event = self.in_flight.get(path)
+                if event is None:
+                    # This thread fetches the path, the others wait for it
+                    event = threading.Event()
+                    self.in_flight[path] = event
+                    break
+            event.wait()
+            # Read the entry stored by the fetching thread (or fetch again if it failed)
+            with self.lock:
+                entry = self.entries.get(path)
+                if entry is not None and time.time() < entry.expires_at:
+                    entry.last_access = time.time()
+                    return entry.value
+        try:
+            return self._refresh(path).value
+        finally:
+            with self.lock:
+                del self.in_flight[path]
+            event.set()
+
+    def _refresh(self, path):
+        """ Fetch a path from the API, revalidating the cached ETag, and store it"""
+        with self.lock:
+            entry = self.entries.get(path)
+            etag = entry.etag if entry is not None else None
+        try:
+            status_code, value, new_etag = self.fetch(path, etag)
+        except Exception:
+            if entry is not None:
+                entry.refreshing = False
+            raise
+        ttl = self.get_ttl(path)
+        with self.lock:
+            if status_code == 304 and entry is not None:
+                # Unchanged data: keep the cached value and extend its validity
+                entry.expires_at = time.time() + ttl
+                entry.refreshing = False
+            elif status_code == 200:
+                last_access = entry.last_access if entry is not None else time.time()
+                entry = CacheEntry(value, new_etag, ttl)
+                entry.last_access = last_access
+                self.entries[path] = entry
+            elif entry is not None:
+                # Error (or 304 for an evicted entry): keep serving the stale value
+                entry.refreshing = False
+            else:
+                raise ApiError(status_code, value)
+            return entry
+
+    def _refresh_loop(self):
+        """ Background refresher keeping the entries being read fresh"""
+        while True:
+            self.wakeup.wait(self.refresh_interval)
+            self.wakeup.clear()
+            now = time.time()
+            to_refresh = []
+            with self.lock:
+                for path, entry in list(self.entries.items()):
+                    if now - entry.last_access > self.keep_alive:
+                        # Nobody is reading this path anymore
+                        del self.entries[path]
+                    elif entry.refreshing or entry.expires_at - now <= self.refresh_interval:
+                        entry.refreshing = True
+                        to_refresh.append(path)
+            for path in to_refresh:
+                try:
+                    self._refresh(path)
+                except Exception as e:
+                    print(f"[WARNING] Cache refresh of {path} failed: {e}")
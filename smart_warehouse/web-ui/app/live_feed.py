@@ -0,0 +1,167 @@
+import json
+import threading
+import time
+import paho.mqtt.client as mqtt
+
+
+class LiveFeedSubscriber:
+    """
+    Pending updates of a single browser connection.
+    Updates are coalesced by key (e.g. one entry per AGV), so a slow client
+    only receives the latest state instead of an ever growing backlog.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.condition = threading.Condition()
+
+    def push(self, key, event):
+        with self.condition:
+            # Re-inserting moves the key at the end, keeping the arrival order
+            self.pending.pop(key, None)
+            self.pending[key] = event
+            self.condition.notify()
+
+    def wait_events(self, timeout):
+        """ Wait up to timeout seconds and return the pending (event, data) list"""
+        with self.condition:
+            if not self.pending:
+                self.condition.wait(timeout)
+            events = list(self.pending.values())
+            self.pending.clear()
+            return events
+
+
+class LiveFeed:
+    """
+    Subscribes to the AGV position and slot topics on the MQTT broker and
+    pushes the changes to the connected browsers (Server-Sent Events).
+    The last known state is kept to send a snapshot to new subscribers.
+    AGV segments (start, end, speed, ETA) are forwarded as they are: the
+    browsers interpolate the position of the AGVs between the heartbeats.
+    """
+
+    AGV_POSITION_TOPIC = "warehouse/agv/+/position"
+    AGV_SEGMENT_TOPIC = "warehouse/agv/+/segment"
+    # One message per tick with the state of all the AGVs: {"fields": [...], "agvs": [[...], ...]}
+    FLEET_STATE_TOPIC = "warehouse/fleet/state"
+    SEGMENT_FIELDS = ("agv_id", "start", "end", "speed", "start_time", "eta", "timestamp")
+    SLOTS_TOPIC = "warehouse/slots/+"
+    # Slot fields forwarded to the browsers
+    SLOT_FIELDS = ("slot_id", "row", "col", "level", "in_use")
+
+    def __init__(self, broker_ip: str, broker_port: int):
+        self.broker_ip = broker_ip
+        self.broker_port = broker_port
+
+        # Last known state
+        self.agv_positions = {}
+        self.agv_segments = {}
+        self.slots = {}
+
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+        self.mqtt_client = mqtt.Client()
+        self.mqtt_client.on_connect = self.on_connect
+        self.mqtt_client.on_message = self.on_message
+
+    def start(self):
+        """ Connect to the broker in background (retrying until it is reachable)"""
+        self.mqtt_client.connect_async(self.broker_ip, self.broker_port, 60)
+        self.mqtt_client.loop_start()
+
+    def stop(self):
+        self.mqtt_client.loop_stop()
+        self.mqtt_client.disconnect()
+
+    def on_connect(self, client, userdata, flags, rc):
+        print(f"Live feed connected to MQTT Broker with result code {rc}")
+        client.subscribe([(self.AGV_POSITION_TOPIC, 0), (self.AGV_SEGMENT_TOPIC, 1),
+                          (self.FLEET_STATE_TOPIC, 0), (self.SLOTS_TOPIC, 1)])
+
+    def on_message(self, client, userdata, msg):
+        try:
+            payload = json.loads(msg.payload.decode())
+        except Exception as e:
+            print(f"[ERROR] Live feed cannot decode message on {msg.topic}: {e}")
+            return
+        if mqtt.topic_matches_sub(self.AGV_POSITION_TOPIC, msg.topic):
+            agv_id = payload.get("agv_id")
+            if agv_id is None or payload.get("position") is None:
+                return
+            data = {"agv_id": agv_id, "position": payload["position"], "timestamp": payload.get("timestamp")}
+            with self.lock:
+                self.agv_positions[agv_id] = data
+            self.publish(("agv", agv_id), "agv", data)
+        elif msg.topic == self.FLEET_STATE_TOPIC:
+            fields = payload.get("fields", [])
+            for row in payload.get("agvs", []):
+                agv = dict(zip(fields, row))
+                data = {"agv_id": agv["agv_id"], "position": [agv["x"], agv["y"]], "timestamp": payload.get("timestamp")}
+                with self.lock:
+                    if self.agv_positions.get(data["agv_id"], {}).get("position") == data["position"]:
+                        continue
+                    self.agv_positions[data["agv_id"]] = data
+                self.publish(("agv", data["agv_id"]), "agv", data)
+        elif mqtt.topic_matches_sub(self.AGV_SEGMENT_TOPIC, msg.topic):
+            if payload.get("agv_id") is None or payload.get("start") is None:
+                return
+            data = {field: payload.get(field) for field in self.SEGMENT_FIELDS}
+            with self.lock:
+                self.agv_segments[data["agv_id"]] = data
+            self.publish(("segment", data["agv_id"]), "segment", data)
+        elif mqtt.topic_matches_sub(self.SLOTS_TOPIC, msg.topic):
+            # Skip the other messages on the slot topics (e.g. warehouse/slots/total)
+            if payload.get("slot_id") is None:
+                return
+            data = {field: payload.get(field) for field in self.SLOT_FIELDS}
+            with self.lock:
+                if self.slots.get(data["slot_id"]) == data:
+                    return
+                self.slots[data["slot_id"]] = data
+            self.publish(("slot", data["slot_id"]), "slot", data)
+
+    def publish(self, key, event, data):
+        """ Send an update to all the subscribers"""
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.push(key, (event, data))
+
+    def subscribe(self):
+        """ Register a new subscriber and return it with the current state snapshot"""
+        subscriber = LiveFeedSubscriber()
+        with self.lock:
+            self.subscribers.add(subscriber)
+            snapshot = {
+                "agvs": list(self.agv_positions.values()),
+                "segments": list(self.agv_segments.values()),
+                "slots": list(self.slots.values()),
+                # Lets the browser convert the segment times to its own clock
+                "server_time": time.time()
+            }
+        return subscriber, snapshot
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def stream(self, keep_alive: float = 15.0):
+        """ Generator of the Server-Sent Events of a new browser connection"""
+        subscriber, snapshot = self.subscribe()
+        try:
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            last_sent = time.time()
+            while True:
+                events = subscriber.wait_events(keep_alive)
+                for event, data in events:
+                    yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+                if events:
+                    last_sent = time.time()
+                elif time.time() - last_sent >= keep_alive:
+                    # Comment line, keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    last_sent = time.time()
+        finally:
+            self.unsubscribe(subscriber)
@@ -1,5 +1,9 @@
 import requests
-from flask import Flask, request, render_template
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from api_cache import ApiCache, ApiError
+from live_feed import LiveFeed
+from flask import Flask, Response, request, render_template, stream_with_context, jsonify
 import os
 import yaml
 import threading
@@ -33,6 +37,34 @@ class WebServer:
         # Read Configuration from target Configuration File Path
         self.read_configuration_file()
 
+        # Number of slots shown in a page of the storage view
+        self.storage_page_size = self.configuration_dict['web'].get('storage_page_size', 200)
+
+        # Timeout (seconds) of each request towards the API
+        self.request_timeout = self.configuration_dict['web'].get('request_timeout', 5)
+
+        # Pooled HTTP session: connections to the API are kept alive and reused
+        pool_size = self.configuration_dict['web'].get('http_pool_size', 10)
+        self.http_session = requests.Session()
+        self.http_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.http_session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+        # Executor used to send the API requests of a page in parallel
+        self.http_executor = ThreadPoolExecutor(max_workers=pool_size)
+
+        # Local cache of the API responses, shared by all the page requests
+        cache_conf = self.configuration_dict['web'].get('cache', {})
+        self.api_cache = ApiCache(self.http_fetch,
+                                  default_ttl=cache_conf.get('default_ttl', 2.0),
+                                  ttl_by_prefix=cache_conf.get('ttl', {}),
+                                  stale_ttl=cache_conf.get('stale_ttl', 10.0),
+                                  refresh_interval=cache_conf.get('refresh_interval', 0.5),
+                                  keep_alive=cache_conf.get('keep_alive', 30.0))
+
+        # Live feed of AGV positions and slot changes, pushed to the browsers
+        self.live_feed = LiveFeed(self.configuration_dict['web'].get('broker_ip', 'my-mosquitto-broker'),
+                                  self.configuration_dict['web'].get('broker_port', 1883))
+
         # Create the Flask app
         self.app = Flask(__name__, template_folder=template_dir)
 
@@ -41,6 +73,9 @@ class WebServer:
         self.app.add_url_rule('/agv/<agv_id>/position', 'agv_position', self.agv_position)
         self.app.add_url_rule('/slots/all', 'all_slots', self.all_slots)
         self.app.add_url_rule('/storage_view', 'storage_view', self.storage_view)
+        self.app.add_url_rule('/slots/occupancy', 'slots_occupancy', self.slots_occupancy)
+        self.app.add_url_rule('/live_map', 'live_map', self.live_map)
+        self.app.add_url_rule('/stream', 'stream', self.stream)
 
     def read_configuration_file(self):
         """ Read Configuration File for the Web Server
@@ -59,120 +94,151 @@ class WebServer:
         print("Read Configuration from file ({}): {}".format(self.config_file, self.configuration_dict))
 
     def warehouse_parameters(self):
-        # Recupera entrambi i parametri
-        shelves = self.http_get_number_of_shelves()
-        columns = self.http_get_columns_per_shelf()
-        levels = self.http_get_levels_per_shelf()
-        agvs = self.http_get_number_of_agvs()
+        # Recupera tutti i parametri con una sola richiesta
+        params = self.http_get_parameters()
         parameters = {
-            "number_of_shelves": shelves.get("value"),
-            "columns_per_shelf": columns.get("value"),
-            "levels_per_shelf": levels.get("value"),
-            "number_of_agvs": agvs.get("value")
+            "number_of_shelves": params.get("number_of_shelves"),
+            "columns_per_shelf": params.get("columns_per_shelf"),
+            "levels_per_shelf": params.get("levels_per_shelf"),
+            "number_of_agvs": params.get("number_of_agvs")
         }
         print("DEBUG parameters:", parameters)
         return render_template('warehouse_parameters.html', parameters=parameters)
 
-    def http_get_number_of_shelves(self):
-        """ Get all locations from the remote server over HTTP"""
-
-        # Get the base URL from the configuration
-        base_http_url = self.configuration_dict['web']['api_base_url']
-        target_url = f'{base_http_url}/warehouse/config/parameters/number_of_shelves'
-
-        # Send the GET request
-        response_string = requests.get(target_url)
+    def http_get_json(self, path):
+        """ Return the JSON response of an API path, served by the local cache"""
+        return self.api_cache.get(path)
 
-        # Return the JSON response
-        return response_string.json()
-
-    def http_get_columns_per_shelf(self):
-        """ Get all locations from the remote server over HTTP"""
+    def http_fetch(self, path, etag=None):
+        """ Send a GET request to the API over the pooled session.
+        The cached ETag (if any) is sent, the API answers 304 if the data did not change.
+        :return: status code, JSON response (None if 304) and ETag of the response
+        """
 
         # Get the base URL from the configuration
         base_http_url = self.configuration_dict['web']['api_base_url']
-        target_url = f'{base_http_url}/warehouse/config/parameters/columns_per_shelf'
+        target_url = f'{base_http_url}{path}'
 
         # Send the GET request
-        response_string = requests.get(target_url)
-
-        # Return the JSON response
-        return response_string.json()
-    
-    def http_get_levels_per_shelf(self):
-        """ Get all locations from the remote server over HTTP"""
-
-        # Get the base URL from the configuration
-        base_http_url = self.configuration_dict['web']['api_base_url']
-        target_url = f'{base_http_url}/warehouse/config/parameters/levels_per_shelf'
+        headers = {'If-None-Match': etag} if etag else {}
+        response = self.http_session.get(target_url, headers=headers, timeout=self.request_timeout)
 
-        # Send the GET request
-        response_string = requests.get(target_url)
+        if response.status_code == 304:
+            return 304, None, etag
 
         # Return the JSON response
-        return response_string.json()
-    
-    def http_get_number_of_agvs(self):
-        """ Get all locations from the remote server over HTTP"""
+        return response.status_code, response.json(), response.headers.get('ETag')
 
-        # Get the base URL from the configuration
-        base_http_url = self.configuration_dict['web']['api_base_url']
-        target_url = f'{base_http_url}/warehouse/config/parameters/number_of_agvs'
-
-        # Send the GET request
-        response_string = requests.get(target_url)
-
-        # Return the JSON response
-        return response_string.json()
+    def http_get_parameters(self):
+        """ Get all the warehouse parameters from the remote server in a single request"""
+        return self.http_get_json('/warehouse/config/parameters')
 
     def http_get_agv_position(self, agv_id):
         """Get AGV position from the remote server over HTTP"""
-        base_http_url = self.configuration_dict['web']['api_base_url']
-        target_url = f'{base_http_url}/warehouse/config/parameters/agv/{agv_id}/position'
-        response = requests.get(target_url)
-        return response.json()
+        return self.http_get_json(f'/warehouse/config/parameters/agv/{agv_id}/position')
+
+    def http_get_slots(self):
+        """Get the status of all the slots from the remote server over HTTP"""
+        return self.http_get_json('/warehouse/config/parameters/slots')
+
+    def http_get_concurrently(self, *getters):
+        """ Run the given http_get_* methods in parallel and return their results in order"""
+        futures = [self.http_executor.submit(getter) for getter in getters]
+        return [future.result() for future in futures]
 
     def agv_position(self, agv_id=None):
         # Se agv_id è passato, mostra solo quell'AGV, altrimenti mostra tutti (se vuoi estendere)
         agv_positions = {}
         if agv_id:
-            agv_data = self.http_get_agv_position(agv_id)
+            try:
+                agv_data = self.http_get_agv_position(agv_id)
+            except ApiError:
+                # Unknown AGV (404) or API error: empty table
+                agv_data = None
             if agv_data and 'position' in agv_data:
                 agv_positions[agv_id] = agv_data
         # In futuro puoi aggiungere qui la logica per più AGV
         return render_template('agv_telemetry.html', agv_positions=agv_positions)
 
     def all_slots(self):
-        base_http_url = self.configuration_dict['web']['api_base_url']
-        target_url = f'{base_http_url}/warehouse/config/parameters/slots'
-        response = requests.get(target_url)
-        print("DEBUG all_slots response:", response.status_code)
-        slots_json = response.json()
+        slots_json = self.http_get_slots()
         slots_list = slots_json.get("slots", [])
         return render_template('slot_status.html', slots=slots_list)
-    
+
+    def http_get_slots_summary(self):
+        """Get the precomputed slot occupancy summary from the remote server over HTTP"""
+        try:
+            summary = self.http_get_json('/warehouse/config/parameters/slots/summary')
+        except ApiError:
+            # The API answers 404 when no slot is available yet
+            return None
+        return summary if summary is not None and 'total' in summary else None
+
+    def http_get_slots_page(self, col, level, offset, limit):
+        """Get a page of the slots of a shelf (grid column), optionally of a single level"""
+        path = f'/warehouse/config/parameters/slots?col={col}&offset={offset}&limit={limit}'
+        if level is not None:
+            path += f'&level={level}'
+        return self.http_get_json(path)
+
+    def http_get_slots_occupancy(self):
+        """Get the occupancy bitset of all the slots from the remote server over HTTP"""
+        return self.http_get_json('/warehouse/config/parameters/slots/occupancy')
+
+    def slots_occupancy(self):
+        # Occupazione compatta per la heatmap della storage view
+        try:
+            return jsonify(self.http_get_slots_occupancy())
+        except ApiError as e:
+            return jsonify(e.value), e.status_code
+
     def storage_view(self):
-        # Recupera i parametri di configurazione della warehouse
-        shelves = self.http_get_number_of_shelves()
-        columns = self.http_get_columns_per_shelf()
-        levels = self.http_get_levels_per_shelf()
+        # Scaffale, livello e pagina selezionati
+        shelf = request.args.get('shelf', 1, type=int)
+        level = request.args.get('level', type=int)
+        page = max(1, request.args.get('page', 1, type=int))
+
+        # Recupera in parallelo parametri e riepilogo dell'occupazione
+        params, summary = self.http_get_concurrently(self.http_get_parameters, self.http_get_slots_summary)
         parameters = {
-            "number_of_shelves": shelves.get("value"),
-            "columns_per_shelf": columns.get("value"),
-            "levels_per_shelf": levels.get("value")
+            "number_of_shelves": params.get("number_of_shelves"),
+            "columns_per_shelf": params.get("columns_per_shelf"),
+            "levels_per_shelf": params.get("levels_per_shelf")
         }
-        # Recupera lo stato degli slot
-        base_http_url = self.configuration_dict['web']['api_base_url']
-        target_url = f'{base_http_url}/warehouse/config/parameters/slots'
-        response = requests.get(target_url)
-        print("DEBUG all_slots response:", response.status_code)
-        slots_json = response.json()
-        slots_list = slots_json.get("slots", [])
-        return render_template('storage_view.html', slots=slots_list, parameters=parameters)
+
+        # Shelf n is the n-th grid column holding slots
+        shelf_cols = sorted(int(col) for col in summary['by_shelf']) if summary else []
+        grid_rows, grid_levels, grid, total = [], [], {}, 0
+        if 1 <= shelf <= len(shelf_cols):
+            slots_json = self.http_get_slots_page(shelf_cols[shelf - 1], level,
+                                                  (page - 1) * self.storage_page_size, self.storage_page_size)
+            total = slots_json.get("total", 0)
+            for slot in slots_json.get("slots", []):
+                grid[(slot.get("row"), slot.get("level"))] = slot
+            grid_rows = sorted({row for row, _ in grid})
+            grid_levels = sorted({slot_level for _, slot_level in grid}, reverse=True)
+        pages = max(1, -(-total // self.storage_page_size))
+        return render_template('storage_view.html', parameters=parameters, summary=summary,
+                               shelf=shelf, number_of_shelves=len(shelf_cols), level=level,
+                               page=page, pages=pages, grid=grid, grid_rows=grid_rows, grid_levels=grid_levels)
+
+    def live_map(self):
+        # Mappa live di tutta la flotta, aggiornata dallo stream /stream
+        return render_template('live_map.html')
+
+    def stream(self):
+        """ Server-Sent Events stream: a snapshot of the current state, then the AGV and slot deltas"""
+        response = Response(stream_with_context(self.live_feed.stream()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
 
     def run_server(self):
         """ Run the Flask Web Server"""
-        self.app.run(host=self.configuration_dict['web']['host'], port=self.configuration_dict['web']['port'])
+        self.live_feed.start()
+        # Threaded: each open /stream connection keeps a thread busy
+        self.app.run(host=self.configuration_dict['web']['host'], port=self.configuration_dict['web']['port'],
+                     threaded=True)
 
     def start(self):
         self.server_thread = threading.Thread(target=self.run_server)